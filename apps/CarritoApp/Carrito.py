@@ -1,64 +1,166 @@
+#-------------------- Carrito de la tienda (CarritoCompra / ItemCarrito en la base) ------------------------------------#
+# Antes el carrito era un dict de floats en request.session['carrito'] que se reescribía entero en la
+# tabla de sesiones con cada +/-. Ahora cada ítem es una fila: sumar o restar es un UPDATE de esa fila
+# con F('cantidad'), los precios son Decimal y la sesión de un visitante guarda solo el id del carrito.
+# El del usuario logueado se busca por usuario (sobrevive a la sesión) y al iniciar sesión se le suma
+# el del visitante (unir_al_iniciar_sesion, desde la señal user_logged_in en signals.py).
+# Uso:
+#     carrito = Carrito(request)
+#     carrito.agregar(producto); carrito.restar(producto_id); carrito.limpiar()
+#     carrito.como_dict()  # {"<producto_id>": {producto_id, nombre, precio, cantidad, acumulado, importe}}
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CarritoCompra, ItemCarrito, Producto
+
+CLAVE_SESION = 'carrito_id'
+CLAVE_VIEJA = 'carrito'  # dict de la versión anterior; se pasa a la base la primera vez
+
+
 class Carrito:
     def __init__(self, request):
         self.request = request
         self.session = request.session
-        carrito = self.session.get("carrito")
-        if not carrito:
-            self.session["carrito"] = {}
-            self.carrito = self.session["carrito"]
-        else:
-            self.carrito = carrito
-
-    def agregar(self, producto):
-        producto_id = str(producto.id)  # Renombramos para claridad
-        if producto_id not in self.carrito:
-            # Convertimos el precio a float antes de guardarlo en la sesión
-            self.carrito[producto_id] = {
-                "producto_id": producto.id,
-                "nombre": producto.titulo,
-                "precio_unitario": float(producto.precio),  # Convertimos a float
-                "cantidad": 1,  # Inicializamos la cantidad
-                "acumulado": float(producto.precio),  # Convertimos a float
-            }
+        self._carrito = None
+        if CLAVE_VIEJA in self.session:
+            self._importar_sesion()
+
+    #---------- carrito de este request ----------
+    def _usuario(self):
+        usuario = getattr(self.request, 'user', None)
+        return usuario if usuario is not None and usuario.is_authenticated else None
+
+    def obtener(self, crear=False):
+        """CarritoCompra del usuario o del visitante; None si no tiene y no se pide crearlo."""
+        if self._carrito is not None:
+            return self._carrito
+        usuario = self._usuario()
+        if usuario is not None:
+            if crear:
+                self._carrito = CarritoCompra.objects.get_or_create(usuario=usuario)[0]
+            else:
+                self._carrito = CarritoCompra.objects.filter(usuario=usuario).first()
         else:
-            # Si el producto ya está en el carrito, actualizamos la cantidad y el acumulado
-            self.carrito[producto_id]["cantidad"] += 1
-            self.carrito[producto_id]["acumulado"] += float(producto.precio)  # Convertimos a float
-        self.guardar_carrito()
+            carrito_id = self.session.get(CLAVE_SESION)
+            if carrito_id:
+                self._carrito = CarritoCompra.objects.filter(pk=carrito_id, usuario__isnull=True).first()
+            if self._carrito is None and crear:
+                self._carrito = CarritoCompra.objects.create()
+                self.session[CLAVE_SESION] = self._carrito.pk
+        return self._carrito
+
+    def _tocar(self):
+        # marca de actividad para limpiar carritos abandonados (un UPDATE chico, sin señales)
+        CarritoCompra.objects.filter(pk=self._carrito.pk).update(actualizado=timezone.now())
+
+    #---------- cambios (una fila por operación) ----------
+    def agregar(self, producto, cantidad=1):
+        carrito = self.obtener(crear=True)
+        if _sumar(carrito.pk, producto.pk, cantidad, producto.precio):
+            self._tocar()
 
+    def sumar(self, producto_id):
+        """+1 a un producto que ya está en el carrito (no agrega productos nuevos)."""
+        carrito = self.obtener()
+        if carrito is not None:
+            ItemCarrito.objects.filter(carrito=carrito, producto_id=producto_id).update(cantidad=F('cantidad') + 1)
 
-    def guardar_carrito(self):
-        self.session["carrito"] = self.carrito
-        self.session.modified = True
+    def restar(self, producto_id):
+        """-1; si quedaba una unidad, saca el producto del carrito."""
+        carrito = self.obtener()
+        if carrito is None:
+            return
+        items = ItemCarrito.objects.filter(carrito=carrito, producto_id=producto_id)
+        if not items.filter(cantidad__gt=1).update(cantidad=F('cantidad') - 1):
+            items.delete()
+
+    def eliminar(self, producto_id):
+        carrito = self.obtener()
+        if carrito is not None:
+            ItemCarrito.objects.filter(carrito=carrito, producto_id=producto_id).delete()
 
     def limpiar(self):
+        carrito = self.obtener()
+        if carrito is not None:
+            carrito.items.all().delete()
+
+    #---------- lectura ----------
+    def como_dict(self):
         """
-        Este método limpia el carrito (elimina todos los productos).
-        """
-        self.carrito = {}  # Vaciamos el carrito
-        self.guardar_carrito()  # Guardamos los cambios en la sesión
-        
-
-    def eliminar(self, producto):
-        producto_id = str(producto.id)
-        if producto_id in self.carrito:
-            del self.carrito[producto_id]
-            self.guardar_carrito()
-
-    def restar(self, producto):
-        producto_id = str(producto.id)
-        if producto_id in self.carrito:
-            self.carrito[producto_id]["cantidad"] -= 1
-            self.carrito[producto_id]["acumulado"] -= float(producto.precio)  # Convertimos a float
-            if self.carrito[producto_id]["cantidad"] <= 0:
-                self.eliminar(producto)  # Si la cantidad llega a cero, eliminamos el producto
-            self.guardar_carrito()
-
-    def total(self):
-        """
-        Este método calcula el total sumando el acumulado de cada producto en el carrito.
+        El carrito con la forma del dict de sesión que usan las vistas y carrito.html
+        (precios en Decimal). Una sola consulta; vacío y sin consultas si no hay carrito.
         """
-        total = 0
-        for producto in self.carrito.values():
-            total += producto["acumulado"]  # Sumamos el acumulado de cada producto
-        return total
+        carrito = self.obtener()
+        if carrito is None:
+            return {}
+        resultado = {}
+        filas = (
+            carrito.items.order_by('id')
+            .values('producto_id', 'producto__nombre_producto', 'precio_unitario', 'cantidad')
+        )
+        for fila in filas:
+            importe = fila['precio_unitario'] * fila['cantidad']
+            resultado[str(fila['producto_id'])] = {
+                'producto_id': fila['producto_id'],
+                'nombre': fila['producto__nombre_producto'],
+                'precio': fila['precio_unitario'],
+                'cantidad': fila['cantidad'],
+                'acumulado': importe,
+                'importe': importe,
+            }
+        return resultado
+
+    def total(self, items=None):
+        items = self.como_dict() if items is None else items
+        return sum((item['importe'] for item in items.values()), Decimal(0))
+
+    #---------- carrito viejo en la sesión ----------
+    def _importar_sesion(self):
+        viejo = self.session.pop(CLAVE_VIEJA, None) or {}
+        cantidades = {}
+        for item in viejo.values():
+            try:
+                cantidades[int(item['producto_id'])] = int(item['cantidad'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not cantidades:
+            return
+        carrito = self.obtener(crear=True)
+        for producto_id, precio in Producto.objects.filter(pk__in=cantidades).values_list('id', 'precio'):
+            _sumar(carrito.pk, producto_id, cantidades[producto_id], precio)
+
+
+def _sumar(carrito_id, producto_id, cantidad, precio):
+    """Suma `cantidad` al ítem (UPDATE con F) o lo crea. Devuelve True si hizo algo."""
+    if cantidad <= 0:
+        return False
+    items = ItemCarrito.objects.filter(carrito_id=carrito_id, producto_id=producto_id)
+    if items.update(cantidad=F('cantidad') + cantidad):
+        return True
+    try:
+        with transaction.atomic():
+            ItemCarrito.objects.create(carrito_id=carrito_id, producto_id=producto_id,
+                                       cantidad=cantidad, precio_unitario=precio)
+    except IntegrityError:  # otro request lo creó en el medio
+        items.update(cantidad=F('cantidad') + cantidad)
+    return True
+
+
+#---------- al iniciar sesión: el carrito del visitante pasa al del usuario ----------
+def unir_al_iniciar_sesion(request, user):
+    carrito_id = request.session.pop(CLAVE_SESION, None)
+    if not carrito_id:
+        return
+    anonimo = CarritoCompra.objects.filter(pk=carrito_id, usuario__isnull=True).first()
+    if anonimo is None:
+        return
+    with transaction.atomic():
+        items = list(anonimo.items.values_list('producto_id', 'cantidad', 'precio_unitario'))
+        if items:
+            destino = CarritoCompra.objects.get_or_create(usuario=user)[0]
+            for producto_id, cantidad, precio in items:
+                _sumar(destino.pk, producto_id, cantidad, precio)
+        anonimo.delete()
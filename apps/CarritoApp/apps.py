@@ -4,3 +4,6 @@ class CarritoAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.CarritoApp"
     verbose_name = "CarritoApp"
+
+    def ready(self):
+        from . import signals  # noqa: F401  (resumen de caja diario)
@@ -0,0 +1,132 @@
+#-------------------- Búsqueda de productos (POS, compras, autocompletar) ------------------------------------#
+# `nombre_producto__icontains` es un LIKE '%...%' que en MySQL recorre toda la tabla en cada tecla.
+# En su lugar, cada producto tiene en TerminoProducto las palabras de su nombre normalizado (sin
+# acentos, minúsculas) y sus trigramas; se mantienen al guardar (señal en signals.py) y
+# `manage.py reindexar_productos` rehace todo. buscar():
+#   1. cada palabra de la consulta tiene que ser prefijo de alguna palabra del nombre (LIKE 'xx%' sobre el índice)
+#   2. si no encontró nada, los que comparten más trigramas (errores de tipeo, partes de palabra)
+# Orden: número exacto, nombre exacto, nombre que empieza con la consulta, nombre más corto, alfabético.
+import math
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.functions import Length
+
+LIMITE = getattr(settings, 'PRODUCTOS_BUSQUEDA_LIMITE', 20)
+MAX_LIMITE = getattr(settings, 'PRODUCTOS_BUSQUEDA_MAX_LIMITE', 50)
+SIMILITUD = 0.5       # fracción de trigramas de la consulta que tiene que tener un producto
+LARGO_TERMINO = 40    # TerminoProducto.termino
+CAMPOS = ('id', 'numero_producto', 'nombre_producto', 'precio', 'stock')
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """'Alimento  Perro ÑANDÚ 15kg.' -> 'alimento perro nandu 15kg'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', sin_acentos.lower()).strip()
+
+
+def palabras(texto):
+    return [palabra[:LARGO_TERMINO] for palabra in normalizar(texto).split()]
+
+
+def trigramas(texto):
+    # Como pg_trgm: cada palabra con dos espacios adelante y uno atrás, así pesa el comienzo
+    resultado = set()
+    for palabra in palabras(texto):
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def terminos(nombre):
+    """{(tipo, termino)} que van a TerminoProducto para un nombre de producto."""
+    return {('p', palabra) for palabra in palabras(nombre)} | {('t', trigrama) for trigrama in trigramas(nombre)}
+
+
+def indexar(producto):
+    """Actualiza los términos del producto; solo escribe si el nombre cambió algo. Devuelve True si escribió."""
+    from .models import TerminoProducto
+
+    nuevos = terminos(producto.nombre_producto)
+    actuales = set(TerminoProducto.objects.filter(producto=producto).values_list('tipo', 'termino'))
+    if nuevos == actuales:
+        return False
+    sobran = actuales - nuevos
+    if sobran:
+        filtro = Q()
+        for tipo, termino in sobran:
+            filtro |= Q(tipo=tipo, termino=termino)
+        TerminoProducto.objects.filter(filtro, producto=producto).delete()
+    TerminoProducto.objects.bulk_create(
+        [TerminoProducto(producto=producto, tipo=tipo, termino=termino) for tipo, termino in nuevos - actuales],
+        ignore_conflicts=True,  # dos guardados a la vez del mismo producto
+    )
+    return True
+
+
+def limitar(valor, defecto=LIMITE):
+    """Límite pedido por el cliente (?limite=), siempre entre 1 y MAX_LIMITE."""
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        valor = defecto
+    return max(1, min(valor, MAX_LIMITE))
+
+
+def _ordenados(qs, consulta):
+    normalizada = ' '.join(palabras(consulta))
+    casos = [
+        When(nombre_normalizado=normalizada, then=Value(1)),
+        When(nombre_normalizado__startswith=normalizada, then=Value(2)),
+    ]
+    if consulta.isdecimal():
+        casos.insert(0, When(numero_producto=int(consulta), then=Value(0)))
+    return qs.annotate(
+        relevancia=Case(*casos, default=Value(3), output_field=IntegerField()),
+        largo=Length('nombre_normalizado'),
+    ).order_by('relevancia', 'largo', 'nombre_normalizado', 'id')
+
+
+def buscar(consulta, limite=LIMITE, campos=CAMPOS):
+    """Lista de dicts (`campos`) de los productos que coinciden con `consulta`, los mejores primero."""
+    from .models import Producto, TerminoProducto
+
+    consulta = (consulta or '').strip()
+    limite = limitar(limite)
+    buscadas = palabras(consulta)
+    if not buscadas:
+        return []
+    columnas = ('id', *(campo for campo in campos if campo != 'id'))  # el id hace falta para el paso 2
+
+    # 1. Prefijos: todas las palabras tienen que aparecer (AND), cada una con su subconsulta al índice
+    filtro = Q()
+    for palabra in buscadas:
+        filtro &= Q(id__in=TerminoProducto.objects.filter(tipo='p', termino__startswith=palabra).values('producto_id'))
+    if consulta.isdecimal():
+        filtro |= Q(numero_producto=int(consulta))
+    encontrados = list(_ordenados(Producto.objects.filter(filtro), consulta).values(*columnas)[:limite])
+    if not encontrados and len(''.join(buscadas)) >= 3:
+        encontrados = _similares(consulta, limite, columnas)
+    return [{campo: fila[campo] for campo in campos} for fila in encontrados]
+
+
+def _similares(consulta, cantidad, columnas):
+    from .models import Producto, TerminoProducto
+
+    # 2. Trigramas: los que comparten al menos SIMILITUD de los trigramas de la consulta
+    buscados = trigramas(consulta)
+    similares = list(
+        TerminoProducto.objects.filter(tipo='t', termino__in=buscados)
+        .values('producto_id')
+        .annotate(coincidencias=Count('id'))
+        .filter(coincidencias__gte=math.ceil(len(buscados) * SIMILITUD))
+        .order_by('-coincidencias', 'producto_id')
+        .values_list('producto_id', flat=True)[:cantidad]
+    )
+    por_id = {fila['id']: fila for fila in Producto.objects.filter(id__in=similares).values(*columnas)}
+    return [por_id[pk] for pk in similares if pk in por_id]
@@ -0,0 +1,56 @@
+#-------------------- Cache de la grilla de la tienda ------------------------------------#
+# Para los visitantes anónimos la grilla de productos con su paginación (tienda_grilla.html) se
+# guarda ya renderizada por (vista, categoría, página) en el cache compartido (prueba1/cache.py).
+# La cantidad de páginas también se cachea, así la página pedida se acota antes de armar la clave.
+# El badge del carrito y el resto de tienda.html dependen de la sesión y se arman siempre.
+# Cada categoría es un grupo con su propia versión: guardar un producto, moverle el stock o
+# terminar sus miniaturas invalida solo las páginas de su categoría y las de "todas".
+from django.conf import settings
+from django.db import transaction
+
+from prueba1 import cache as cache_compartido
+
+ESPACIO = 'tienda'
+TODAS = 'todas'
+SEGUNDOS = getattr(settings, 'TIENDA_CACHE_SEGUNDOS', 600)
+
+
+def _grupo(categoria_id):
+    return ('categoria', categoria_id or TODAS)
+
+
+def grilla(request, variante, categoria_id, pagina, armar):
+    """HTML de la grilla: del cache para anónimos; `armar()` la renderiza cuando falta (o para usuarios logueados)."""
+    if request.user.is_authenticated:
+        return armar()
+    return cache_compartido.obtener(ESPACIO, (variante, pagina), armar, SEGUNDOS, grupo=_grupo(categoria_id))
+
+
+def paginas(request, variante, categoria_id, contar):
+    """Cantidad de páginas de la grilla: del cache para anónimos, `contar()` cuando falta."""
+    if request.user.is_authenticated:
+        return contar()
+    return cache_compartido.obtener(ESPACIO, (variante, 'paginas'), contar, SEGUNDOS, grupo=_grupo(categoria_id))
+
+
+def categorias(armar):
+    """Lista de categorías del filtro (cambia muy poco)."""
+    return cache_compartido.obtener(ESPACIO, ('categorias',), armar, SEGUNDOS)
+
+
+def invalidar_categorias(*categoria_ids, lista=False):
+    """Páginas de esas categorías y de "todas"; con lista=True también el filtro de categorías."""
+    def invalidar():
+        for categoria_id in {*categoria_ids, None}:
+            cache_compartido.invalidar(ESPACIO, *_grupo(categoria_id))
+        if lista:
+            cache_compartido.borrar(ESPACIO, ('categorias',))
+    # después del commit: antes, otro request podría volver a guardar los datos viejos
+    transaction.on_commit(invalidar)
+
+
+def invalidar_productos(producto_ids):
+    from .models import Producto
+
+    categoria_ids = set(Producto.objects.filter(id__in=list(producto_ids)).values_list('categoria_id', flat=True))
+    invalidar_categorias(*categoria_ids)
@@ -0,0 +1,94 @@
+#-------------------- Catálogo versionado para el punto de venta (modulo1/prueba) ------------------------------------#
+# La caja carga una sola vez el catálogo (número, nombre, precio, stock) y después pide solo lo que
+# cambió. Cada cambio de un producto le pone a la fila el siguiente valor del contador
+# Secuencia('catalogo'); los borrados quedan en ProductoBorrado con el suyo.
+# El contador queda bloqueado hasta el commit de la transacción que lo pidió (ver Secuencia.siguiente),
+# por eso quien toma una versión escribe su fila en la misma transacción (Producto.save, el borrado):
+# así las versiones se confirman en orden y "todo lo que tiene version > desde" nunca se saltea un cambio.
+# Los movimientos de stock (stock.py) no toman el contador, que serializaría todas las ventas: dejan la
+# fila en PENDIENTE y versionar_pendientes() le da número después del commit, en una transacción corta.
+# Una fila en PENDIENTE no sale en cambios() hasta tener número, y cambios()/completo() versionan antes
+# lo que haya quedado pendiente (ej. el proceso murió entre el commit y on_commit).
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Producto, ProductoBorrado, Secuencia
+
+SECUENCIA = 'catalogo'
+CAMPOS = ('id', 'numero_producto', 'nombre_producto', 'precio', 'stock')
+CAMPOS_VERSIONADOS = {'numero_producto', 'nombre_producto', 'precio', 'stock'}
+
+PENDIENTE = 0   # Producto.version de un cambio de stock que todavía no tiene número
+LOTE = 1000
+
+# Último catálogo completo armado por este proceso: (version, json)
+_completo = (None, None)
+
+
+def nueva_version():
+    """Reserva la próxima versión del catálogo (bloquea el contador hasta el fin de la transacción)."""
+    return Secuencia.siguiente(SECUENCIA)
+
+
+def version_actual():
+    return Secuencia.ver_siguiente(SECUENCIA) - 1
+
+
+def versionar_pendientes(ids=None):
+    """
+    Da una versión (una sola para todas) a los productos en PENDIENTE, o solo a `ids`.
+    Va después del commit del movimiento: el contador queda bloqueado solo durante este UPDATE.
+    """
+    total = 0
+    while True:
+        qs = Producto.objects.filter(version=PENDIENTE)
+        if ids is not None:
+            qs = qs.filter(id__in=list(ids))
+        pendientes = list(qs.order_by('id').values_list('id', flat=True)[:LOTE])
+        if not pendientes:
+            return total
+        with transaction.atomic():
+            version = nueva_version()
+            total += Producto.objects.filter(id__in=pendientes, version=PENDIENTE).update(version=version)
+        if len(pendientes) < LOTE:
+            return total
+
+
+def _filas(qs):
+    return [
+        [fila['id'], fila['numero_producto'], fila['nombre_producto'], str(fila['precio']), fila['stock']]
+        for fila in qs.order_by('id').values(*CAMPOS)
+    ]
+
+
+def completo():
+    """JSON del catálogo entero; se rearma solo si cambió la versión desde la última vez."""
+    global _completo
+    versionar_pendientes()
+    # La versión se lee antes que los productos: lo que se confirme en el medio viene de más
+    # y se vuelve a mandar en el próximo diff (el cliente reemplaza por id, no pasa nada)
+    version = version_actual()
+    if _completo[0] != version:
+        datos = {'version': version, 'completo': True, 'campos': CAMPOS,
+                 'productos': _filas(Producto.objects.all()), 'borrados': []}
+        _completo = (version, json.dumps(datos, cls=DjangoJSONEncoder))
+    return _completo[1]
+
+
+def cambios(desde):
+    """Productos con version > desde y los ids borrados desde entonces (None si `desde` no es de esta base)."""
+    versionar_pendientes()
+    version = version_actual()
+    if desde > version:
+        return None
+    if desde == version:
+        return {'version': version, 'completo': False, 'campos': CAMPOS, 'productos': [], 'borrados': []}
+    return {
+        'version': version,
+        'completo': False,
+        'campos': CAMPOS,
+        'productos': _filas(Producto.objects.filter(version__gt=desde)),
+        'borrados': list(ProductoBorrado.objects.filter(version__gt=desde).values_list('producto_id', flat=True)),
+    }
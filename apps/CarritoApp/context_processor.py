@@ -1,7 +1,6 @@
 def total_carrito(request):
     total = 0
     if request.user.is_authenticated:
-        if "carrito" in request.session.keys():
-            for key, value in request.session["carrito"].items():
-                total += int(value["acumulado"])
-    return {"total_carrito": total}
\ No newline at end of file
+        from .Carrito import Carrito
+        total = Carrito(request).total()
+    return {"total_carrito": total}
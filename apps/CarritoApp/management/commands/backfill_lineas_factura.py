@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.CarritoApp.models import Factura, FacturaProducto
+
+
+class Command(BaseCommand):
+    help = 'Genera las líneas de venta (FacturaProducto) de las facturas viejas a partir de detalle_productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='Facturas por lote (default 500)')
+
+    def handle(self, *args, **options):
+        batch = max(1, options['batch'])
+        facturas = (
+            Factura.objects
+            .filter(lineas__isnull=True)
+            .only('id', 'fecha', 'numero_factura', 'detalle_productos')
+            .order_by('id')
+        )
+
+        procesadas = lineas = errores = 0
+        lote = []
+        for factura in facturas.iterator(chunk_size=batch):
+            lote.append(factura)
+            if len(lote) >= batch:
+                n, e = self._procesar(lote)
+                procesadas += len(lote)
+                lineas += n
+                errores += e
+                lote = []
+                self.stdout.write(f'{procesadas} facturas procesadas...')
+        if lote:
+            n, e = self._procesar(lote)
+            procesadas += len(lote)
+            lineas += n
+            errores += e
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: {procesadas} facturas, {lineas} líneas creadas, {errores} con detalle inválido.'
+        ))
+
+    def _procesar(self, facturas):
+        creadas = errores = 0
+        with transaction.atomic():
+            for factura in facturas:
+                try:
+                    detalle = json.loads(factura.detalle_productos or '[]')
+                except json.JSONDecodeError:
+                    errores += 1
+                    continue
+                if not isinstance(detalle, list):
+                    errores += 1
+                    continue
+                detalle = [d for d in detalle if isinstance(d, dict)]
+                creadas += len(FacturaProducto.crear_desde_detalle(factura, detalle))
+        return creadas, errores
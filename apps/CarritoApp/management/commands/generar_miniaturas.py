@@ -0,0 +1,58 @@
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.CarritoApp import miniaturas
+from apps.CarritoApp.models import Producto
+
+
+def _generar(tarea):
+    # corre en los procesos hijos: solo Pillow y archivos, nada de base
+    producto_id, campo, nombre, forzar = tarea
+    try:
+        return producto_id, campo, miniaturas.generar(nombre, forzar), ''
+    except Exception as e:
+        return producto_id, campo, None, f'{type(e).__name__}: {e}'
+
+
+class Command(BaseCommand):
+    help = ('Genera las miniaturas WebP/JPEG de las imágenes de producto que no las tienen '
+            '(o todas con --forzar), repartiendo el trabajo en varios procesos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos en paralelo (por defecto, uno por CPU)')
+        parser.add_argument('--forzar', action='store_true', help='Regenera aunque ya existan')
+
+    def handle(self, *args, **options):
+        tareas = [
+            (producto.pk, campo, nombre, options['forzar'])
+            for producto in Producto.objects.only('id', 'miniaturas', *miniaturas.CAMPOS).iterator(chunk_size=500)
+            for campo, nombre in miniaturas.pendientes(producto, options['forzar'])
+        ]
+        if not tareas:
+            self.stdout.write(self.style.SUCCESS('Todas las imágenes tienen sus miniaturas.'))
+            return
+        self.stdout.write(f'{len(tareas)} imágenes para procesar en {options["procesos"]} procesos...')
+
+        # Los hijos heredan la conexión abierta si se hace fork: se cierra antes
+        connections.close_all()
+        resultados = defaultdict(dict)
+        errores = 0
+        with Pool(options['procesos']) as pool:
+            for producto_id, campo, datos, error in pool.imap_unordered(_generar, tareas, chunksize=4):
+                if error:
+                    errores += 1
+                    self.stderr.write(f'✘ producto {producto_id} {campo}: {error}')
+                else:
+                    resultados[producto_id][campo] = datos
+
+        for producto_id, generados in resultados.items():
+            miniaturas.guardar_resultados(producto_id, generados)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(tareas) - errores} imágenes procesadas en {len(resultados)} productos ({errores} con error).'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.CarritoApp import reservas
+
+
+class Command(BaseCommand):
+    help = ('Devuelve al stock las reservas del checkout de Mercado Pago que vencieron sin pago '
+            '(ver reservas.py). Para cron (ej. cada 5 minutos) o como servicio con --intervalo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=reservas.LOTE, help='Reservas por transacción')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Si es mayor a 0, repite cada N segundos en lugar de terminar')
+
+    def handle(self, *args, **options):
+        while True:
+            liberadas = reservas.liberar_vencidas(lote=max(1, options['lote']))
+            if liberadas or not options['intervalo']:
+                self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas vencidas liberadas.'))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
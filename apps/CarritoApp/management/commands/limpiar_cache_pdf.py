@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.CarritoApp.pdf_cache import MAX_BYTES, MAX_DIAS, limpiar_cache
+
+
+class Command(BaseCommand):
+    help = ('Borra PDFs de factura cacheados más viejos que --dias y, si la carpeta sigue '
+            'pasando --max-mb, los de uso más antiguo. Pensado para correr por cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=MAX_DIAS, help=f'Antigüedad máxima (por defecto {MAX_DIAS})')
+        parser.add_argument('--max-mb', type=int, default=MAX_BYTES // (1024 * 1024),
+                            help=f'Tamaño máximo de la carpeta en MB (por defecto {MAX_BYTES // (1024 * 1024)})')
+
+    def handle(self, *args, **options):
+        borrados, restantes = limpiar_cache(options['max_mb'] * 1024 * 1024, options['dias'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} PDFs borrados; quedan {restantes / (1024 * 1024):.1f} MB en cache.'
+        ))
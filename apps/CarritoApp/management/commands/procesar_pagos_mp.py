@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.CarritoApp import pagos_mp
+
+
+class Command(BaseCommand):
+    help = ('Worker de las notificaciones de Mercado Pago (webhook): consulta cada pago, crea la factura '
+            'o libera la reserva de stock, y reintenta con espera creciente si la API falla. '
+            'Correrlo como servicio aparte de gunicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina (para cron)')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay avisos')
+        parser.add_argument('--purgar-dias', type=int, default=30,
+                            help='Al arrancar borra avisos terminados hace más de N días (0 = no borrar)')
+
+    def handle(self, *args, **options):
+        if options['purgar_dias']:
+            borrados = pagos_mp.purgar(options['purgar_dias'])
+            if borrados:
+                self.stdout.write(f'{borrados} notificaciones viejas borradas.')
+
+        api = pagos_mp.cliente()
+        procesadas = 0
+        while True:
+            notificacion = pagos_mp.tomar_siguiente()
+            if notificacion is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            pagos_mp.procesar(notificacion, api)
+            procesadas += 1
+            if notificacion.error:
+                self.stderr.write(f'✘ {notificacion}: {notificacion.error}')
+            else:
+                self.stdout.write(f'✔ {notificacion}: {notificacion.resultado}')
+
+        self.stdout.write(self.style.SUCCESS(f'{procesadas} notificaciones procesadas.'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.CarritoApp import trabajos
+
+
+class Command(BaseCommand):
+    help = ('Worker de la cola de trabajos de render (PDF de factura, ticket de Mercado Pago, '
+            'PDF de presupuesto). Correrlo como servicio aparte de gunicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina (para cron)')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando no hay trabajos')
+        parser.add_argument('--purgar-dias', type=int, default=7,
+                            help='Al arrancar borra trabajos terminados hace más de N días (0 = no borrar)')
+
+    def handle(self, *args, **options):
+        if options['purgar_dias']:
+            borrados = trabajos.purgar(options['purgar_dias'])
+            if borrados:
+                self.stdout.write(f'{borrados} trabajos viejos borrados.')
+
+        procesados = 0
+        while True:
+            trabajo = trabajos.tomar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            trabajos.procesar(trabajo)
+            procesados += 1
+            if trabajo.estado == 'listo':
+                self.stdout.write(f'✔ {trabajo}')
+            else:
+                self.stderr.write(f'✘ {trabajo}: {trabajo.error}')
+
+        self.stdout.write(self.style.SUCCESS(f'{procesados} trabajos procesados.'))
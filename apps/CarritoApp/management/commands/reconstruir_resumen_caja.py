@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+
+from apps.CarritoApp.resumen_caja import reconstruir
+
+
+class Command(BaseCommand):
+    help = ('Recalcula ResumenCajaDiario desde facturas, pagos de cuenta corriente y turnos. '
+            'Usarlo después de cargas masivas, cambios de precio de motivos o si los totales no cierran.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial AAAA-MM-DD (por defecto, todo)')
+        parser.add_argument('--hasta', help='Fecha final AAAA-MM-DD (por defecto, todo)')
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for clave in ('desde', 'hasta'):
+            if options[clave]:
+                try:
+                    fechas[clave] = datetime.strptime(options[clave], '%Y-%m-%d').date()
+                except ValueError:
+                    raise CommandError(f'Fecha inválida para --{clave}: {options[clave]}')
+
+        filas = reconstruir(fechas.get('desde'), fechas.get('hasta'))
+        self.stdout.write(self.style.SUCCESS(f'Resumen de caja reconstruido: {filas} filas.'))
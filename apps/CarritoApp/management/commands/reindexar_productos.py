@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.CarritoApp import busqueda
+from apps.CarritoApp.models import Producto
+
+
+class Command(BaseCommand):
+    help = ('Rehace el índice de búsqueda de productos (nombre normalizado y TerminoProducto). '
+            'Hace falta después de cambiar nombres con UPDATE directos o de importar datos.')
+
+    def handle(self, *args, **options):
+        normalizados = reindexados = 0
+        for producto in Producto.objects.only('id', 'nombre_producto', 'nombre_normalizado').iterator(chunk_size=500):
+            normalizado = busqueda.normalizar(producto.nombre_producto)[:255]
+            if producto.nombre_normalizado != normalizado:
+                # UPDATE directo: no dispara señales (miniaturas) por un campo derivado
+                Producto.objects.filter(pk=producto.pk).update(nombre_normalizado=normalizado)
+                normalizados += 1
+            reindexados += busqueda.indexar(producto)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{normalizados} nombres normalizados y {reindexados} productos reindexados.'
+        ))
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.CarritoApp.models import Factura, CuentaCorriente
+
+
+class Command(BaseCommand):
+    help = ('Compara total_pagado / saldo de cada factura contra la suma real de sus pagos de '
+            'cuenta corriente y lista las diferencias. Con --corregir las recalcula.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help='Recalcula las facturas con diferencias')
+        parser.add_argument('--limite', type=int, default=50, help='Máximo de diferencias a mostrar (por defecto 50)')
+
+    def handle(self, *args, **options):
+        decimal = DecimalField(max_digits=12, decimal_places=2)
+        pagado_sq = (
+            CuentaCorriente.objects
+            .filter(factura=OuterRef('pk'))
+            .order_by()
+            .values('factura')
+            .annotate(pagado=Sum('imp_cuota_pagadas') + Sum('entrega_cta'))
+            .values('pagado')
+        )
+        desvios = (
+            Factura.objects
+            .annotate(pagado_real=Coalesce(Subquery(pagado_sq, output_field=decimal), Value(Decimal(0)), output_field=decimal))
+            .filter(
+                ~Q(total_pagado=F('pagado_real')) |
+                ~Q(saldo=F('total_con_interes') - F('pagado_real'))
+            )
+            .order_by('id')
+            .values('id', 'numero_factura', 'total_con_interes', 'total_pagado', 'saldo', 'pagado_real')
+        )
+
+        cantidad = 0
+        for fila in desvios.iterator(chunk_size=1000):
+            cantidad += 1
+            if cantidad <= options['limite']:
+                self.stdout.write(
+                    f"Factura {fila['numero_factura']} (id {fila['id']}): "
+                    f"total_pagado={fila['total_pagado']} real={fila['pagado_real']} "
+                    f"saldo={fila['saldo']} real={fila['total_con_interes'] - fila['pagado_real']}"
+                )
+            if options['corregir']:
+                Factura.actualizar_saldo(fila['id'])
+
+        if not cantidad:
+            self.stdout.write(self.style.SUCCESS('Saldos de cuenta corriente consistentes.'))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f'{cantidad} facturas corregidas.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{cantidad} facturas con diferencias (usar --corregir).'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.11 on 2026-10-18 10:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0009_magiclogintoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facturaproducto',
+            name='fecha',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='facturaproducto',
+            name='nombre_producto',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='facturaproducto',
+            name='precio_unitario',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='facturaproducto',
+            name='factura',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='CarritoApp.factura'),
+        ),
+        migrations.AlterField(
+            model_name='facturaproducto',
+            name='producto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineas_venta', to='CarritoApp.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaproducto',
+            index=models.Index(fields=['producto', 'fecha'], name='CarritoApp__product_9ae88c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturaproducto',
+            index=models.Index(fields=['nombre_producto'], name='CarritoApp__nombre__a64913_idx'),
+        ),
+    ]
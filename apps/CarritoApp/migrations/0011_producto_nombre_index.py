@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0010_facturaproducto_lineas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='nombre_producto',
+            field=models.CharField(db_index=True, default='Nombre del producto', max_length=255),
+        ),
+    ]
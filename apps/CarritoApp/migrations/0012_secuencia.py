@@ -0,0 +1,34 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+def crear_secuencia_factura(apps, schema_editor):
+    # Arranca el contador desde el último número de factura ya emitido
+    Factura = apps.get_model('CarritoApp', 'Factura')
+    Secuencia = apps.get_model('CarritoApp', 'Secuencia')
+    ultimo = 0
+    for numero in Factura.objects.values_list('numero_factura', flat=True).iterator():
+        numero = (numero or '').strip()
+        if numero.isdigit():
+            ultimo = max(ultimo, int(numero))
+    Secuencia.objects.get_or_create(nombre='factura', defaults={'ultimo_valor': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0011_producto_nombre_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_valor', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_secuencia_factura, migrations.RunPython.noop),
+    ]
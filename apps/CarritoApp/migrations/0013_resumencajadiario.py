@@ -0,0 +1,70 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:40
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def cargar_resumen(apps, schema_editor):
+    # Carga inicial (misma lógica que resumen_caja.reconstruir, con los modelos históricos)
+    Factura = apps.get_model('CarritoApp', 'Factura')
+    CuentaCorriente = apps.get_model('CarritoApp', 'CuentaCorriente')
+    ResumenCajaDiario = apps.get_model('CarritoApp', 'ResumenCajaDiario')
+    Turno = apps.get_model('turnos', 'Turno')
+
+    def metodo(factura):
+        if factura.metodo_pago_id:
+            return (factura.metodo_pago.tarjeta_nombre or '').strip()[:100], True
+        return ((factura.metodo_pago_manual or '').strip() or 'Sin especificar')[:100], False
+
+    acumulado = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for f in Factura.objects.select_related('metodo_pago').iterator(chunk_size=2000):
+        fila = acumulado[(f.fecha, 'factura', (f.vendedor or '')[:100]) + metodo(f)]
+        fila[0] += 1
+        fila[1] += f.total_con_interes or 0
+    for p in CuentaCorriente.objects.select_related('factura__metodo_pago').iterator(chunk_size=2000):
+        cobrado = (p.imp_cuota_pagadas or 0) + (p.entrega_cta or 0)
+        fila = acumulado[(p.fecha_cuota, 'pago', (p.factura.vendedor or '')[:100]) + metodo(p.factura)]
+        fila[0] += 1
+        fila[1] += cobrado
+        fila[2] += (p.total_con_interes or 0) - cobrado
+    for t in Turno.objects.select_related('motivo').iterator(chunk_size=2000):
+        fila = acumulado[(t.fecha, 'turno', '', '', False)]
+        fila[0] += 1
+        fila[1] += t.motivo.precio or 0
+
+    ResumenCajaDiario.objects.bulk_create([
+        ResumenCajaDiario(fecha=fecha, tipo=tipo, vendedor=vendedor, metodo=nombre, metodo_tarjeta=tarjeta,
+                          cantidad=cantidad, total=total, pendiente=pendiente)
+        for (fecha, tipo, vendedor, nombre, tarjeta), (cantidad, total, pendiente) in acumulado.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0012_secuencia'),
+        ('turnos', '0002_motivo_precio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCajaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('factura', 'Factura'), ('pago', 'Pago cuenta corriente'), ('turno', 'Turno')], max_length=10)),
+                ('vendedor', models.CharField(blank=True, default='', max_length=100)),
+                ('metodo', models.CharField(blank=True, default='', max_length=100)),
+                ('metodo_tarjeta', models.BooleanField(default=False)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('pendiente', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'fecha'], name='CarritoApp__tipo_d6e7ad_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'tipo', 'vendedor', 'metodo', 'metodo_tarjeta'), name='resumen_caja_diario_unico')],
+            },
+        ),
+        migrations.RunPython(cargar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:04
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_saldos(apps, schema_editor):
+    # total_pagado = cuotas pagadas + entregas a cuenta; saldo = total con interés - pagado
+    Factura = apps.get_model('CarritoApp', 'Factura')
+    CuentaCorriente = apps.get_model('CarritoApp', 'CuentaCorriente')
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    pagado = (
+        CuentaCorriente.objects
+        .filter(factura_id=OuterRef('pk'))
+        .values('factura_id')
+        .annotate(pagado=Sum('imp_cuota_pagadas') + Sum('entrega_cta'))
+        .values('pagado')
+    )
+    Factura.objects.update(total_pagado=Coalesce(Subquery(pagado, output_field=decimal), Value(Decimal(0)), output_field=decimal))
+    Factura.objects.update(saldo=F('total_con_interes') - F('total_pagado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0013_resumencajadiario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='saldo',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(calcular_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:09
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0014_factura_saldo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoRender',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('tipo', models.CharField(choices=[('factura_pdf', 'PDF de factura'), ('ticket_mp', 'Ticket Mercado Pago (PNG)'), ('presupuesto_pdf', 'PDF de presupuesto')], max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('clave', models.CharField(blank=True, db_index=True, default='', max_length=150)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('archivo', models.CharField(blank=True, default='', max_length=255)),
+                ('error', models.TextField(blank=True, default='')),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('factura', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_render', to='CarritoApp.factura')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'creado'], name='CarritoApp__estado_d8113b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0015_trabajorender'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajorender',
+            name='tipo',
+            field=models.CharField(choices=[('factura_pdf', 'PDF de factura'), ('ticket_mp', 'Ticket Mercado Pago (PNG)'), ('presupuesto_pdf', 'PDF de presupuesto'), ('respaldo_db', 'Respaldo de la base')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0016_trabajorender_respaldo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='miniaturas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='trabajorender',
+            name='tipo',
+            field=models.CharField(choices=[('factura_pdf', 'PDF de factura'), ('ticket_mp', 'Ticket Mercado Pago (PNG)'), ('presupuesto_pdf', 'PDF de presupuesto'), ('respaldo_db', 'Respaldo de la base'), ('miniaturas', 'Miniaturas de producto')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:25
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# copias de busqueda.normalizar/palabras: la migración no depende del código actual, pero tiene
+# que dejar lo mismo que Producto.save (nombre_normalizado sin cortar, términos de hasta 40)
+def _normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]+', ' ', sin_acentos.lower()).strip()
+
+
+def _palabras(texto):
+    return [palabra[:40] for palabra in _normalizar(texto).split()]
+
+
+def indexar_productos(apps, schema_editor):
+    Producto = apps.get_model('CarritoApp', 'Producto')
+    TerminoProducto = apps.get_model('CarritoApp', 'TerminoProducto')
+    terminos = []
+    for producto in Producto.objects.only('id', 'nombre_producto').iterator(chunk_size=500):
+        palabras = _palabras(producto.nombre_producto)
+        Producto.objects.filter(pk=producto.pk).update(nombre_normalizado=_normalizar(producto.nombre_producto)[:255])
+        unicos = {('p', palabra) for palabra in palabras}
+        for palabra in palabras:
+            relleno = f'  {palabra} '
+            unicos.update(('t', relleno[i:i + 3]) for i in range(len(relleno) - 2))
+        terminos += [TerminoProducto(producto_id=producto.pk, tipo=tipo, termino=termino) for tipo, termino in unicos]
+        if len(terminos) >= 5000:
+            TerminoProducto.objects.bulk_create(terminos)
+            terminos = []
+    TerminoProducto.objects.bulk_create(terminos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0017_producto_miniaturas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='TerminoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('p', 'Palabra'), ('t', 'Trigrama')], max_length=1)),
+                ('termino', models.CharField(max_length=40)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='CarritoApp.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'termino'], name='CarritoApp__tipo_8e48d2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'tipo', 'termino'), name='termino_producto_unico')],
+            },
+        ),
+        migrations.RunPython(indexar_productos, migrations.RunPython.noop),
+    ]
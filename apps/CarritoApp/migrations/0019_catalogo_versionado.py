@@ -0,0 +1,27 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0018_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.PositiveIntegerField()),
+                ('version', models.PositiveIntegerField(db_index=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='version',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0020_carrito_en_base'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referencia', models.CharField(db_index=True, max_length=64)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada')], default='activa', max_length=12)),
+                ('vence', models.DateTimeField()),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('cerrada', models.DateTimeField(blank=True, null=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='CarritoApp.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'vence'], name='CarritoApp__estado_2d4267_idx')],
+            },
+        ),
+    ]
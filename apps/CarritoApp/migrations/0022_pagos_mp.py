@@ -0,0 +1,48 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CarritoApp', '0021_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutMP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referencia', models.CharField(max_length=64, unique=True)),
+                ('datos', models.JSONField(default=dict)),
+                ('payment_id', models.CharField(blank=True, db_index=True, default='', max_length=50)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('factura', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='checkouts_mp', to='CarritoApp.factura')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificacionMP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=30)),
+                ('recurso_id', models.CharField(max_length=50)),
+                ('cuerpo', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('finalizada', models.BooleanField(default=False)),
+                ('resultado', models.CharField(blank=True, default='', max_length=200)),
+                ('error', models.TextField(blank=True, default='')),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recibida', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciada', models.DateTimeField(blank=True, null=True)),
+                ('terminada', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='CarritoApp__estado_d1f52e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'recurso_id'), name='notificacion_mp_unica')],
+            },
+        ),
+    ]
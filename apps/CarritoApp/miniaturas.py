@@ -0,0 +1,59 @@
+#-------------------- Miniaturas de las imágenes de Producto ------------------------------------#
+# Cada imagen (imagen..imagen5) se reduce a los anchos de PRODUCTOS_MINIATURAS_ANCHOS con lo común
+# de prueba1/miniaturas.py (WebP y JPEG, sin EXIF, todo por default_storage). Se generan en la
+# cola de trabajos al guardar el producto (señal en signals.py) y `manage.py generar_miniaturas`
+# completa las que faltan. Lo generado queda en Producto.miniaturas y el tag {% imagen_producto %}
+# (templatetags/imagenes.py) arma el <picture> con srcset.
+import hashlib
+
+from django.conf import settings
+from PIL import UnidentifiedImageError
+
+from prueba1 import miniaturas as compartidas
+from prueba1.miniaturas import borrar_miniaturas, ruta_miniatura  # noqa: F401  (signals.py)
+
+from .models import Producto
+
+CAMPOS = ('imagen', 'imagen2', 'imagen3', 'imagen4', 'imagen5')
+ANCHOS = tuple(sorted(getattr(settings, 'PRODUCTOS_MINIATURAS_ANCHOS', (160, 320, 640))))
+
+
+def generar(nombre, forzar=False, anchos=ANCHOS):
+    """Miniaturas de una imagen de producto; no toca la base (el backfill la corre en otros procesos)."""
+    return compartidas.generar(nombre, anchos, forzar)
+
+
+def pendientes(producto, forzar=False):
+    """[(campo, nombre)] de las imágenes del producto sin miniaturas al día."""
+    return compartidas.pendientes(producto, CAMPOS, forzar)
+
+
+def guardar_resultados(producto_id, resultados):
+    """Registra lo generado en Producto.miniaturas (ver prueba1/miniaturas.guardar_resultados)."""
+    actuales, cambiaron = compartidas.guardar_resultados(Producto, producto_id, resultados, CAMPOS)
+    if cambiaron:  # la grilla cacheada de la tienda tiene el <picture> viejo
+        from .cache_tienda import invalidar_productos
+        invalidar_productos([producto_id])
+    return actuales
+
+
+def procesar_producto(producto, forzar=False):
+    resultados = {}
+    for campo, nombre in pendientes(producto, forzar):
+        try:
+            resultados[campo] = generar(nombre, forzar)
+        except (FileNotFoundError, UnidentifiedImageError, OSError):
+            continue  # sin miniatura la tienda muestra el original
+    guardar_resultados(producto.pk, resultados)
+    return resultados
+
+
+def encolar_producto(producto):
+    from .trabajos import encolar
+
+    faltan = pendientes(producto)
+    if not faltan:
+        return None
+    # la clave incluye los nombres: si se cambia otra imagen mientras corre, se encola de nuevo
+    huella = hashlib.sha1('|'.join(nombre for _, nombre in faltan).encode('utf-8')).hexdigest()[:16]
+    return encolar('miniaturas', {'producto_id': producto.pk}, clave=f'miniaturas:{producto.pk}:{huella}')
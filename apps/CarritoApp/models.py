@@ -25,7 +25,7 @@ from .models import Categ_producto
 class Producto(models.Model):
     numero_producto = models.PositiveIntegerField(unique=True, null=True, blank=True) 
 
-    nombre_producto = models.CharField(max_length=255, default="Nombre del producto")
+    nombre_producto = models.CharField(max_length=255, default="Nombre del producto", db_index=True)
     descripcion = models.TextField(default="Sin descripción")
     imagen = models.ImageField(upload_to='productos/', blank=False, null=False)
     categoria = models.ForeignKey(Categ_producto, on_delete=models.CASCADE,
@@ -40,9 +40,86 @@ class Producto(models.Model):
     imagen4 = models.ImageField(upload_to='productos/', null=True, blank=True)
     imagen5 = models.ImageField(upload_to='productos/', null=True, blank=True)
 
+    # Miniaturas generadas de cada imagen (ver miniaturas.py): {campo: {"nombre": original, "anchos": [...], "webp": bool}}
+    miniaturas = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Nombre en minúsculas, sin acentos ni signos (ver busqueda.py); lo completa save()
+    nombre_normalizado = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+
+    # Versión del catálogo del último cambio de número, nombre, precio o stock (ver catalogo.py)
+    version = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        from django.db import transaction
+        from .busqueda import normalizar
+        from .catalogo import CAMPOS_VERSIONADOS, nueva_version
+
+        self.nombre_normalizado = normalizar(self.nombre_producto)[:255]
+        update_fields = kwargs.get('update_fields')
+        # La versión y la fila se confirman juntas: el contador queda bloqueado hasta que la fila
+        # con esa versión es visible (sin esto, un save() suelto libera el contador antes de escribir)
+        with transaction.atomic():
+            if update_fields is None:
+                self.version = nueva_version()
+            else:
+                extra = set()
+                if 'nombre_producto' in update_fields:
+                    extra.add('nombre_normalizado')
+                if CAMPOS_VERSIONADOS & set(update_fields):
+                    self.version = nueva_version()
+                    extra.add('version')
+                kwargs['update_fields'] = {*update_fields, *extra}
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nombre_producto
 
+
+class ProductoBorrado(models.Model):
+    """Producto eliminado, para que la caja lo saque de su copia del catálogo (ver catalogo.py)."""
+    producto_id = models.PositiveIntegerField()
+    version = models.PositiveIntegerField(db_index=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Producto {self.producto_id} borrado (versión {self.version})'
+
+
+class TerminoProducto(models.Model):
+    """
+    Índice de búsqueda de productos (lo mantiene busqueda.indexar al guardar el producto):
+    una fila por palabra del nombre normalizado (se busca por prefijo) y una por trigrama
+    (para errores de tipeo y partes de palabra).
+    """
+    TIPOS = (
+        ('p', 'Palabra'),
+        ('t', 'Trigrama'),
+    )
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='terminos')
+    tipo = models.CharField(max_length=1, choices=TIPOS)
+    termino = models.CharField(max_length=40)
+
+    class Meta:
+        indexes = [models.Index(fields=['tipo', 'termino'])]
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'tipo', 'termino'], name='termino_producto_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.termino} ({self.get_tipo_display()})'
+
+
+def mapa_productos_por_nombre(nombres=None):
+    """
+    Devuelve {nombre_producto: id} en una sola consulta. Si hay nombres repetidos
+    gana el producto más nuevo. Sirve para resolver detalles viejos que solo tienen nombre.
+    """
+    qs = Producto.objects.order_by('id')
+    if nombres is not None:
+        qs = qs.filter(nombre_producto__in={n for n in nombres if n})
+    return dict(qs.values_list('nombre_producto', 'id'))
+
 #---------------------------------------------------------------#
 #----------------Compra----------------------------------------------#
 class Compra(models.Model):
@@ -55,18 +132,29 @@ class Compra(models.Model):
     provedor = models.ForeignKey('Provedor', on_delete=models.SET_NULL, null=True)
 
     def save(self, *args, **kwargs):
-        # Obtén el producto relacionado
-        producto = self.producto
-        if self.pk is None:  # Si es una nueva compra
-            producto.stock += self.cantidad  # Suma la cantidad al stock actual
-        else:
-            # Si se actualiza una compra existente, ajusta el stock
-            compra_original = Compra.objects.get(pk=self.pk)
-            diferencia = self.cantidad - compra_original.cantidad
-            producto.stock += diferencia
-
-        producto.save()  # Guarda los cambios en el producto
-        super().save(*args, **kwargs)  # Guarda la compra
+        # El stock se mueve con UPDATE atómicos (ver stock.py), nunca leyendo y guardando el producto
+        from django.db import transaction
+        from .stock import sumar_stock, descontar_stock, ajustar_stock
+
+        with transaction.atomic():
+            original = None
+            if self.pk is not None:  # Si se actualiza una compra existente, ajusta el stock
+                original = (
+                    Compra.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values('producto_id', 'cantidad')
+                    .first()
+                )
+
+            super().save(*args, **kwargs)  # Guarda la compra
+
+            if original is None:  # Si es una nueva compra
+                sumar_stock([(self.producto_id, self.cantidad)])
+            elif original['producto_id'] != self.producto_id:
+                descontar_stock([(original['producto_id'], original['cantidad'])])
+                sumar_stock([(self.producto_id, self.cantidad)])
+            else:
+                ajustar_stock(self.producto_id, self.cantidad - original['cantidad'])
 
 #---------------------------------------------------------------#
 #-----------------Venta----------------------------------------------#
@@ -82,6 +170,7 @@ class Venta(models.Model):
 #---------------------------------------------------------------#
 from django.db import models
 import uuid
+from decimal import Decimal, InvalidOperation
 from django.conf import settings  # si no está arriba
 class Factura(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -129,6 +218,10 @@ class Factura(models.Model):
     cuotas = models.IntegerField(default=0)
     #---------------------------------------------------------------#
     cuota_mensual = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Saldo del crédito (cuenta corriente). Se mantiene al registrar/borrar pagos,
+    # ver actualizar_saldo(); no se edita a mano.
+    total_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal(0), editable=False)
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal(0), editable=False, db_index=True)
     # ✅ Nuevos campos para tarjetas
     tarjeta_nombre = models.CharField(max_length=50, blank=True, null=True)  # Nombre de la tarjeta
     tarjeta_numero = models.CharField(max_length=20, blank=True, null=True)  # Número de tarjeta
@@ -148,39 +241,165 @@ class Factura(models.Model):
     def __str__(self):
         return f"Factura {self.numero_factura} - {self.nombre_cliente} {self.apellido_cliente}"
 
+    def save(self, *args, **kwargs):
+        # total_pagado lo escriben los pagos: se relee por si la instancia quedó vieja
+        # (ej. se cargó la factura, se registró un pago y después se guarda la factura)
+        if self.pk:
+            guardado = type(self).objects.filter(pk=self.pk).values_list('total_pagado', flat=True).first()
+            if guardado is not None:
+                self.total_pagado = guardado
+        # si cambia el total (edición de la factura) el saldo acompaña
+        self.saldo = Decimal(str(self.total_con_interes or 0)) - Decimal(str(self.total_pagado or 0))
+        super().save(*args, **kwargs)
+
     @property
     def estado_credito_real(self):
-        from django.db.models import Sum
-        from decimal import Decimal
-
-        pagos = self.cuenta_corriente.aggregate(
-            total_cuotas=Sum('imp_cuota_pagadas'),
-            total_entregas=Sum('entrega_cta')
-        )
-        total_cuotas = pagos['total_cuotas'] or Decimal(0)
-        total_entregas = pagos['total_entregas'] or Decimal(0)
-        total_pagado = total_cuotas + total_entregas
-        return "Pagado" if total_pagado >= self.total_con_interes else "Pendiente"
-
-
-#-------------esta parte del codigo no se si sirve---------------------#
+        return "Pagado" if self.saldo <= 0 else "Pendiente"
+
+    @classmethod
+    def actualizar_saldo(cls, factura_id):
+        """
+        Recalcula total_pagado y saldo desde los pagos de CuentaCorriente.
+        Lo llaman las señales de CuentaCorriente dentro de la misma transacción del pago.
+        """
+        from django.db import transaction
+        from django.db.models import F, Sum
+
+        with transaction.atomic():
+            pagos = CuentaCorriente.objects.filter(factura_id=factura_id).aggregate(
+                total_cuotas=Sum('imp_cuota_pagadas'),
+                total_entregas=Sum('entrega_cta')
+            )
+            total_pagado = (pagos['total_cuotas'] or Decimal(0)) + (pagos['total_entregas'] or Decimal(0))
+            cls.objects.filter(pk=factura_id).update(
+                total_pagado=total_pagado,
+                saldo=F('total_con_interes') - total_pagado,
+            )
+        return total_pagado
+
+
+#-------------Líneas de venta (una fila por producto vendido)---------------------#
 class FacturaProducto(models.Model):
-    factura = models.ForeignKey(Factura, on_delete=models.CASCADE)  # Relación con Factura
-    producto = models.ForeignKey('Producto', on_delete=models.CASCADE)  # Relación con Producto
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey('Producto', on_delete=models.SET_NULL, null=True, blank=True, related_name='lineas_venta')
+    nombre_producto = models.CharField(max_length=255, default="")  # copia del nombre al momento de la venta
     cantidad = models.PositiveIntegerField()  # Cantidad vendida de este producto
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal(0))
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)  # Subtotal por producto
+    fecha = models.DateField(db_index=True)  # misma fecha que la factura, para reportes sin JOIN
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["producto", "fecha"]),
+            models.Index(fields=["nombre_producto"]),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre_producto} x {self.cantidad} en {self.factura.numero_factura}"
+
+    @classmethod
+    def crear_desde_detalle(cls, factura, detalle):
+        """
+        Crea las líneas de una factura a partir de su detalle JSON (lista de dicts con
+        producto_id / numero_producto / nombre_producto, cantidad_vendida, precio_unitario, subtotal).
+        Resuelve los productos con una consulta por tipo de clave, no una por línea.
+        """
+        ids = {d.get('producto_id') for d in detalle if str(d.get('producto_id') or '').isdigit()}
+        numeros = {d.get('numero_producto') for d in detalle if str(d.get('numero_producto') or '').isdigit()}
+        nombres = {(d.get('nombre_producto') or '').strip() for d in detalle} - {''}
+
+        por_id = {p.id: p for p in Producto.objects.filter(id__in=[int(i) for i in ids])}
+        por_numero = {p.numero_producto: p for p in Producto.objects.filter(numero_producto__in=[int(n) for n in numeros])}
+        por_nombre = {}
+        for p in Producto.objects.filter(nombre_producto__in=nombres).order_by('id'):
+            por_nombre[p.nombre_producto] = p  # si hay nombres repetidos gana el más nuevo
+
+        lineas = []
+        for d in detalle:
+            nombre = (d.get('nombre_producto') or '').strip()
+            producto = (
+                por_id.get(int(d['producto_id'])) if str(d.get('producto_id') or '').isdigit() else None
+            ) or (
+                por_numero.get(int(d['numero_producto'])) if str(d.get('numero_producto') or '').isdigit() else None
+            ) or por_nombre.get(nombre)
+
+            try:
+                cantidad = int(float(d.get('cantidad_vendida') or 0))
+            except (TypeError, ValueError):
+                cantidad = 0
+            try:
+                precio = Decimal(str(d.get('precio_unitario') or 0))
+            except (InvalidOperation, ValueError):
+                precio = Decimal(0)
+            try:
+                subtotal = Decimal(str(d['subtotal'])) if d.get('subtotal') not in (None, '') else precio * cantidad
+            except (InvalidOperation, ValueError):
+                subtotal = precio * cantidad
+
+            lineas.append(cls(
+                factura=factura,
+                producto=producto,
+                nombre_producto=nombre or (producto.nombre_producto if producto else ''),
+                cantidad=max(cantidad, 0),
+                precio_unitario=precio,
+                subtotal=subtotal,
+                fecha=factura.fecha,
+            ))
+
+        return cls.objects.bulk_create(lineas)
+
+#-------------Numeración de facturas (contador con bloqueo de fila)---------------------#
+class Secuencia(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_valor = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.producto.nombre_producto} x {self.cantidad} en {self.factura.numero_factura}"
+        return f"{self.nombre}: {self.ultimo_valor}"
+
+    @staticmethod
+    def valor_inicial(nombre):
+        """Último número numérico ya usado (solo se consulta la primera vez que se crea el contador)."""
+        if nombre != 'factura':
+            return 0
+        from django.db.models import Max, IntegerField
+        from django.db.models.functions import Cast
+        ultimo = (
+            Factura.objects
+            .filter(numero_factura__regex=r'^[0-9]+$')
+            .annotate(numero=Cast('numero_factura', IntegerField()))
+            .aggregate(ultimo=Max('numero'))['ultimo']
+        )
+        return ultimo or 0
+
+    @classmethod
+    def siguiente(cls, nombre):
+        """
+        Reserva y devuelve el próximo número. Bloquea la fila del contador hasta el fin de la
+        transacción: si la factura falla y se hace rollback, el número vuelve a quedar libre.
+        """
+        from django.db import transaction
+        with transaction.atomic():
+            cls.objects.get_or_create(nombre=nombre, defaults={'ultimo_valor': cls.valor_inicial(nombre)})
+            secuencia = cls.objects.select_for_update().get(nombre=nombre)
+            secuencia.ultimo_valor += 1
+            secuencia.save(update_fields=['ultimo_valor'])
+            return secuencia.ultimo_valor
+
+    @classmethod
+    def ver_siguiente(cls, nombre):
+        """Próximo número solo para mostrar (no reserva nada ni toca la tabla de facturas)."""
+        ultimo = cls.objects.filter(nombre=nombre).values_list('ultimo_valor', flat=True).first()
+        if ultimo is None:
+            ultimo = cls.valor_inicial(nombre)
+        return ultimo + 1
+
 
 def generar_numero_factura():
-        ultima_factura = Factura.objects.all().order_by('id').last()
-        if ultima_factura:
-            ultimo_numero = int(ultima_factura.numero_factura)
-            nuevo_numero = f"{ultimo_numero + 1:05d}"
-        else:
-            nuevo_numero = "00001"
-        return nuevo_numero
+    return f"{Secuencia.siguiente('factura'):05d}"
+
+
+def ver_proximo_numero_factura():
+    return f"{Secuencia.ver_siguiente('factura'):05d}"
 
 
 #----------------------es de la tarjetas para cargar cuotas--------------------#
@@ -332,3 +551,195 @@ class ChatEstado(models.Model):
 
     def __str__(self):
         return f"{self.nombre_cliente or self.cleaned_sender_pn} - {self.paso}"
+
+#----------------- Resumen de caja diario (cierre de caja pre-calculado) ---------------------#
+class ResumenCajaDiario(models.Model):
+    """
+    Totales de caja por día, vendedor y método. Se mantiene con las señales de
+    Factura / CuentaCorriente / Turno (ver resumen_caja.py) y se repara con
+    `manage.py reconstruir_resumen_caja`.
+    """
+    TIPOS = [
+        ('factura', 'Factura'),
+        ('pago', 'Pago cuenta corriente'),
+        ('turno', 'Turno'),
+    ]
+
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    vendedor = models.CharField(max_length=100, blank=True, default='')
+    metodo = models.CharField(max_length=100, blank=True, default='')
+    metodo_tarjeta = models.BooleanField(default=False)  # True si el método viene del FK MetodoPago
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0))
+    pendiente = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal(0))  # solo pagos de cta cte
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo', 'vendedor', 'metodo', 'metodo_tarjeta'],
+                name='resumen_caja_diario_unico',
+            ),
+        ]
+        indexes = [models.Index(fields=['tipo', 'fecha'])]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.vendedor} {self.metodo}: {self.total}"
+
+#----------------- Cola de trabajos de render (PDF / imágenes en segundo plano) ---------------------#
+class TrabajoRender(models.Model):
+    """
+    Un PDF o imagen pendiente de generar. Las vistas lo encolan y responden enseguida;
+    `manage.py procesar_trabajos` los toma y los genera (ver trabajos.py).
+    """
+    TIPOS = [
+        ('factura_pdf', 'PDF de factura'),
+        ('ticket_mp', 'Ticket Mercado Pago (PNG)'),
+        ('presupuesto_pdf', 'PDF de presupuesto'),
+        ('respaldo_db', 'Respaldo de la base'),  # lo registra apps.backup
+        ('miniaturas', 'Miniaturas de producto'),
+    ]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)  # el que viaja en las URLs
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='pendiente')
+    clave = models.CharField(max_length=150, blank=True, default='', db_index=True)  # evita encolar dos veces lo mismo
+    parametros = models.JSONField(default=dict, blank=True)
+    factura = models.ForeignKey(Factura, on_delete=models.CASCADE, null=True, blank=True, related_name='trabajos_render')
+    archivo = models.CharField(max_length=255, blank=True, default='')  # ruta relativa a MEDIA_ROOT
+    error = models.TextField(blank=True, default='')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'creado'])]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.estado})"
+
+#----------------- Carrito de compras de la tienda (en la base, no en la sesión) ---------------------#
+class CarritoCompra(models.Model):
+    """
+    Carrito de la tienda. El del usuario logueado es uno solo y sobrevive al vencimiento de la
+    sesión; el de un visitante queda sin usuario y la sesión guarda solo su id. Al iniciar sesión
+    los ítems del visitante pasan al carrito del usuario (ver Carrito.py).
+    """
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        null=True, blank=True, related_name='carritos_compra',
+    )
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # para limpiar los abandonados
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario'], name='carrito_compra_usuario_unico'),
+        ]
+
+    def __str__(self):
+        return f"Carrito #{self.pk} ({self.usuario or 'visitante'})"
+
+
+class ItemCarrito(models.Model):
+    carrito = models.ForeignKey(CarritoCompra, on_delete=models.CASCADE, related_name='items')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='items_carrito')
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)  # precio al agregarlo
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='item_carrito_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} (carrito #{self.carrito_id})"
+
+
+#----------------- Reservas de stock del checkout de Mercado Pago ---------------------#
+class ReservaStock(models.Model):
+    """
+    Unidades apartadas mientras el comprador paga en Mercado Pago (ver reservas.py). El stock
+    se descuenta al reservar; si el pago se aprueba la reserva queda confirmada y si falla o
+    vence (`manage.py liberar_reservas`) las unidades vuelven al stock.
+    """
+    ESTADOS = [
+        ('activa', 'Activa'),
+        ('confirmada', 'Confirmada'),
+        ('liberada', 'Liberada'),
+    ]
+
+    referencia = models.CharField(max_length=64, db_index=True)  # external_reference de la preferencia
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='activa')
+    vence = models.DateTimeField()
+    creada = models.DateTimeField(auto_now_add=True)
+    cerrada = models.DateTimeField(null=True, blank=True)  # cuándo se confirmó o liberó
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'vence'])]
+
+    def __str__(self):
+        return f"{self.referencia}: {self.cantidad} x {self.producto_id} ({self.estado})"
+
+
+#----------------- Pagos de Mercado Pago: compras pendientes y notificaciones ---------------------#
+from django.utils import timezone
+
+class CheckoutMP(models.Model):
+    """
+    Datos de una compra enviada a Mercado Pago (cliente, total, detalle), por su external_reference.
+    Con esto la factura se puede crear desde el webhook aunque el comprador no vuelva (ver pagos_mp.py).
+    """
+    referencia = models.CharField(max_length=64, unique=True)
+    datos = models.JSONField(default=dict)
+    payment_id = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    factura = models.ForeignKey(Factura, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkouts_mp')
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.referencia} ({'facturado' if self.factura_id else 'sin facturar'})"
+
+
+class NotificacionMP(models.Model):
+    """
+    Bandeja de entrada del webhook de Mercado Pago: el webhook solo la guarda y responde, y
+    `manage.py procesar_pagos_mp` la procesa con reintentos (ver pagos_mp.py).
+    Una fila por recurso: las notificaciones repetidas del mismo pago la vuelven a poner pendiente.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=30)             # payment, merchant_order, ...
+    recurso_id = models.CharField(max_length=50)       # data.id (el payment_id en los pagos)
+    cuerpo = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='pendiente')
+    finalizada = models.BooleanField(default=False)    # el pago llegó a un estado que ya no cambia
+    resultado = models.CharField(max_length=200, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    recibida = models.DateTimeField(default=timezone.now)  # última vez que llegó
+    iniciada = models.DateTimeField(null=True, blank=True)
+    terminada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'recurso_id'], name='notificacion_mp_unica'),
+        ]
+        indexes = [models.Index(fields=['estado', 'proximo_intento'])]
+
+    def __str__(self):
+        return f"{self.tipo} {self.recurso_id} ({self.estado})"
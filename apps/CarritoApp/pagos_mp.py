@@ -0,0 +1,262 @@
+#-------------------- Pagos de Mercado Pago: API, facturación y notificaciones ------------------------------------#
+# La factura de una compra con MP ya no depende de que el comprador vuelva a pago_exitoso:
+#   - mp_checkout guarda los datos de la compra en CheckoutMP (por external_reference)
+#   - el webhook guarda cada aviso en NotificacionMP y responde enseguida (recibir())
+#   - `manage.py procesar_pagos_mp` consulta el pago en la API y factura / libera la reserva de
+#     stock; si la API falla reintenta con espera creciente (REINTENTO_BASE * 2^intentos)
+# facturar() es idempotente por compra: la vuelta del comprador y el worker pueden llegar a la vez
+# (la fila de CheckoutMP se bloquea) y el segundo recibe la misma factura.
+# La API se usa a través de cliente(): settings.MP_CLIENTE puede apuntar a otra clase con el
+# método pago(payment_id) (ej. ClienteMPMemoria para pruebas, sin red).
+import json
+import logging
+from datetime import date, timedelta
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import reservas
+from .models import CheckoutMP, Factura, FacturaProducto, NotificacionMP, generar_numero_factura, mapa_productos_por_nombre
+from .stock import descontar_stock
+from .trabajos import encolar
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = getattr(settings, 'MP_API_TIMEOUT', 10)   # segundos (conexión y lectura)
+MAX_INTENTOS = 8
+REINTENTO_BASE = timedelta(seconds=30)
+REINTENTO_MAXIMO = timedelta(hours=1)
+TIEMPO_MAXIMO = timedelta(minutes=10)  # "procesando" más que esto: worker caído, se reintenta
+FINALES = {'approved', 'rejected', 'cancelled', 'refunded', 'charged_back'}
+
+
+class ErrorMP(Exception):
+    """La API de Mercado Pago no respondió o respondió con error (se puede reintentar)."""
+
+
+class PagoInexistente(ErrorMP):
+    """La API respondió 404: el aviso no es de un pago real (no se reintenta)."""
+
+
+#-------------------- Cliente de la API ------------------------------------#
+class ClienteMP:
+    """Cliente real: GET /v1/payments/<id> con el access token de settings y timeout."""
+    URL_PAGO = 'https://api.mercadopago.com/v1/payments/{}'
+
+    def __init__(self, token=None, timeout=TIMEOUT):
+        self.token = token if token is not None else settings.MP_ACCESS_TOKEN
+        self.timeout = timeout
+
+    def pago(self, payment_id):
+        """Dict del pago (status, external_reference, transaction_amount, ...)."""
+        try:
+            respuesta = requests.get(
+                self.URL_PAGO.format(payment_id),
+                headers={'Authorization': f'Bearer {self.token}'},
+                timeout=self.timeout,
+            )
+            if respuesta.status_code == 404:
+                raise PagoInexistente(f'Pago {payment_id} inexistente')
+            respuesta.raise_for_status()
+            return respuesta.json()
+        except (requests.RequestException, ValueError) as e:
+            raise ErrorMP(f'{type(e).__name__}: {e}') from e
+
+
+class ClienteMPMemoria:
+    """Cliente sin red para pruebas: ClienteMPMemoria.pagos = {"123": {"status": "approved", ...}}."""
+    pagos = {}
+
+    def pago(self, payment_id):
+        try:
+            return dict(self.pagos[str(payment_id)], id=payment_id)
+        except KeyError:
+            raise PagoInexistente(f'Pago {payment_id} inexistente') from None
+
+
+def cliente():
+    return import_string(getattr(settings, 'MP_CLIENTE', 'apps.CarritoApp.pagos_mp.ClienteMP'))()
+
+
+#-------------------- Compras y facturas ------------------------------------#
+def guardar_checkout(referencia, datos):
+    return CheckoutMP.objects.create(referencia=referencia, datos=datos)
+
+
+def checkout_de(referencia, datos=None):
+    """
+    CheckoutMP de la referencia. Las compras iniciadas antes de CheckoutMP solo tienen los datos
+    en la sesión: con `datos` se crea ahí mismo. None si no hay con qué facturar.
+    """
+    if referencia:
+        checkout = CheckoutMP.objects.filter(referencia=referencia).first()
+        if checkout is not None:
+            return checkout
+    if not datos:
+        return None
+    referencia = referencia or datos.get('referencia')
+    if not referencia:
+        return None
+    try:
+        return CheckoutMP.objects.get_or_create(referencia=referencia, defaults={'datos': datos})[0]
+    except IntegrityError:  # el worker lo creó en el medio
+        return CheckoutMP.objects.get(referencia=referencia)
+
+
+def facturar(checkout, pago):
+    """
+    Crea la factura del pago aprobado (una sola vez por compra), confirma la reserva de stock y
+    encola el ticket. Devuelve (factura, faltantes de stock).
+    """
+    payment_id = str(pago.get('id') or '')
+    with transaction.atomic():
+        checkout = CheckoutMP.objects.select_for_update().select_related('factura').get(pk=checkout.pk)
+        if checkout.factura is not None:
+            return checkout.factura, []
+
+        datos = checkout.datos
+        factura = Factura.objects.create(
+            numero_factura=generar_numero_factura(),
+            fecha=date.today(),
+            dni_cliente=datos.get('dni'),
+            nombre_cliente=datos.get('nombre', ''),
+            apellido_cliente=datos.get('apellido', ''),
+            metodo_pago_manual='Mercado Pago',
+            total=datos['total'],
+            total_con_interes=datos['total'],
+            vendedor='Carrito Web',
+            detalle_productos=json.dumps(datos['detalle'], ensure_ascii=False),
+            numero_tiket=payment_id,   # ← Referencia de pago de MP
+        )
+        FacturaProducto.crear_desde_detalle(factura, datos['detalle'])
+
+        # Stock: se confirma la reserva de mp_checkout (reservas.py). Sin reserva (compra vieja)
+        # se descuenta por id (o por nombre si no hay id). El pago ya entró: si falta stock se vende igual.
+        faltantes = reservas.confirmar(checkout.referencia)
+        if faltantes is None:
+            ids_por_nombre = mapa_productos_por_nombre(item['nombre_producto'] for item in datos['detalle'])
+            lineas = []
+            for item in datos['detalle']:
+                producto_id = item.get('producto_id')
+                if not str(producto_id or '').isdigit():
+                    producto_id = ids_por_nombre.get(item['nombre_producto'])
+                if producto_id:
+                    lineas.append((producto_id, item['cantidad_vendida']))
+            faltantes = descontar_stock(lineas, permitir_faltantes=True)
+
+        checkout.factura = factura
+        checkout.payment_id = payment_id
+        checkout.save(update_fields=['factura', 'payment_id'])
+
+        # La imagen del comprobante se dibuja en segundo plano (procesar_trabajos)
+        encolar('ticket_mp', {
+            'payment_id': payment_id,
+            'monto': pago.get('transaction_amount'),
+            'fecha_aprob': pago.get('date_approved', ''),
+            'external_ref': pago.get('external_reference', ''),
+            'payer_email': (pago.get('payer') or {}).get('email', ''),
+        }, factura=factura, clave=f'ticket_mp:{payment_id}')
+
+    if faltantes:
+        logger.warning("Factura %s vendida sin stock suficiente: %s", factura.numero_factura, faltantes)
+    return factura, faltantes
+
+
+#-------------------- Bandeja de notificaciones ------------------------------------#
+def recibir(tipo, recurso_id, cuerpo):
+    """Guarda el aviso del webhook (o vuelve a poner pendiente el del mismo recurso). No llama a la API."""
+    tipo, recurso_id = (tipo or 'desconocido')[:30], str(recurso_id or '')[:50]
+    ahora = timezone.now()
+    notificacion, creada = NotificacionMP.objects.get_or_create(
+        tipo=tipo, recurso_id=recurso_id, defaults={'cuerpo': cuerpo or {}},
+    )
+    if not creada:
+        # Un pago cambia de estado (pending -> approved) y MP avisa de nuevo. Si ya terminó no se toca;
+        # si se está procesando, `recibida` posterior a `iniciada` hace que se procese otra vez
+        (NotificacionMP.objects.filter(pk=notificacion.pk, finalizada=False)
+         .update(cuerpo=cuerpo or {}, recibida=ahora))
+        (NotificacionMP.objects.filter(pk=notificacion.pk, finalizada=False)
+         .exclude(estado='procesando')
+         .update(estado='pendiente', intentos=0, proximo_intento=ahora, error=''))
+    return notificacion
+
+
+def _reclamar(notificacion_id):
+    return NotificacionMP.objects.filter(pk=notificacion_id, estado='pendiente').update(
+        estado='procesando', iniciada=timezone.now(), intentos=F('intentos') + 1,
+    )
+
+
+def tomar_siguiente():
+    """Reclama la notificación pendiente más vieja que ya puede intentarse. None si no hay."""
+    ahora = timezone.now()
+    NotificacionMP.objects.filter(estado='procesando', iniciada__lt=ahora - TIEMPO_MAXIMO).update(estado='pendiente')
+    candidatas = (
+        NotificacionMP.objects
+        .filter(estado='pendiente', proximo_intento__lte=ahora)
+        .order_by('proximo_intento', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for notificacion_id in candidatas:
+        if _reclamar(notificacion_id):
+            return NotificacionMP.objects.get(pk=notificacion_id)
+    return None
+
+
+def _aplicar(notificacion, api):
+    """Hace lo que corresponde al aviso. Devuelve (finalizada, resultado)."""
+    if notificacion.tipo != 'payment' or not notificacion.recurso_id:
+        return True, 'Ignorada (no es de un pago)'
+
+    try:
+        pago = api.pago(notificacion.recurso_id)
+    except PagoInexistente as e:
+        return True, str(e)
+    estado = pago.get('status', '')
+    referencia = pago.get('external_reference') or ''
+    if estado == 'approved':
+        checkout = checkout_de(referencia)
+        if checkout is None:
+            return True, f'Aprobado sin compra de la tienda ({referencia or "sin referencia"})'
+        factura, faltantes = facturar(checkout, pago)
+        return True, f'Factura {factura.numero_factura}' + (' (con faltantes de stock)' if faltantes else '')
+    reservas.segun_estado_pago(referencia, estado)
+    return estado in FINALES, f'Pago {estado or "sin estado"}'
+
+
+def procesar(notificacion, api=None):
+    """Procesa una notificación ya reclamada y deja el resultado (o el próximo reintento) en la tabla."""
+    ahora = timezone.now()
+    try:
+        finalizada, resultado = _aplicar(notificacion, api or cliente())
+    except Exception as e:  # ErrorMP (red, API) o de la base: se reintenta más tarde
+        notificacion.error = f'{type(e).__name__}: {e}'
+        if notificacion.intentos >= MAX_INTENTOS:
+            notificacion.estado = 'error'
+        else:
+            notificacion.estado = 'pendiente'
+            notificacion.proximo_intento = ahora + min(REINTENTO_BASE * 2 ** (notificacion.intentos - 1), REINTENTO_MAXIMO)
+        notificacion.terminada = ahora
+        notificacion.save(update_fields=['estado', 'error', 'proximo_intento', 'terminada'])
+        return notificacion
+
+    notificacion.finalizada, notificacion.resultado, notificacion.error = finalizada, resultado[:200], ''
+    notificacion.terminada = ahora
+    # Si llegó otro aviso del mismo recurso mientras se procesaba, queda pendiente para releer el pago
+    notificacion.estado = 'listo'
+    if not finalizada and NotificacionMP.objects.filter(pk=notificacion.pk, recibida__gt=notificacion.iniciada).exists():
+        notificacion.estado = 'pendiente'
+        notificacion.proximo_intento = ahora
+    notificacion.save(update_fields=['estado', 'finalizada', 'resultado', 'error', 'proximo_intento', 'terminada'])
+    return notificacion
+
+
+def purgar(dias=30):
+    """Borra notificaciones terminadas hace más de `dias`."""
+    return NotificacionMP.objects.filter(
+        estado='listo', finalizada=True, terminada__lt=timezone.now() - timedelta(days=dias),
+    ).delete()[0]
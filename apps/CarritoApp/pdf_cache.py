@@ -0,0 +1,157 @@
+#-------------------- Cache de PDFs de factura ------------------------------------#
+# Cada PDF se guarda en MEDIA_ROOT/facturas/cache/<tipo>_<id>_<huella>.pdf, donde la
+# huella es un hash de los campos de la factura y sus líneas (detalle_productos).
+# Si la factura no cambió, el archivo ya existe y se sirve tal cual (con ETag y
+# Last-Modified, respondiendo 304 si el navegador ya lo tiene); si cambió, la huella
+# es otra, se genera un archivo nuevo y se borran las versiones viejas.
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+CARPETA = os.path.join('facturas', 'cache')
+
+# Campos que no salen en ningún PDF: cambiarlos no debe regenerar nada
+CAMPOS_IGNORADOS = {'imagen_factura', 'total_pagado', 'saldo', 'estado_entrega'}
+
+# Subir la versión de un tipo cuando cambia su diseño, así se regeneran todos
+VERSIONES = {
+    'resumen': 1,
+    'web': 1,
+    'prueba': 1,
+}
+
+MAX_BYTES = getattr(settings, 'FACTURAS_PDF_CACHE_MAX_MB', 500) * 1024 * 1024
+MAX_DIAS = getattr(settings, 'FACTURAS_PDF_CACHE_MAX_DIAS', 90)
+
+
+def _carpeta():
+    ruta = os.path.join(settings.MEDIA_ROOT, CARPETA)
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def huella_factura(factura, tipo):
+    """Hash del contenido que se imprime (campos de la factura + líneas + método de pago)."""
+    # valores como van a la base, así 200 y Decimal('200.00') dan la misma huella
+    datos = {
+        campo.attname: campo.get_db_prep_save(getattr(factura, campo.attname), connection)
+        for campo in factura._meta.concrete_fields
+        if campo.name not in CAMPOS_IGNORADOS
+    }
+    datos['metodo_pago_nombre'] = str(factura.metodo_pago) if factura.metodo_pago_id else None
+    datos['tipo'] = tipo
+    datos['version'] = VERSIONES.get(tipo, 1)
+    crudo = json.dumps(datos, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(crudo).hexdigest()[:32]
+
+
+def ruta_pdf(factura, tipo):
+    """(ruta, huella) que le corresponde a la versión actual de la factura, exista o no."""
+    huella = huella_factura(factura, tipo)
+    return os.path.join(_carpeta(), f'{tipo}_{factura.pk}_{huella}.pdf'), huella
+
+
+def pdf_factura(factura, tipo, dibujar):
+    """
+    Devuelve (ruta, huella) del PDF de la factura. `dibujar(factura, ruta)` escribe el PDF
+    y solo se llama si no existe un archivo con la huella actual.
+    """
+    ruta, huella = ruta_pdf(factura, tipo)
+    carpeta = os.path.dirname(ruta)
+    prefijo = f'{tipo}_{factura.pk}_'
+
+    if os.path.exists(ruta):
+        return ruta, huella
+
+    # Se dibuja en un temporal y se renombra: nunca se sirve un PDF a medio escribir
+    temporal = os.path.join(carpeta, f'.{prefijo}{uuid.uuid4().hex}.tmp')
+    try:
+        dibujar(factura, temporal)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    # Versiones anteriores de la misma factura
+    for entrada in os.scandir(carpeta):
+        if entrada.name.startswith(prefijo) and entrada.name.endswith('.pdf') and entrada.path != ruta:
+            _borrar(entrada.path)
+
+    limpiar_cache(conservar=ruta)
+    return ruta, huella
+
+
+def url_pdf(ruta):
+    """URL pública (MEDIA_URL) de un PDF del cache. El nombre cambia con el contenido."""
+    return f"{settings.MEDIA_URL}{CARPETA.replace(os.sep, '/')}/{os.path.basename(ruta)}"
+
+
+def respuesta_pdf(request, factura, tipo, dibujar, nombre_archivo, adjunto=False):
+    """FileResponse del PDF con ETag / Last-Modified; 304 si el cliente ya tiene esta versión."""
+    ruta, huella = pdf_factura(factura, tipo, dibujar)
+    etag = f'"{huella}"'
+    modificado = int(os.path.getmtime(ruta))
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=modificado)
+    if no_modificado is not None:
+        return no_modificado
+
+    response = FileResponse(
+        open(ruta, 'rb'), content_type='application/pdf',
+        as_attachment=adjunto, filename=nombre_archivo,
+    )
+    if not adjunto:
+        response['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modificado)
+    response['Cache-Control'] = 'private, no-cache'  # siempre revalida, pero con 304
+    return response
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def limpiar_cache(max_bytes=None, max_dias=None, conservar=None):
+    """
+    Borra los PDFs más viejos que max_dias y, si el total sigue pasando max_bytes,
+    los de uso más antiguo hasta entrar (menos `conservar`, el recién generado).
+    Devuelve (borrados, bytes_restantes).
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    max_dias = MAX_DIAS if max_dias is None else max_dias
+    limite = time.time() - max_dias * 86400
+
+    archivos = []
+    borrados = 0
+    for entrada in os.scandir(_carpeta()):
+        if not entrada.is_file() or entrada.path == conservar:
+            continue
+        info = entrada.stat()
+        # atime si el filesystem lo registra, si no mtime
+        uso = max(info.st_atime, info.st_mtime)
+        if uso < limite:
+            _borrar(entrada.path)
+            borrados += 1
+        else:
+            archivos.append((uso, info.st_size, entrada.path))
+
+    total = sum(tam for _, tam, _ in archivos)
+    for _, tam, ruta in sorted(archivos):
+        if total <= max_bytes:
+            break
+        _borrar(ruta)
+        total -= tam
+        borrados += 1
+    return borrados, total
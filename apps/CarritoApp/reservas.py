@@ -0,0 +1,113 @@
+#-------------------- Reservas de stock durante el checkout de Mercado Pago ------------------------------------#
+# Antes el stock se descontaba en pago_exitoso, cuando el comprador volvía de MP: dos personas podían
+# pagar la última unidad. Ahora mp_checkout reserva (descuenta) las unidades al crear la preferencia,
+# a nombre de su external_reference, por RESERVA_STOCK_MINUTOS (la preferencia vence al mismo tiempo):
+#   - pago aprobado -> confirmar(): la reserva queda confirmada, el stock ya estaba descontado
+#   - pago rechazado / cancelado / vuelta por "fallo" -> liberar(): las unidades vuelven al stock
+#   - nadie pagó -> liberar_vencidas() (`manage.py liberar_reservas`, y un lote chico en cada reserva)
+# Si un pago se aprueba después de que su reserva venció, se vuelve a descontar permitiendo faltantes
+# (el pago ya entró), igual que antes de las reservas. Las transiciones toman las filas con
+# SELECT ... FOR UPDATE: un pago que se confirma mientras el barrido la libera no se cuenta dos veces.
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReservaStock
+from .stock import _agrupar, descontar_stock, sumar_stock
+
+MINUTOS = getattr(settings, 'RESERVA_STOCK_MINUTOS', 30)
+LOTE = 500
+RECHAZADOS = {'rejected', 'cancelled'}  # estados de pago de MP que no van a aprobarse
+
+
+def reservar(referencia, lineas, minutos=MINUTOS):
+    """
+    Descuenta y aparta `lineas` [(producto_id, cantidad)] a nombre de `referencia`. Devuelve el
+    vencimiento. StockInsuficiente (sin reservar nada) si algún producto no alcanza.
+    """
+    # que una reserva abandonada no le gane a este comprador; un solo lote chico: el resto lo barre
+    # `manage.py liberar_reservas`, no el request del comprador
+    liberar_vencidas(lote=50, max_lotes=1)
+    cantidades = _agrupar(lineas)
+    vence = timezone.now() + timedelta(minutes=minutos)
+    with transaction.atomic():
+        descontar_stock(cantidades.items())
+        ReservaStock.objects.bulk_create([
+            ReservaStock(referencia=referencia, producto_id=producto_id, cantidad=cantidad, vence=vence)
+            for producto_id, cantidad in cantidades.items()
+        ])
+    return vence
+
+
+def _cerrar(ids, estado):
+    ReservaStock.objects.filter(id__in=ids).update(estado=estado, cerrada=timezone.now())
+
+
+def confirmar(referencia):
+    """
+    Pago aprobado. Devuelve los faltantes (lista vacía si todo estaba reservado) o None si la
+    referencia no tiene reservas (checkout anterior a las reservas: el stock lo descuenta quien llama).
+    Se puede llamar más de una vez (vuelta del comprador y webhook): la segunda no hace nada.
+    """
+    if not referencia:
+        return None
+    with transaction.atomic():
+        filas = list(
+            ReservaStock.objects.select_for_update().filter(referencia=referencia)
+            .values_list('id', 'producto_id', 'cantidad', 'estado')
+        )
+        if not filas:
+            return None
+        _cerrar([pk for pk, _, _, estado in filas if estado != 'confirmada'], 'confirmada')
+        vencidas = [(producto_id, cantidad) for _, producto_id, cantidad, estado in filas if estado == 'liberada']
+        return descontar_stock(vencidas, permitir_faltantes=True) if vencidas else []
+
+
+def liberar(referencia):
+    """Pago fallido o cancelado: las unidades reservadas vuelven al stock. Devuelve cuántas reservas liberó."""
+    if not referencia:
+        return 0
+    with transaction.atomic():
+        filas = list(
+            ReservaStock.objects.select_for_update().filter(referencia=referencia, estado='activa')
+            .values_list('id', 'producto_id', 'cantidad')
+        )
+        if filas:
+            _cerrar([pk for pk, _, _ in filas], 'liberada')
+            sumar_stock((producto_id, cantidad) for _, producto_id, cantidad in filas)
+    return len(filas)
+
+
+def segun_estado_pago(referencia, estado):
+    """Aplica el estado de un pago de MP: confirma si está aprobado, libera si no se va a aprobar."""
+    if estado == 'approved':
+        return confirmar(referencia)
+    if estado in RECHAZADOS:
+        liberar(referencia)
+    return None
+
+
+def liberar_vencidas(lote=LOTE, max_lotes=None):
+    """
+    Devuelve al stock las reservas activas vencidas, de a `lote` por transacción (como mucho
+    `max_lotes` transacciones; None: hasta que no quede ninguna). Devuelve cuántas liberó.
+    """
+    total = 0
+    lotes = 0
+    while True:
+        with transaction.atomic():
+            filas = list(
+                ReservaStock.objects.select_for_update(skip_locked=True)  # las que se están confirmando, después
+                .filter(estado='activa', vence__lt=timezone.now())
+                .order_by('vence')
+                .values_list('id', 'producto_id', 'cantidad')[:lote]
+            )
+            if filas:
+                _cerrar([pk for pk, _, _ in filas], 'liberada')
+                sumar_stock((producto_id, cantidad) for _, producto_id, cantidad in filas)
+        total += len(filas)
+        lotes += 1
+        if len(filas) < lote or (max_lotes is not None and lotes >= max_lotes):
+            return total
@@ -0,0 +1,251 @@
+#-------------------- Resumen de caja diario ------------------------------------#
+# Cada factura, pago de cuenta corriente y turno "aporta" a una fila de
+# ResumenCajaDiario (fecha, tipo, vendedor, método). Las señales suman/restan ese
+# aporte al guardar o borrar, y los reportes de caja suman esas filas en lugar de
+# recorrer todas las facturas.
+# El aporte también depende de registros relacionados: el vendedor y el método de la
+# factura (para sus pagos de cta cte), el nombre del MetodoPago y el precio del Motivo
+# del turno. Si cambian, cambio_factura / cambio_metodo_pago / cambio_motivo mueven los
+# aportes de los registros que los usan.
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db import models
+from django.db.models import F, Sum
+from django.db.models.functions import Lower, Trim
+
+from .models import Factura, CuentaCorriente, ResumenCajaDiario
+
+CUENTA_CORRIENTE = 'cuenta corriente'
+
+
+def _decimal(valor):
+    # las vistas a veces guardan floats o strings antes de que el modelo los convierta
+    return Decimal(str(valor or 0))
+
+
+def _fecha(valor):
+    return models.DateField().to_python(valor) if valor else None
+
+
+def _metodo_factura(factura):
+    """(nombre del método, viene del FK MetodoPago) con la misma prioridad que el listado de caja."""
+    if factura.metodo_pago_id:
+        return (factura.metodo_pago.tarjeta_nombre or '').strip(), True
+    return (factura.metodo_pago_manual or '').strip() or 'Sin especificar', False
+
+
+def aporte_factura(factura):
+    metodo, metodo_tarjeta = _metodo_factura(factura)
+    clave = (_fecha(factura.fecha), 'factura', (factura.vendedor or '')[:100], metodo[:100], metodo_tarjeta)
+    return clave, 1, _decimal(factura.total_con_interes), Decimal(0)
+
+
+def aporte_pago(pago):
+    factura = pago.factura
+    metodo, metodo_tarjeta = _metodo_factura(factura)
+    cobrado = _decimal(pago.imp_cuota_pagadas) + _decimal(pago.entrega_cta)
+    pendiente = _decimal(pago.total_con_interes) - cobrado
+    clave = (_fecha(pago.fecha_cuota), 'pago', (factura.vendedor or '')[:100], metodo[:100], metodo_tarjeta)
+    return clave, 1, cobrado, pendiente
+
+
+def aporte_turno(turno):
+    clave = (_fecha(turno.fecha), 'turno', '', '', False)
+    return clave, 1, _decimal(turno.motivo.precio), Decimal(0)
+
+
+def _acumular(acumulado, aporte, signo=1):
+    clave, cantidad, total, pendiente = aporte
+    fila = acumulado[clave]
+    fila[0] += signo * cantidad
+    fila[1] += signo * total
+    fila[2] += signo * pendiente
+
+
+def aplicar(aporte, signo=1):
+    """Suma (signo=1) o resta (signo=-1) un aporte con UPDATE ... SET total = total + x."""
+    if aporte is None:
+        return
+    (fecha, tipo, vendedor, metodo, metodo_tarjeta), cantidad, total, pendiente = aporte
+    if fecha is None:
+        return
+    with transaction.atomic():
+        fila, _ = ResumenCajaDiario.objects.get_or_create(
+            fecha=fecha, tipo=tipo, vendedor=vendedor, metodo=metodo, metodo_tarjeta=metodo_tarjeta,
+        )
+        ResumenCajaDiario.objects.filter(pk=fila.pk).update(
+            cantidad=F('cantidad') + signo * cantidad,
+            total=F('total') + signo * total,
+            pendiente=F('pendiente') + signo * pendiente,
+        )
+
+
+def reemplazar(previo, nuevo):
+    """Aplica el cambio de un registro editado (saca el aporte viejo y suma el nuevo)."""
+    if previo == nuevo:
+        return
+    with transaction.atomic():
+        aplicar(previo, -1)
+        aplicar(nuevo, 1)
+
+
+#-------------------- Cambios en registros relacionados ------------------------------------#
+def _mover_aportes(registros, aporte, poner, anterior, nuevo):
+    """
+    Cambia los aportes de `registros` de como eran con `anterior` a como son con `nuevo`.
+    poner(registro, version) cambia en memoria el registro relacionado. Se toca una
+    sola vez cada fila del resumen.
+    """
+    acumulado = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for registro in registros.iterator(chunk_size=2000):
+        poner(registro, anterior)
+        _acumular(acumulado, aporte(registro), -1)
+        poner(registro, nuevo)
+        _acumular(acumulado, aporte(registro))
+    with transaction.atomic():
+        for clave, (cantidad, total, pendiente) in acumulado.items():
+            if cantidad or total or pendiente:
+                aplicar((clave, cantidad, total, pendiente))
+
+
+def _clave_factura(factura):
+    return (factura.vendedor or '')[:100], _metodo_factura(factura)
+
+
+def cambio_factura(anterior, factura):
+    """Factura editada: si cambió el vendedor o el método, sus pagos de cta cte pasan a la fila nueva."""
+    if anterior is None or _clave_factura(anterior) == _clave_factura(factura):
+        return
+    _mover_aportes(
+        CuentaCorriente.objects.filter(factura_id=factura.pk), aporte_pago,
+        lambda pago, version: setattr(pago, 'factura', version), anterior, factura,
+    )
+
+
+def cambio_metodo_pago(anterior, metodo):
+    """
+    MetodoPago renombrado (o borrado, con metodo=None: las facturas quedan con el método
+    manual): sus facturas y los pagos de esas facturas pasan a la fila del nombre nuevo.
+    """
+    if anterior is None or (metodo is not None and anterior.tarjeta_nombre == metodo.tarjeta_nombre):
+        return
+    _mover_aportes(
+        Factura.objects.filter(metodo_pago_id=anterior.pk), aporte_factura,
+        lambda factura, version: setattr(factura, 'metodo_pago', version), anterior, metodo,
+    )
+    _mover_aportes(
+        CuentaCorriente.objects.select_related('factura').filter(factura__metodo_pago_id=anterior.pk), aporte_pago,
+        lambda pago, version: setattr(pago.factura, 'metodo_pago', version), anterior, metodo,
+    )
+
+
+def cambio_motivo(anterior, motivo):
+    """Motivo con otro precio: cambia el total de los turnos que lo usan."""
+    from apps.turnos.models import Turno
+
+    if anterior is None or _decimal(anterior.precio) == _decimal(motivo.precio):
+        return
+    _mover_aportes(
+        Turno.objects.filter(motivo_id=motivo.pk).only('fecha', 'motivo'), aporte_turno,
+        lambda turno, version: setattr(turno, 'motivo', version), anterior, motivo,
+    )
+
+
+def reconstruir(fecha_desde=None, fecha_hasta=None):
+    """Recalcula el resumen desde las tablas originales (todo o un rango de fechas)."""
+    from apps.turnos.models import Turno
+
+    acumulado = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+
+    def rango(qs, campo):
+        if fecha_desde:
+            qs = qs.filter(**{f'{campo}__gte': fecha_desde})
+        if fecha_hasta:
+            qs = qs.filter(**{f'{campo}__lte': fecha_hasta})
+        return qs
+
+    for factura in rango(Factura.objects.select_related('metodo_pago'), 'fecha').iterator(chunk_size=2000):
+        _acumular(acumulado, aporte_factura(factura))
+    pagos = CuentaCorriente.objects.select_related('factura__metodo_pago')
+    for pago in rango(pagos, 'fecha_cuota').iterator(chunk_size=2000):
+        _acumular(acumulado, aporte_pago(pago))
+    for turno in rango(Turno.objects.select_related('motivo'), 'fecha').iterator(chunk_size=2000):
+        _acumular(acumulado, aporte_turno(turno))
+
+    with transaction.atomic():
+        rango(ResumenCajaDiario.objects.all(), 'fecha').delete()
+        ResumenCajaDiario.objects.bulk_create([
+            ResumenCajaDiario(
+                fecha=fecha, tipo=tipo, vendedor=vendedor, metodo=metodo, metodo_tarjeta=metodo_tarjeta,
+                cantidad=cantidad, total=total, pendiente=pendiente,
+            )
+            for (fecha, tipo, vendedor, metodo, metodo_tarjeta), (cantidad, total, pendiente) in acumulado.items()
+        ], batch_size=1000)
+    return len(acumulado)
+
+
+def totales_caja(fecha_desde=None, fecha_hasta=None, vendedor='', metodo_pago=''):
+    """Todos los totales del cierre de caja, sumando filas del resumen."""
+    base = ResumenCajaDiario.objects.all()
+    if fecha_desde:
+        base = base.filter(fecha__gte=fecha_desde)
+    if fecha_hasta:
+        base = base.filter(fecha__lte=fecha_hasta)
+
+    facturas = base.filter(tipo='factura')
+    pagos = base.filter(tipo='pago').annotate(metodo_normalizado=Trim(Lower('metodo')))
+    if vendedor:
+        facturas = facturas.filter(vendedor__icontains=vendedor)
+        pagos = pagos.filter(vendedor__icontains=vendedor)
+    if metodo_pago:
+        facturas = facturas.filter(metodo=metodo_pago, metodo_tarjeta=True)
+
+    totales_por_vendedor = list(
+        facturas
+        .annotate(vendedor_normalizado=Trim(Lower('vendedor')))
+        .values('vendedor_normalizado')
+        .annotate(total=Sum('total'))
+        .order_by('vendedor_normalizado')
+    )
+    totales_por_metodo = list(
+        facturas
+        .annotate(metodo_normalizado=Trim(Lower('metodo')))
+        .values('metodo_normalizado')
+        .annotate(total=Sum('total'))
+        .order_by('metodo_normalizado')
+    )
+    resumen_metodos = list(
+        facturas
+        .values(metodo_nombre=F('metodo'))
+        .annotate(total=Sum('total'))
+        .order_by('metodo_nombre')
+    )
+
+    # 💵 Total en caja: todo lo facturado menos lo que va a cuenta corriente (FK)
+    facturado = facturas.aggregate(total=Sum('total'))['total'] or 0
+    cta_cte_tarjeta = facturas.filter(metodo_tarjeta=True, metodo__iexact=CUENTA_CORRIENTE).aggregate(
+        total=Sum('total'))['total'] or 0
+    total_en_caja = facturado - cta_cte_tarjeta
+
+    # 💰 Cobrado de cuenta corriente en el período
+    cobro_cta_corriente = pagos.filter(metodo_normalizado=CUENTA_CORRIENTE).aggregate(
+        total=Sum('total'))['total'] or 0
+
+    # Pendiente de cta cte (histórico completo, sin filtros, igual que antes)
+    pendiente_cta_corriente = ResumenCajaDiario.objects.filter(
+        tipo='pago', metodo_tarjeta=True, metodo__iexact=CUENTA_CORRIENTE
+    ).aggregate(total=Sum('pendiente'))['total'] or 0
+
+    total_importe = base.filter(tipo='turno').aggregate(total=Sum('total'))['total'] or Decimal(0)
+
+    return {
+        'totales_por_vendedor': totales_por_vendedor,
+        'totales_por_metodo': totales_por_metodo,
+        'resumen_metodos': resumen_metodos,
+        'total_en_caja': total_en_caja,
+        'cobro_cta_corriente': cobro_cta_corriente,
+        'pendiente_cta_corriente': pendiente_cta_corriente,
+        'total_importe': total_importe,
+    }
@@ -1,23 +1,190 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Compra, Venta, Producto
-
-# Incrementar el stock cuando se registra una compra
-@receiver(post_save, sender=Compra)
-def incrementar_stock(sender, instance, created, **kwargs):
-    if created:  # Solo cuando se crea una nueva compra
-        producto = instance.producto
-        producto.stock += instance.cantidad
-        producto.save()
-
-
-# Reducir el stock cuando se registra una venta
-@receiver(post_save, sender=Venta)
-def reducir_stock(sender, instance, created, **kwargs):
-    if created:  # Solo cuando se crea una nueva venta
-        producto = instance.producto
-        if producto.stock >= instance.cantidad:
-            producto.stock -= instance.cantidad
-            producto.save()
-        else:
-            raise ValueError("No hay suficiente stock disponible.")
+from django.contrib.auth.signals import user_logged_in
+from .models import Factura, CuentaCorriente, MetodoPago, Producto, ProductoBorrado, Categ_producto
+from apps.turnos.models import Motivo, Turno
+from . import Carrito, busqueda, cache_tienda, catalogo, miniaturas, resumen_caja
+
+# El stock de compras y ventas se mueve en stock.py (UPDATE atómicos), no acá.
+
+# ----------------- Resumen de caja diario -----------------
+# pre_*: se guarda el aporte que tenía el registro antes del cambio
+# post_*: se aplica la diferencia sobre ResumenCajaDiario
+
+APORTES = {
+    Factura: resumen_caja.aporte_factura,
+    CuentaCorriente: resumen_caja.aporte_pago,
+    Turno: resumen_caja.aporte_turno,
+}
+RELACIONADOS = {
+    Factura: ('metodo_pago',),
+    CuentaCorriente: ('factura__metodo_pago',),
+    Turno: ('motivo',),
+}
+
+
+def _guardado(sender, pk):
+    if pk is None:
+        return None
+    return sender.objects.select_related(*RELACIONADOS.get(sender, ())).filter(pk=pk).first()
+
+
+def _aporte_guardado(sender, pk):
+    anterior = _guardado(sender, pk)
+    return APORTES[sender](anterior) if anterior else None
+
+
+@receiver(pre_save, sender=Factura)
+@receiver(pre_save, sender=CuentaCorriente)
+@receiver(pre_save, sender=Turno)
+def resumen_caja_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = _guardado(sender, instance.pk)
+    instance._aporte_resumen_previo = APORTES[sender](anterior) if anterior else None
+    instance._registro_previo = anterior
+
+
+@receiver(post_save, sender=Factura)
+@receiver(post_save, sender=CuentaCorriente)
+@receiver(post_save, sender=Turno)
+def resumen_caja_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previo = getattr(instance, '_aporte_resumen_previo', None)
+    resumen_caja.reemplazar(previo, APORTES[sender](instance))
+    if sender is Factura:
+        # los pagos de cta cte se agrupan por el vendedor y el método de su factura
+        resumen_caja.cambio_factura(getattr(instance, '_registro_previo', None), instance)
+    instance._aporte_resumen_previo = instance._registro_previo = None
+
+
+@receiver(pre_delete, sender=Factura)
+@receiver(pre_delete, sender=CuentaCorriente)
+@receiver(pre_delete, sender=Turno)
+def resumen_caja_pre_delete(sender, instance, **kwargs):
+    instance._aporte_resumen_previo = _aporte_guardado(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Factura)
+@receiver(post_delete, sender=CuentaCorriente)
+@receiver(post_delete, sender=Turno)
+def resumen_caja_post_delete(sender, instance, **kwargs):
+    resumen_caja.aplicar(getattr(instance, '_aporte_resumen_previo', None), -1)
+
+
+# El nombre del método de pago y el precio del motivo también forman parte de los aportes
+
+@receiver(pre_save, sender=MetodoPago)
+@receiver(pre_save, sender=Motivo)
+def resumen_caja_relacionado_previo(sender, instance, raw=False, **kwargs):
+    instance._registro_previo = None if raw else _guardado(sender, instance.pk)
+
+
+@receiver(post_save, sender=MetodoPago)
+def resumen_caja_metodo_pago(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumen_caja.cambio_metodo_pago(getattr(instance, '_registro_previo', None), instance)
+    instance._registro_previo = None
+
+
+@receiver(pre_delete, sender=MetodoPago)
+def resumen_caja_metodo_pago_borrado(sender, instance, **kwargs):
+    # las facturas quedan con metodo_pago en NULL (SET_NULL), o sea con su método manual
+    resumen_caja.cambio_metodo_pago(instance, None)
+
+
+@receiver(post_save, sender=Motivo)
+def resumen_caja_motivo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumen_caja.cambio_motivo(getattr(instance, '_registro_previo', None), instance)
+    instance._registro_previo = None
+
+
+# ----------------- Saldo de cuenta corriente en Factura -----------------
+# total_pagado / saldo de la factura se recalculan en la misma transacción del pago
+
+@receiver(post_save, sender=CuentaCorriente)
+@receiver(post_delete, sender=CuentaCorriente)
+def saldo_factura(sender, instance, raw=False, **kwargs):
+    if raw or not instance.factura_id:
+        return
+    Factura.actualizar_saldo(instance.factura_id)
+
+
+# ----------------- Miniaturas de producto -----------------
+# Si cambió alguna imagen se encolan sus miniaturas (ver miniaturas.py); mientras tanto se ve el original
+
+@receiver(post_save, sender=Producto)
+def miniaturas_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if miniaturas.pendientes(instance):
+        transaction.on_commit(lambda: miniaturas.encolar_producto(instance))
+
+
+@receiver(post_delete, sender=Producto)
+def borrar_miniaturas_producto(sender, instance, **kwargs):
+    for datos in (instance.miniaturas or {}).values():
+        miniaturas.borrar_miniaturas(datos)
+
+
+# ----------------- Índice de búsqueda de producto -----------------
+# Palabras y trigramas del nombre en TerminoProducto (ver busqueda.py); solo se reescriben si cambió el nombre
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'nombre_producto' not in update_fields):
+        return
+    busqueda.indexar(instance)
+
+
+# ----------------- Catálogo de la caja -----------------
+# Los cambios llevan la versión en Producto.version (save() / stock.py); los borrados quedan acá.
+# En pre_delete (dentro de la transacción del borrado): el contador se bloquea antes que la fila del
+# producto, el mismo orden que catalogo.versionar_pendientes
+
+@receiver(pre_delete, sender=Producto)
+def catalogo_producto_borrado(sender, instance, **kwargs):
+    with transaction.atomic():
+        ProductoBorrado.objects.create(producto_id=instance.pk, version=catalogo.nueva_version())
+
+
+# ----------------- Cache de la grilla de la tienda -----------------
+# Se invalidan solo las páginas de la categoría del producto (y la anterior, si la cambió) y las de "todas"
+
+@receiver(pre_save, sender=Producto)
+def tienda_categoria_previa(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._categoria_previa = None
+        return
+    instance._categoria_previa = Producto.objects.filter(pk=instance.pk).values_list('categoria_id', flat=True).first()
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def tienda_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache_tienda.invalidar_categorias(instance.categoria_id, getattr(instance, '_categoria_previa', None))
+
+
+@receiver(post_save, sender=Categ_producto)
+@receiver(post_delete, sender=Categ_producto)
+def tienda_categoria(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache_tienda.invalidar_categorias(instance.pk, lista=True)
+
+
+# ----------------- Carrito de la tienda -----------------
+# Lo que el visitante agregó antes de iniciar sesión se suma al carrito del usuario (ver Carrito.py)
+
+@receiver(user_logged_in)
+def carrito_al_iniciar_sesion(sender, request, user, **kwargs):
+    if request is None or not hasattr(request, 'session'):
+        return
+    Carrito.unir_al_iniciar_sesion(request, user)
@@ -0,0 +1,117 @@
+#-------------------- Movimientos de stock ------------------------------------#
+# Todas las ventas y compras pasan por acá. El descuento es un UPDATE condicional
+# (stock = stock - n WHERE stock >= n), así dos ventas simultáneas no pisan el stock
+# de la otra y no hace falta leer el producto antes de modificarlo.
+# Cada movimiento deja los productos en catalogo.PENDIENTE, en el mismo UPDATE, y después del commit
+# reciben una versión nueva del catálogo para que la caja vea el stock nuevo en su próximo diff
+# (no se toma el contador global dentro de la venta: ver catalogo.py). También se invalidan las
+# páginas de la tienda de sus categorías (cache_tienda.py).
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F
+
+from . import cache_tienda
+from .catalogo import PENDIENTE, versionar_pendientes
+from .models import Producto
+
+
+class StockInsuficiente(ValueError):
+    """Se lanza cuando una o más líneas no tienen stock. `faltantes` trae el detalle por línea."""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        nombres = ", ".join(f["nombre_producto"] for f in faltantes)
+        super().__init__(f"Stock insuficiente para el producto {nombres}.")
+
+
+def _agrupar(lineas):
+    """
+    Suma las cantidades por producto y las ordena por id (mismo orden de bloqueo
+    en todas las transacciones, evita deadlocks entre carritos con los mismos productos).
+    """
+    cantidades = {}
+    for producto_id, cantidad in lineas:
+        cantidad = int(float(cantidad or 0))
+        if producto_id is None or cantidad <= 0:
+            continue
+        cantidades[int(producto_id)] = cantidades.get(int(producto_id), 0) + cantidad
+    return OrderedDict(sorted(cantidades.items()))
+
+
+def _versionar_al_confirmar(cantidades):
+    ids = list(cantidades)
+    transaction.on_commit(lambda: versionar_pendientes(ids))
+
+
+def _detalle_faltantes(fallidos):
+    productos = Producto.objects.in_bulk(fallidos.keys())
+    faltantes = []
+    for producto_id, cantidad in fallidos.items():
+        producto = productos.get(producto_id)
+        faltantes.append({
+            "producto_id": producto_id,
+            "nombre_producto": producto.nombre_producto if producto else f"#{producto_id} (no existe)",
+            "stock_disponible": producto.stock if producto else 0,
+            "cantidad_solicitada": cantidad,
+        })
+    return faltantes
+
+
+def descontar_stock(lineas, permitir_faltantes=False):
+    """
+    Descuenta el stock de todo un carrito en una sola transacción.
+
+    `lineas` es un iterable de (producto_id, cantidad). Si alguna línea no tiene stock
+    se lanza StockInsuficiente y no se descuenta nada. Con permitir_faltantes=True
+    (ventas ya cobradas) las líneas sin stock dejan el producto en 0 y se devuelven
+    en la lista de faltantes en lugar de cortar la operación.
+    """
+    cantidades = _agrupar(lineas)
+    fallidos = OrderedDict()
+
+    if not cantidades:
+        return []
+
+    with transaction.atomic():
+        for producto_id, cantidad in cantidades.items():
+            actualizados = (
+                Producto.objects
+                .filter(id=producto_id, stock__gte=cantidad)
+                .update(stock=F("stock") - cantidad, version=PENDIENTE)
+            )
+            if not actualizados:
+                fallidos[producto_id] = cantidad
+        cache_tienda.invalidar_productos(cantidades)
+        _versionar_al_confirmar(cantidades)
+
+        if not fallidos:
+            return []
+
+        faltantes = _detalle_faltantes(fallidos)
+        if not permitir_faltantes:
+            raise StockInsuficiente(faltantes)
+
+        # Venta ya cobrada: se vende lo que queda
+        Producto.objects.filter(id__in=list(fallidos)).update(stock=0, version=PENDIENTE)
+        return faltantes
+
+
+def sumar_stock(lineas):
+    """Suma stock (compras, devoluciones, reservas liberadas) con UPDATE stock = stock + n."""
+    cantidades = _agrupar(lineas)
+    if not cantidades:
+        return
+    with transaction.atomic():
+        for producto_id, cantidad in cantidades.items():
+            Producto.objects.filter(id=producto_id).update(stock=F("stock") + cantidad, version=PENDIENTE)
+        cache_tienda.invalidar_productos(cantidades)
+        _versionar_al_confirmar(cantidades)
+
+
+def ajustar_stock(producto_id, diferencia):
+    """Aplica una diferencia con signo (ej. al editar una compra)."""
+    if diferencia > 0:
+        sumar_stock([(producto_id, diferencia)])
+    elif diferencia < 0:
+        descontar_stock([(producto_id, -diferencia)])
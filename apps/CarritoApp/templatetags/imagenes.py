@@ -0,0 +1,55 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from prueba1.miniaturas import ruta_miniatura
+
+register = template.Library()
+
+# Grilla de la tienda: 2 / 3 / 4 / 5 columnas (row-cols-* de tienda.html)
+SIZES_TIENDA = '(min-width: 1200px) 20vw, (min-width: 992px) 25vw, (min-width: 768px) 33vw, 50vw'
+
+
+def _srcset(nombre, anchos, extension):
+    return ', '.join(f'{default_storage.url(ruta_miniatura(nombre, ancho, extension))} {ancho}w' for ancho in anchos)
+
+
+@register.simple_tag
+def imagen_producto(producto, campo='imagen', sizes=SIZES_TIENDA, clase='', alt=None, lazy=True, ancho=''):
+    """
+    <picture> con srcset WebP y JPEG de las miniaturas de la imagen `campo` del producto.
+    Si todavía no se generaron (o son de una imagen anterior) devuelve un <img> con el original.
+    Uso: {% load imagenes %} {% imagen_producto producto 'imagen2' clase='d-block w-100' %}
+    Con `ancho` (listados con miniatura fija) se pone width y se pide la miniatura de ese tamaño.
+    """
+    alt = producto.nombre_producto if alt is None else alt
+    return imagen_miniaturas(producto, campo, sizes, clase, alt, lazy, ancho)
+
+
+@register.simple_tag
+def imagen_miniaturas(objeto, campo, sizes=SIZES_TIENDA, clase='', alt='', lazy=True, ancho=''):
+    """Lo mismo para cualquier modelo con campo `miniaturas` (Producto, Mascota)."""
+    archivo = getattr(objeto, campo)
+    if not archivo:
+        return ''
+    carga = 'lazy' if lazy else 'eager'
+    dimension = ''
+    if ancho:
+        sizes = f'{ancho}px'
+        dimension = format_html(' width="{}"', ancho)
+
+    datos = (objeto.miniaturas or {}).get(campo)
+    if not datos or datos.get('nombre') != archivo.name:
+        return format_html('<img src="{}" class="{}" alt="{}"{} loading="{}">',
+                           archivo.url, clase, alt, dimension, carga)
+
+    anchos = datos['anchos']
+    fuentes = ''
+    if datos.get('webp'):
+        fuentes = format_html('<source type="image/webp" srcset="{}" sizes="{}">', _srcset(archivo.name, anchos, 'webp'), sizes)
+    # src: la miniatura del medio, para los navegadores que no entienden srcset
+    src = default_storage.url(ruta_miniatura(archivo.name, anchos[len(anchos) // 2], 'jpg'))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}"{} loading="{}" decoding="async"></picture>',
+        fuentes, src, _srcset(archivo.name, anchos, 'jpg'), sizes, clase, alt, dimension, carga,
+    )
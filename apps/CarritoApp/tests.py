@@ -1,3 +1,513 @@
-from django.test import TestCase
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model, login
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.turnos.models import Motivo, Turno
+from prueba1 import cache as cache_compartido
+
+from . import busqueda, cache_tienda, catalogo, pagos_mp, reservas, resumen_caja
+from .Carrito import CLAVE_SESION, Carrito
+from .models import (
+    CarritoCompra, Categ_producto, CuentaCorriente, Factura, MetodoPago, NotificacionMP, Producto, ReservaStock, ResumenCajaDiario,
+)
+from .stock import StockInsuficiente, descontar_stock, sumar_stock
+
+
+def crear_factura(**campos):
+    datos = {
+        'numero_factura': '00000001', 'fecha': date(2025, 3, 10), 'nombre_cliente': 'Ana',
+        'apellido_cliente': 'Paz', 'total': Decimal('1000'), 'total_con_interes': Decimal('1000'),
+        'vendedor': 'Luis',
+    }
+    datos.update(campos)
+    return Factura.objects.create(**datos)
+
+
+def crear_producto(nombre='Alimento balanceado', stock=5, precio=Decimal('100'), **campos):
+    categoria = Categ_producto.objects.get_or_create(nombre='Alimentos')[0]
+    return Producto.objects.create(nombre_producto=nombre, imagen='productos/prueba.jpg',
+                                   categoria=categoria, stock=stock, precio=precio, **campos)
+
+
+#-------------------- Movimientos de stock ------------------------------------#
+class StockTests(TestCase):
+    def setUp(self):
+        self.alimento = crear_producto('Alimento balanceado', stock=5)
+        self.collar = crear_producto('Collar', stock=1)
+
+    def stocks(self):
+        return list(Producto.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_descuenta_todo_el_carrito(self):
+        # las líneas repetidas del mismo producto se suman
+        faltantes = descontar_stock([(self.alimento.pk, 2), (self.collar.pk, 1), (self.alimento.pk, '1')])
+        self.assertEqual(faltantes, [])
+        self.assertEqual(self.stocks(), [2, 0])
+
+    def test_sin_stock_no_descuenta_nada(self):
+        with self.assertRaises(StockInsuficiente) as error:
+            descontar_stock([(self.alimento.pk, 2), (self.collar.pk, 3)])
+        self.assertEqual(error.exception.faltantes, [{
+            'producto_id': self.collar.pk, 'nombre_producto': 'Collar',
+            'stock_disponible': 1, 'cantidad_solicitada': 3,
+        }])
+        self.assertEqual(self.stocks(), [5, 1])
+
+    def test_venta_cobrada_permite_faltantes(self):
+        faltantes = descontar_stock([(self.alimento.pk, 2), (self.collar.pk, 3)], permitir_faltantes=True)
+        self.assertEqual([f['producto_id'] for f in faltantes], [self.collar.pk])
+        self.assertEqual(self.stocks(), [3, 0])
+
+    def test_sumar_stock_sube_la_version_despues_del_commit(self):
+        version = Producto.objects.get(pk=self.collar.pk).version
+        with self.captureOnCommitCallbacks(execute=True):
+            sumar_stock([(self.collar.pk, 4)])
+            # dentro de la transacción no se toma el contador del catálogo
+            self.assertEqual(Producto.objects.get(pk=self.collar.pk).version, catalogo.PENDIENTE)
+        collar = Producto.objects.get(pk=self.collar.pk)
+        self.assertEqual(collar.stock, 5)
+        self.assertGreater(collar.version, version)
+
+
+#-------------------- Resumen de caja diario ------------------------------------#
+class ResumenCajaTests(TestCase):
+    """Lo que mantienen las señales tiene que ser igual a reconstruir() desde las tablas."""
+
+    def resumen(self):
+        return sorted(
+            ResumenCajaDiario.objects.exclude(cantidad=0, total=0, pendiente=0)
+            .values_list('fecha', 'tipo', 'vendedor', 'metodo', 'metodo_tarjeta', 'cantidad', 'total', 'pendiente')
+        )
+
+    def assertIgualAReconstruir(self):
+        por_senales = self.resumen()
+        resumen_caja.reconstruir()
+        self.assertEqual(por_senales, self.resumen())
+
+    def setUp(self):
+        self.visa = MetodoPago.objects.create(tarjeta_nombre='Visa')
+        self.cta_cte = MetodoPago.objects.create(tarjeta_nombre='Cuenta Corriente')
+        self.factura = crear_factura(metodo_pago=self.cta_cte, total_con_interes=Decimal('1200'))
+        self.pago = CuentaCorriente.objects.create(
+            factura=self.factura, numero_factura=self.factura.numero_factura, descripcion='Cuota 1',
+            fecha_cuota=date(2025, 4, 10), total_con_interes=Decimal('1200'), imp_cuota_pagadas=Decimal('400'),
+        )
+        self.motivo = Motivo.objects.create(nombre='Consulta', precio=Decimal('500'))
+        Turno.objects.create(dni='30111222', motivo=self.motivo, fecha=date(2025, 3, 10), hora=time(10))
+        Turno.objects.create(dni='30111333', motivo=self.motivo, fecha=date(2025, 3, 10), hora=time(11))
+
+    def test_altas(self):
+        fila = ResumenCajaDiario.objects.get(tipo='pago')
+        self.assertEqual((fila.vendedor, fila.metodo, fila.total, fila.pendiente),
+                         ('Luis', 'Cuenta Corriente', Decimal('400'), Decimal('800')))
+        self.assertEqual(ResumenCajaDiario.objects.get(tipo='turno').total, Decimal('1000'))
+        self.assertIgualAReconstruir()
+
+    def test_edicion_y_borrado(self):
+        self.pago.entrega_cta = Decimal('100')
+        self.pago.save()
+        otra = crear_factura(numero_factura='00000002', metodo_pago=self.visa)
+        otra.fecha = date(2025, 3, 11)
+        otra.save()
+        self.assertIgualAReconstruir()
+        otra.delete()
+        self.pago.delete()
+        self.assertIgualAReconstruir()
+
+    def test_factura_cambia_vendedor_y_metodo(self):
+        self.factura.vendedor = 'Marta'
+        self.factura.metodo_pago = self.visa
+        self.factura.save()
+        fila = ResumenCajaDiario.objects.get(tipo='pago', cantidad=1)
+        self.assertEqual((fila.vendedor, fila.metodo), ('Marta', 'Visa'))
+        self.assertIgualAReconstruir()
+
+    def test_metodo_pago_renombrado_y_borrado(self):
+        self.cta_cte.tarjeta_nombre = 'Cta. Cte.'
+        self.cta_cte.save()
+        self.assertEqual(ResumenCajaDiario.objects.get(tipo='factura', cantidad=1).metodo, 'Cta. Cte.')
+        self.assertIgualAReconstruir()
+        self.cta_cte.delete()
+        self.assertEqual(ResumenCajaDiario.objects.get(tipo='factura', cantidad=1).metodo, 'Sin especificar')
+        self.assertIgualAReconstruir()
+
+    def test_motivo_cambia_precio(self):
+        self.motivo.precio = Decimal('650')
+        self.motivo.save()
+        self.assertEqual(ResumenCajaDiario.objects.get(tipo='turno').total, Decimal('1300'))
+        self.assertIgualAReconstruir()
+
+
+#-------------------- Saldo de cuenta corriente ------------------------------------#
+class SaldoFacturaTests(TestCase):
+    def setUp(self):
+        self.factura = crear_factura(total_con_interes=Decimal('1200'))
+
+    def pagar(self, **campos):
+        return CuentaCorriente.objects.create(
+            factura=self.factura, numero_factura=self.factura.numero_factura, descripcion='Pago',
+            fecha_cuota=date(2025, 4, 10), total_con_interes=Decimal('1200'), **campos,
+        )
+
+    def saldo(self):
+        return Factura.objects.values_list('total_pagado', 'saldo').get(pk=self.factura.pk)
+
+    def test_pagos_actualizan_el_saldo(self):
+        self.assertEqual(self.saldo(), (Decimal('0'), Decimal('1200')))
+        cuota = self.pagar(imp_cuota_pagadas=Decimal('400'))
+        entrega = self.pagar(entrega_cta=Decimal('150'))
+        self.assertEqual(self.saldo(), (Decimal('550'), Decimal('650')))
+
+        cuota.imp_cuota_pagadas = Decimal('500')
+        cuota.save()
+        entrega.delete()
+        self.assertEqual(self.saldo(), (Decimal('500'), Decimal('700')))
+
+    def test_editar_factura_con_instancia_vieja_no_pisa_lo_pagado(self):
+        factura = Factura.objects.get(pk=self.factura.pk)
+        self.pagar(imp_cuota_pagadas=Decimal('400'))
+        factura.total_con_interes = Decimal('1500')
+        factura.save()
+        self.assertEqual(self.saldo(), (Decimal('400'), Decimal('1100')))
+
+
+#-------------------- Búsqueda de productos ------------------------------------#
+class BusquedaTests(TestCase):
+    def setUp(self):
+        for numero, nombre in ((15, 'Alimento Perro Adulto 15kg'), (7, 'Alimento Perro'),
+                               (21, 'Pipeta Ñandú Gatos'), (3, 'Collar antipulgas')):
+            crear_producto(nombre, numero_producto=numero)
+
+    def nombres(self, consulta, **kwargs):
+        return [fila['nombre_producto'] for fila in busqueda.buscar(consulta, **kwargs)]
+
+    def test_normalizar(self):
+        self.assertEqual(busqueda.normalizar('Alimento  Perro ÑANDÚ 15kg.'), 'alimento perro nandu 15kg')
+
+    def test_prefijos_sin_acentos_y_orden(self):
+        self.assertEqual(self.nombres('alim perr'), ['Alimento Perro', 'Alimento Perro Adulto 15kg'])
+        self.assertEqual(self.nombres('ÑANDU'), ['Pipeta Ñandú Gatos'])
+        self.assertEqual(self.nombres('nandú gat'), ['Pipeta Ñandú Gatos'])
+        self.assertEqual(self.nombres('alimento perro', limite=1), ['Alimento Perro'])
+
+    def test_numero_de_producto_primero(self):
+        self.assertEqual(self.nombres('3'), ['Collar antipulgas'])
+        self.assertEqual(self.nombres('15')[0], 'Alimento Perro Adulto 15kg')
+
+    def test_digitos_que_no_son_numeros(self):
+        # '²'.isdigit() es True pero int('²') falla
+        self.assertEqual(self.nombres('²'), [])
+
+    def test_trigramas_con_error_de_tipeo(self):
+        self.assertEqual(self.nombres('antipulgs'), ['Collar antipulgas'])
+
+    def test_renombrar_reindexa(self):
+        collar = Producto.objects.get(nombre_producto='Collar antipulgas')
+        collar.nombre_producto = 'Correa extensible'
+        collar.save()
+        self.assertEqual(self.nombres('collar'), [])
+        self.assertEqual(self.nombres('correa'), ['Correa extensible'])
+
+
+#-------------------- Catálogo versionado de la caja ------------------------------------#
+class CatalogoTests(TestCase):
+    def setUp(self):
+        catalogo._completo = (None, None)
+        self.alimento = crear_producto('Alimento balanceado')
+        self.collar = crear_producto('Collar')
+        self.desde = catalogo.version_actual()
+
+    def ids(self, cambios):
+        return [fila[0] for fila in cambios['productos']]
+
+    def test_completo(self):
+        datos = json.loads(catalogo.completo())
+        self.assertEqual(datos['version'], self.desde)
+        self.assertEqual([fila[2] for fila in datos['productos']], ['Alimento balanceado', 'Collar'])
+
+    def test_sin_cambios(self):
+        cambios = catalogo.cambios(self.desde)
+        self.assertEqual((cambios['version'], cambios['productos'], cambios['borrados']), (self.desde, [], []))
+
+    def test_solo_lo_que_cambio(self):
+        self.collar.precio = Decimal('250')
+        self.collar.save()
+        cambios = catalogo.cambios(self.desde)
+        self.assertEqual(cambios['productos'], [[self.collar.pk, None, 'Collar', '250.00', 5]])
+        self.assertGreater(cambios['version'], self.desde)
+
+        # un campo que la caja no usa no genera versión nueva
+        desde = cambios['version']
+        self.collar.descripcion = 'De cuero'
+        self.collar.save(update_fields=['descripcion'])
+        self.assertEqual(catalogo.cambios(desde)['productos'], [])
+
+    def test_movimiento_de_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            descontar_stock([(self.alimento.pk, 2)])
+        cambios = catalogo.cambios(self.desde)
+        self.assertEqual(self.ids(cambios), [self.alimento.pk])
+        self.assertEqual(cambios['productos'][0][4], 3)
+        self.assertEqual(catalogo.cambios(cambios['version'])['productos'], [])
+
+    def test_pendientes_sin_on_commit_se_versionan_al_pedir_cambios(self):
+        descontar_stock([(self.alimento.pk, 2), (self.collar.pk, 1)])  # el on_commit no corrió
+        cambios = catalogo.cambios(self.desde)
+        self.assertEqual(self.ids(cambios), [self.alimento.pk, self.collar.pk])
+        self.assertFalse(Producto.objects.filter(version=catalogo.PENDIENTE).exists())
+
+    def test_borrados(self):
+        collar_id = self.collar.pk
+        self.collar.delete()
+        cambios = catalogo.cambios(self.desde)
+        self.assertEqual((cambios['productos'], cambios['borrados']), ([], [collar_id]))
+        self.assertNotIn(collar_id, [fila[0] for fila in json.loads(catalogo.completo())['productos']])
+
+    def test_version_de_otra_base(self):
+        self.assertIsNone(catalogo.cambios(self.desde + 1000))
+
+
+#-------------------- Carrito en la base ------------------------------------#
+class CarritoTests(TestCase):
+    def setUp(self):
+        self.alimento = crear_producto('Alimento balanceado', precio=Decimal('1500.50'))
+        self.collar = crear_producto('Collar', precio=Decimal('800'))
+        self.usuario = get_user_model().objects.create_user('ana', password='clave-de-prueba')
+
+    def pedido(self, usuario=None):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        request.user = usuario or AnonymousUser()
+        return request
+
+    def cantidades(self, carrito):
+        return {item['nombre']: item['cantidad'] for item in carrito.como_dict().values()}
+
+    def test_sumar_y_restar(self):
+        carrito = Carrito(self.pedido())
+        carrito.agregar(self.alimento)
+        carrito.agregar(self.alimento)
+        carrito.agregar(self.collar)
+        self.assertEqual(carrito.total(), Decimal('3801.00'))
+        carrito.restar(self.collar.pk)
+        carrito.restar(self.alimento.pk)
+        self.assertEqual(self.cantidades(carrito), {'Alimento balanceado': 1})
+
+    def test_carrito_viejo_de_la_sesion(self):
+        request = self.pedido()
+        request.session['carrito'] = {
+            str(self.collar.pk): {'producto_id': self.collar.pk, 'nombre': 'Collar', 'precio': 800.0, 'cantidad': 2},
+            'roto': {'cantidad': 1},
+        }
+        carrito = Carrito(request)
+        self.assertNotIn('carrito', request.session)
+        self.assertEqual(self.cantidades(carrito), {'Collar': 2})
+
+    def test_al_iniciar_sesion_se_une_al_del_usuario(self):
+        Carrito(self.pedido(self.usuario)).agregar(self.alimento)
+        request = self.pedido()
+        visitante = Carrito(request)
+        visitante.agregar(self.alimento, 2)
+        visitante.agregar(self.collar)
+        anonimo_id = request.session[CLAVE_SESION]
+
+        login(request, self.usuario, backend='django.contrib.auth.backends.ModelBackend')
+
+        self.assertNotIn(CLAVE_SESION, request.session)
+        self.assertFalse(CarritoCompra.objects.filter(pk=anonimo_id).exists())
+        self.assertEqual(self.cantidades(Carrito(request)), {'Alimento balanceado': 3, 'Collar': 1})
+        self.assertEqual(CarritoCompra.objects.count(), 1)
+
+
+#-------------------- Cache de la grilla de la tienda ------------------------------------#
+class GrillaTiendaTests(TestCase):
+    def setUp(self):
+        for numero in range(12):
+            crear_producto(f'Producto {numero}')
+        cache_compartido.invalidar(cache_tienda.ESPACIO)
+
+    def grilla(self, pagina):
+        from .views import _grilla_tienda
+
+        request = RequestFactory().get('/tienda/', {'page': pagina})
+        request.session = SessionStore()
+        request.user = AnonymousUser()
+        return _grilla_tienda(request, 'tienda', Producto.objects.order_by('id'), 10, None)
+
+    def en_cache(self, pagina):
+        clave = cache_compartido.clave(cache_tienda.ESPACIO, ('tienda', pagina), cache_tienda._grupo(None))
+        return cache_compartido.cache.get(clave) is not None
+
+    def test_pagina_fuera_de_rango_usa_la_entrada_de_la_ultima(self):
+        ultima = self.grilla(2)
+        self.assertEqual(self.grilla(99999), ultima)
+        self.assertEqual(self.grilla(0), self.grilla(1))
+        self.assertTrue(self.en_cache(2))
+        self.assertFalse(self.en_cache(99999))
+        self.assertFalse(self.en_cache(0))
+
+
+#-------------------- Reservas de stock ------------------------------------#
+class ReservasTests(TestCase):
+    def setUp(self):
+        self.alimento = crear_producto('Alimento balanceado', stock=3)
+        self.collar = crear_producto('Collar', stock=1)
+
+    def stocks(self):
+        return list(Producto.objects.order_by('id').values_list('stock', flat=True))
+
+    def estados(self, referencia):
+        return set(ReservaStock.objects.filter(referencia=referencia).values_list('estado', flat=True))
+
+    def test_reservar_libera_un_solo_lote_de_vencidas(self):
+        for numero in range(3):
+            reservas.reservar(f'ORDER-{numero}', [(self.alimento.pk, 1)])
+        ReservaStock.objects.update(vence=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(reservas.liberar_vencidas(lote=2, max_lotes=1), 2)
+        self.assertEqual(ReservaStock.objects.filter(estado='activa').count(), 1)
+        self.assertEqual(reservas.liberar_vencidas(lote=2), 1)
+
+    def test_reserva_la_ultima_unidad(self):
+        reservas.reservar('ORDER-1', [(self.collar.pk, 1), (self.alimento.pk, 1)])
+        self.assertEqual(self.stocks(), [2, 0])
+        with self.assertRaises(StockInsuficiente):
+            reservas.reservar('ORDER-2', [(self.alimento.pk, 1), (self.collar.pk, 1)])
+        self.assertEqual(self.stocks(), [2, 0])  # la segunda no reservó nada
+        self.assertFalse(ReservaStock.objects.filter(referencia='ORDER-2').exists())
+
+    def test_confirmar_es_idempotente(self):
+        reservas.reservar('ORDER-1', [(self.alimento.pk, 2)])
+        self.assertEqual(reservas.confirmar('ORDER-1'), [])
+        self.assertEqual(reservas.confirmar('ORDER-1'), [])
+        self.assertEqual(reservas.liberar('ORDER-1'), 0)
+        self.assertEqual(self.stocks(), [1, 1])
+        self.assertEqual(self.estados('ORDER-1'), {'confirmada'})
+        self.assertIsNone(reservas.confirmar('ORDER-sin-reserva'))
+
+    def test_pago_rechazado_libera(self):
+        reservas.reservar('ORDER-1', [(self.alimento.pk, 2), (self.collar.pk, 1)])
+        reservas.segun_estado_pago('ORDER-1', 'pending')
+        self.assertEqual(self.stocks(), [1, 0])
+        reservas.segun_estado_pago('ORDER-1', 'rejected')
+        self.assertEqual(self.stocks(), [3, 1])
+        self.assertEqual(self.estados('ORDER-1'), {'liberada'})
+
+    def test_vencidas_vuelven_al_stock_y_el_pago_tardio_descuenta(self):
+        reservas.reservar('ORDER-1', [(self.alimento.pk, 2)])
+        reservas.reservar('ORDER-2', [(self.collar.pk, 1)], minutos=60)
+        ReservaStock.objects.filter(referencia='ORDER-1').update(vence=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(reservas.liberar_vencidas(lote=1), 1)
+        self.assertEqual(self.stocks(), [3, 0])
+        self.assertEqual(self.estados('ORDER-2'), {'activa'})
+
+        # el pago se aprobó igual: se vuelve a descontar aunque falte
+        Producto.objects.filter(pk=self.alimento.pk).update(stock=1)
+        faltantes = reservas.confirmar('ORDER-1')
+        self.assertEqual([f['producto_id'] for f in faltantes], [self.alimento.pk])
+        self.assertEqual(self.stocks(), [0, 0])
+        self.assertEqual(self.estados('ORDER-1'), {'confirmada'})
+
+
+#-------------------- Pagos de Mercado Pago ------------------------------------#
+class ClienteMPCaido:
+    def pago(self, payment_id):
+        raise pagos_mp.ErrorMP('ConnectTimeout: sin respuesta')
+
+
+@override_settings(MP_CLIENTE='apps.CarritoApp.pagos_mp.ClienteMPMemoria')
+class PagosMPTests(TestCase):
+    referencia = 'ORDER-anon-prueba'
+
+    def setUp(self):
+        self.producto = crear_producto()
+        reservas.reservar(self.referencia, [(self.producto.pk, 2)])
+        pagos_mp.guardar_checkout(self.referencia, {
+            'referencia': self.referencia, 'dni': '30111222', 'nombre': 'Ana', 'apellido': 'Paz', 'total': 200,
+            'detalle': [{'producto_id': self.producto.pk, 'nombre_producto': self.producto.nombre_producto,
+                         'cantidad_vendida': 2, 'precio_unitario': 100, 'subtotal': 200}],
+        })
+        self.addCleanup(setattr, pagos_mp.ClienteMPMemoria, 'pagos', {})
+
+    def pago(self, payment_id, estado):
+        pagos_mp.ClienteMPMemoria.pagos = {payment_id: {
+            'status': estado, 'external_reference': self.referencia, 'transaction_amount': 200,
+        }}
+
+    def procesar_pendiente(self, api=None):
+        notificacion = pagos_mp.tomar_siguiente()
+        self.assertIsNotNone(notificacion)
+        return pagos_mp.procesar(notificacion, api)
+
+    def stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock
+
+    def test_recibir_no_duplica_avisos(self):
+        self.pago('71', 'approved')
+        pagos_mp.recibir('payment', '71', {'action': 'payment.created'})
+        pagos_mp.recibir('payment', '71', {'action': 'payment.updated'})
+        self.assertEqual(NotificacionMP.objects.count(), 1)
+
+        self.assertEqual(self.procesar_pendiente().estado, 'listo')
+        pagos_mp.recibir('payment', '71', {'action': 'payment.updated'})  # ya terminó: no se reprocesa
+        self.assertEqual(NotificacionMP.objects.get().estado, 'listo')
+        self.assertIsNone(pagos_mp.tomar_siguiente())
+
+    def test_api_caida_reintenta_con_espera_creciente(self):
+        pagos_mp.recibir('payment', '72', {})
+        antes = timezone.now()
+        notificacion = self.procesar_pendiente(ClienteMPCaido())
+        self.assertEqual((notificacion.estado, notificacion.intentos), ('pendiente', 1))
+        self.assertGreaterEqual(notificacion.proximo_intento, antes + pagos_mp.REINTENTO_BASE)
+        self.assertIsNone(pagos_mp.tomar_siguiente())  # todavía no le toca
+
+        NotificacionMP.objects.update(proximo_intento=timezone.now())
+        antes = timezone.now()
+        notificacion = self.procesar_pendiente(ClienteMPCaido())
+        self.assertGreaterEqual(notificacion.proximo_intento, antes + 2 * pagos_mp.REINTENTO_BASE)
+
+        NotificacionMP.objects.update(proximo_intento=timezone.now(), intentos=pagos_mp.MAX_INTENTOS - 1)
+        notificacion = self.procesar_pendiente(ClienteMPCaido())
+        self.assertEqual(notificacion.estado, 'error')
+        self.assertIn('ConnectTimeout', notificacion.error)
+        self.assertEqual(Factura.objects.count(), 0)
+
+    def test_webhook_y_vuelta_del_comprador_hacen_una_sola_factura(self):
+        self.pago('73', 'approved')
+        pagos_mp.recibir('payment', '73', {})
+        notificacion = self.procesar_pendiente()
+        factura = Factura.objects.get()
+        self.assertEqual(notificacion.resultado, f'Factura {factura.numero_factura}')
+
+        respuesta = self.client.get(reverse('CarritoApp:pago_exitoso'), {'payment_id': '73'}, secure=True)
+        self.assertRedirects(respuesta, reverse('CarritoApp:detalle_factura', args=[factura.pk]),
+                             fetch_redirect_response=False)
+        checkout = pagos_mp.checkout_de(self.referencia)
+        self.assertEqual(pagos_mp.facturar(checkout, pagos_mp.cliente().pago('73')), (factura, []))
+        self.assertEqual(Factura.objects.count(), 1)
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(set(ReservaStock.objects.values_list('estado', flat=True)), {'confirmada'})
+
+    def test_pago_rechazado_libera_la_reserva(self):
+        self.assertEqual(self.stock(), 3)
+        self.pago('74', 'rejected')
+        pagos_mp.recibir('payment', '74', {})
+        notificacion = self.procesar_pendiente()
+        self.assertEqual((notificacion.estado, notificacion.finalizada), ('listo', True))
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(set(ReservaStock.objects.values_list('estado', flat=True)), {'liberada'})
+        self.assertEqual(Factura.objects.count(), 0)
+
+    def test_pago_inexistente_no_se_reintenta(self):
+        pagos_mp.recibir('payment', '999', {})
+        notificacion = self.procesar_pendiente()
+        self.assertEqual((notificacion.estado, notificacion.finalizada), ('listo', True))
+        self.assertEqual(self.stock(), 3)
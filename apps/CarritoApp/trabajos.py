@@ -0,0 +1,155 @@
+#-------------------- Cola de trabajos de render ------------------------------------#
+# Los PDFs de factura, el ticket PNG de Mercado Pago y el PDF de presupuesto se
+# generan fuera del request: la vista llama a encolar() y responde enseguida, y
+# `manage.py procesar_trabajos` los va tomando de la tabla TrabajoRender.
+# La vista consulta el estado con /CarritoApp/trabajos/<uuid>/estado/.
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TrabajoRender
+
+# Con False (desarrollo, sin worker corriendo) se genera en el mismo request
+EN_SEGUNDO_PLANO = getattr(settings, 'TRABAJOS_EN_SEGUNDO_PLANO', True)
+MAX_INTENTOS = 3
+# Un trabajo "procesando" más tiempo que esto se considera de un worker caído y se reintenta
+TIEMPO_MAXIMO = timedelta(minutes=10)
+
+PROCESADORES = {}
+
+
+def procesador(tipo):
+    """Registra la función que genera un tipo de trabajo. Devuelve la ruta (relativa a MEDIA_ROOT)."""
+    def registrar(funcion):
+        PROCESADORES[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tipo, parametros=None, factura=None, clave=''):
+    """Crea el trabajo (o devuelve el que ya está en curso con la misma clave)."""
+    if clave:
+        existente = (
+            TrabajoRender.objects
+            .filter(clave=clave, estado__in=('pendiente', 'procesando'))
+            .order_by('-id')
+            .first()
+        )
+        if existente:
+            return existente
+
+    trabajo = TrabajoRender.objects.create(
+        tipo=tipo, parametros=parametros or {}, factura=factura, clave=clave[:150],
+    )
+    if not EN_SEGUNDO_PLANO:
+        if _reclamar(trabajo.pk):
+            trabajo.refresh_from_db()
+            procesar(trabajo)
+    return trabajo
+
+
+def _reclamar(trabajo_id):
+    # UPDATE condicional: si dos workers toman el mismo trabajo, solo uno lo consigue
+    return TrabajoRender.objects.filter(pk=trabajo_id, estado='pendiente').update(
+        estado='procesando', iniciado=timezone.now(), intentos=F('intentos') + 1,
+    )
+
+
+def tomar_siguiente():
+    """Reclama el trabajo pendiente más viejo. None si no hay nada para hacer."""
+    TrabajoRender.objects.filter(
+        estado='procesando', iniciado__lt=timezone.now() - TIEMPO_MAXIMO,
+    ).update(estado='pendiente')
+
+    candidatos = (
+        TrabajoRender.objects
+        .filter(estado='pendiente')
+        .order_by('creado', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for trabajo_id in candidatos:
+        if _reclamar(trabajo_id):
+            return TrabajoRender.objects.select_related('factura').get(pk=trabajo_id)
+    return None
+
+
+def procesar(trabajo):
+    """Genera el archivo del trabajo ya reclamado y deja el resultado en la tabla."""
+    try:
+        trabajo.archivo = PROCESADORES[trabajo.tipo](trabajo) or ''
+        trabajo.estado = 'listo'
+        trabajo.error = ''
+    except Exception as e:
+        trabajo.error = f'{type(e).__name__}: {e}'
+        trabajo.estado = 'pendiente' if trabajo.intentos < MAX_INTENTOS else 'error'
+    trabajo.terminado = timezone.now()
+    trabajo.save(update_fields=['estado', 'archivo', 'error', 'terminado'])
+    return trabajo
+
+
+def purgar(dias=7):
+    """Borra trabajos terminados hace más de `dias` (y los PDFs de presupuesto que generaron)."""
+    viejos = TrabajoRender.objects.filter(
+        estado__in=('listo', 'error'), terminado__lt=timezone.now() - timedelta(days=dias),
+    )
+    for archivo in viejos.filter(tipo='presupuesto_pdf').exclude(archivo='').values_list('archivo', flat=True):
+        default_storage.delete(archivo)
+    return viejos.delete()[0]
+
+
+def url_resultado(trabajo):
+    """URL para descargar/ver el archivo de un trabajo listo."""
+    from django.urls import reverse
+
+    if trabajo.tipo == 'presupuesto_pdf':
+        return reverse('CarritoApp:descargar_trabajo', args=[trabajo.uuid])
+    return default_storage.url(trabajo.archivo) if trabajo.archivo else ''
+
+
+#-------------------- Procesadores ------------------------------------#
+# Los dibujos viven en views.py junto a sus vistas; se importan acá adentro
+# para no crear un import circular (views importa este módulo).
+
+@procesador('factura_pdf')
+def _factura_pdf(trabajo):
+    import os
+    from .pdf_cache import pdf_factura
+    from .views import _dibujar_resumen_factura
+
+    ruta, _ = pdf_factura(trabajo.factura, 'resumen', _dibujar_resumen_factura)
+    return os.path.relpath(ruta, settings.MEDIA_ROOT)
+
+
+@procesador('ticket_mp')
+def _ticket_mp(trabajo):
+    from .views import _dibujar_ticket_mp
+
+    factura = trabajo.factura
+    _dibujar_ticket_mp(factura, trabajo.parametros)
+    factura.save(update_fields=['imagen_factura'])
+    return factura.imagen_factura.name
+
+
+@procesador('presupuesto_pdf')
+def _presupuesto_pdf(trabajo):
+    from .views import render_to_pdf
+
+    pdf_bytes = render_to_pdf(trabajo.parametros['template'], trabajo.parametros['contexto'])
+    if not pdf_bytes:
+        raise ValueError('Error generando PDF (xhtml2pdf)')
+    return default_storage.save(f'trabajos/presupuesto_{trabajo.uuid}.pdf', ContentFile(pdf_bytes))
+
+
+@procesador('miniaturas')
+def _miniaturas(trabajo):
+    from .miniaturas import procesar_producto
+    from .models import Producto
+
+    producto = Producto.objects.filter(pk=trabajo.parametros['producto_id']).first()
+    if producto is not None:
+        procesar_producto(producto)
+    return ''
@@ -69,6 +69,7 @@ urlpatterns = [
     path('api/obtener-nombre-producto/', views.obtener_nombre_producto, name='obtener_nombre_producto'),
     path('api/obtener-numero-producto/', views.obtener_numero_producto, name='obtener_numero_producto'),
     path('buscar_productos/', views.buscar_productos, name='buscar_productos'),
+    path('productos/autocompletar/', views.autocompletar_productos, name='autocompletar_productos'),
     path('obtener-producto/', views.obtener_producto, name='obtener_producto'),
     path('planilla_compra/', views.planilla_compra, name='planilla_compra'),
     path('api/obtener-stock/', obtener_stock, name='obtener_stock'),
@@ -142,6 +143,10 @@ urlpatterns = [
 
     path("presupuesto-whatsapp/pdf/", views.presupuesto_whatsapp_pdf, name="presupuesto_whatsapp_pdf"),
 
+    # PDFs / imágenes generados en segundo plano (manage.py procesar_trabajos)
+    path("trabajos/<uuid:trabajo_uuid>/estado/", views.estado_trabajo, name="estado_trabajo"),
+    path("trabajos/<uuid:trabajo_uuid>/descargar/", views.descargar_trabajo, name="descargar_trabajo"),
+
     
     path('', views.vista_productos, name='inicio'),
 
@@ -176,30 +176,47 @@ from django.http import JsonResponse
 from .models import Producto
 
 def obtener_numero_producto(request):
-    nombre_producto = request.GET.get('nombre_producto', '')
-    try:
-        producto = Producto.objects.get(nombre_producto__iexact=nombre_producto)
-        return JsonResponse({'numero_producto': producto.numero_producto})
-    except Producto.DoesNotExist:
+    from .busqueda import normalizar
+
+    nombre_producto = request.GET.get('nombre_producto', '').strip()
+    # Por el nombre normalizado (índice): sin importar mayúsculas ni acentos. Si hay
+    # repetidos gana el que coincide tal cual y después el más nuevo.
+    candidatos = list(
+        Producto.objects.filter(nombre_normalizado=normalizar(nombre_producto))
+        .exclude(nombre_normalizado='')
+        .order_by('-id')
+        .values('numero_producto', 'nombre_producto')[:10]
+    )
+    if not candidatos:
         return JsonResponse({'numero_producto': ''})
+    producto = next((p for p in candidatos if p['nombre_producto'].lower() == nombre_producto.lower()), candidatos[0])
+    return JsonResponse({'numero_producto': producto['numero_producto'] or ''})
 
 #-----------buscar producto de compra----------------------------------------#
 from django.http import JsonResponse
-from .models import Producto
-from django.http import JsonResponse
-from .models import Producto
+from .busqueda import buscar
 
 def buscar_productos(request):
     query = request.GET.get('query', '').strip()  # Elimina espacios adicionales al inicio y al final
-    print(f"Consulta recibida: '{query}'")  # Depuración: Verifica el valor de query
+    productos = buscar(query, request.GET.get('limite'), campos=('nombre_producto', 'numero_producto'))
+    return JsonResponse({'productos': productos}, status=200)
 
-    if query:
-        productos = Producto.objects.filter(nombre_producto__icontains=query).values('nombre_producto', 'numero_producto')
-        print(f"Productos encontrados: {list(productos)}")  # Depuración: Muestra los productos encontrados
-        return JsonResponse({'productos': list(productos)}, status=200)
-    
-    print("No se recibió una consulta válida.")  # Depuración: No se recibió query
-    return JsonResponse({'productos': []}, status=200)
+
+#-----------Autocompletar productos (POS) ----------------------------------------#
+# GET ?q=texto&limite=N -> {"productos": [{id, numero_producto, nombre_producto, precio, stock}]}
+# Ver busqueda.py: índice de palabras/trigramas, sin acentos, con tope de resultados.
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from .busqueda import buscar
+
+@require_GET
+def autocompletar_productos(request):
+    productos = buscar(request.GET.get('q', ''), request.GET.get('limite'))
+    for producto in productos:
+        producto['precio'] = str(producto['precio'])
+    response = JsonResponse({'productos': productos})
+    response['Cache-Control'] = 'private, max-age=10'  # el mismo prefijo se repite al tipear y borrar
+    return response
 
 
 #-----------Modificar Compra----------------------------------------#
@@ -219,22 +236,20 @@ def modificar_compra(request, pk):
 
 #-----------Eliminar Compra----------------------------------------#
 from django.shortcuts import get_object_or_404, redirect
+from django.db import transaction
 from .models import Compra, Producto
+from .stock import descontar_stock
 
 def eliminar_compra(request, pk):
     compra = get_object_or_404(Compra, pk=pk)
     
     if request.method == 'POST':
-        # Obtener el producto relacionado
-        producto = compra.producto  # Asumiendo que hay un ForeignKey a Producto en el modelo Compra
-        
-        # Actualizar el stock del producto
-        if producto:
-            producto.stock -= compra.cantidad  # Sumar la cantidad de la compra al stock
-            producto.save()
-        
-        # Eliminar la compra
-        compra.delete()
+        with transaction.atomic():
+            # Quitar del stock lo que había entrado con la compra (si ya se vendió, queda en 0)
+            descontar_stock([(compra.producto_id, compra.cantidad)], permitir_faltantes=True)
+
+            # Eliminar la compra
+            compra.delete()
         
         # Redirigir a la vista de agregar compras
         return redirect('CarritoApp:planilla_compra')
@@ -367,8 +382,10 @@ def agregar_provedor(request):
 
 #-----------------------------REALIZAR VENTAS -----------------------#
 from django.shortcuts import render, redirect
+from django.db import transaction
 from .forms import VentaForm
 from .models import Venta, Producto
+from .stock import descontar_stock, StockInsuficiente
 import logging
 
 logger = logging.getLogger(__name__)
@@ -381,18 +398,16 @@ def realizar_venta(request):
             venta = form.save(commit=False)  # No guarda aún en la BD
             producto = venta.producto  # Obtiene el producto asociado
             
-            # Validación de stock
-            if venta.cantidad > producto.stock:
+            # Descuento atómico: si no alcanza el stock no se guarda nada
+            try:
+                with transaction.atomic():
+                    descontar_stock([(producto.id, venta.cantidad)])
+                    venta.usuario = request.user  # Asigna el usuario actual
+                    venta.save()  # Guarda la venta
+            except StockInsuficiente:
                 mensaje = "Stock insuficiente. No se pudo realizar la venta."
             else:
-                # Registra el stock antes y después de la operación
-                logger.info(f"Stock antes: {producto.stock} - Cantidad vendida: {venta.cantidad}")
-                producto.stock -= venta.cantidad
-                producto.save()  # Guarda el producto con el stock actualizado
-                logger.info(f"Stock después: {producto.stock}")
-                
-                venta.usuario = request.user  # Asigna el usuario actual
-                venta.save()  # Guarda la venta
+                logger.info(f"Venta registrada: {producto} - Cantidad vendida: {venta.cantidad}")
                 mensaje = "Venta registrada con éxito."
                 form = VentaForm()  # Reinicia el formulario
         else:
@@ -432,47 +447,58 @@ def calcular_total_carrito(carrito):
 
 from django.shortcuts import get_object_or_404, redirect
 from .models import Producto
+from .Carrito import Carrito
 
 def restar_del_carrito(request, producto_id):
-    carrito = request.session.get('carrito', {})  # Obtén el carrito de la sesión
-
-    if str(producto_id) in carrito:
-        if carrito[str(producto_id)]['cantidad'] > 1:
-            # Resta una unidad del producto en el carrito
-            carrito[str(producto_id)]['cantidad'] -= 1
-            carrito[str(producto_id)]['acumulado'] -= float(carrito[str(producto_id)]['precio'])
-        else:
-            # Si la cantidad es 1, elimina el producto del carrito
-            del carrito[str(producto_id)]
-    
-    request.session['carrito'] = carrito  # Actualiza el carrito en la sesión
+    # Resta una unidad (si era la última, saca el producto del carrito)
+    Carrito(request).restar(producto_id)
     return redirect('CarritoApp:ver_carrito')
 
 
 #---------------------Sumar del Carrito-------------/views.py --
 def sumar_producto(request, producto_id):
-    carrito = request.session.get('carrito', {})  # Obtén el carrito de la sesión
-
-    if str(producto_id) in carrito:
-        carrito[str(producto_id)]['cantidad'] += 1
-        carrito[str(producto_id)]['acumulado'] += float(carrito[str(producto_id)]['precio'])
-
-    request.session['carrito'] = carrito  # Actualiza el carrito en la sesión
+    Carrito(request).sumar(producto_id)  # UPDATE de la fila del producto
     return redirect('CarritoApp:ver_carrito')  # Redirigir a la plantilla carrito
 
 
 
 #---------------Limpiar Carrito----------------------------- --
 def limpiar_carrito(request):
-    request.session['carrito'] = {}
+    Carrito(request).limpiar()
     return redirect('CarritoApp:ver_carrito')
 
 #----------------- ----TIENDA aqui enumera la factura-------------/views.py --
 from datetime import datetime
+from urllib.parse import urlencode
 #from .models import Factura, Producto, Categ_producto
 from apps.CarritoApp.models import Factura, Producto, Categ_producto
 from django.shortcuts import render
 from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from . import cache_tienda
+from .Carrito import Carrito
+
+def _grilla_tienda(request, variante, productos, por_pagina, categoria_id):
+    """HTML de la grilla de productos + paginación (cacheado para anónimos, ver cache_tienda.py)."""
+    paginador = Paginator(productos, por_pagina)
+    # La clave del cache va con la página ya acotada a las que existen: ?page=99999 no abre otra entrada
+    paginas = cache_tienda.paginas(request, variante, categoria_id, lambda: paginador.num_pages)
+    pagina = request.GET.get('page', '')
+    pagina = max(1, min(int(pagina), paginas)) if pagina.isdigit() else 1
+
+    def armar():
+        productos_pagina = paginador.get_page(pagina)
+        # "next" de los botones: la URL canónica de la página, no la que trajo el request
+        parametros = {'categoria': categoria_id, 'page': pagina}
+        ruta_actual = request.path + '?' + urlencode({k: v for k, v in parametros.items() if v})
+        return render_to_string('tienda_grilla.html', {
+            'productos_pagina': productos_pagina,
+            'ruta_actual': ruta_actual,
+        }, request=request)
+
+    return mark_safe(cache_tienda.grilla(request, variante, categoria_id, pagina, armar))
+
 
 def tienda(request):
     # Verificar si el usuario está autenticado
@@ -484,30 +510,19 @@ def tienda(request):
         nombre_usuario = "Desconocido"
         apellido_usuario = "Usuario"
     #------------------------------
-    # Obtener la última factura registrada
-    ultima_factura = Factura.objects.order_by('-id').first()  # Se asegura de obtener la última factura creada
-
-    # Verificar que exista una factura previa y que su número sea válido
-    if ultima_factura and ultima_factura.numero_factura.isdigit():
-        numero_factura = str(int(ultima_factura.numero_factura) + 1).zfill(5)  # Incrementa el número y lo formatea a 5 dígitos
-    else:
-        numero_factura = "00001"  # Si no hay facturas previas, inicia desde 00001
-    #------------------------------
     # Filtro por categoría
-    categoria_id = request.GET.get('categoria')  # Obtiene el ID de la categoría desde el parámetro GET
+    categoria_id = request.GET.get('categoria', '')  # Obtiene el ID de la categoría desde el parámetro GET
+    categoria_id = int(categoria_id) if categoria_id.isdigit() else None
     if categoria_id:
         productos = Producto.objects.filter(categoria_id=categoria_id)  # Filtra productos por categoría seleccionada
     else:
         productos = Producto.objects.all()  # Muestra todos los productos si no se selecciona categoría
 
-    # Paginación
-    
-    paginator = Paginator(productos, 10)  # Muestra 3 productos por página
-    page_number = request.GET.get('page')  # Obtiene el número de página desde el parámetro GET
-    productos_pagina = paginator.get_page(page_number)  # Obtiene los productos de la página actual
+    # Grilla paginada (10 por página); para anónimos sale del cache sin consultar productos
+    grilla = _grilla_tienda(request, 'tienda', productos.order_by('id'), 10, categoria_id)
 
     # Obtener todas las categorías para mostrar en el filtro
-    categorias = Categ_producto.objects.all()
+    categorias = cache_tienda.categorias(lambda: list(Categ_producto.objects.all()))
 
     # Verificar si se agregó un producto al carrito
     producto_en_carrito = False
@@ -516,16 +531,16 @@ def tienda(request):
 
     # Otros datos
     fecha_actual = datetime.now().strftime('%Y-%m-%d')
-    carrito = request.session.get('carrito', {})
-    total_carrito = calcular_total_carrito(carrito)
+    carrito_compra = Carrito(request)
+    carrito = carrito_compra.como_dict()  # sin consultas si el visitante no tiene carrito
+    total_carrito = carrito_compra.total(carrito)
 
     # Contexto para renderizar
     context = {
-        'productos_pagina': productos_pagina,  # Productos paginados
+        'grilla': grilla,  # Productos paginados (HTML)
         'categorias': categorias,  # Todas las categorías
         'carrito': carrito,  # Carrito de compras
         'total_carrito': total_carrito,  # Total del carrito
-        'numero_factura': numero_factura,  # Número de la factura
         'fecha': fecha_actual,  # Fecha actual
         'nombre': nombre_usuario,  # Nombre del usuario
         'apellido': apellido_usuario,  # Apellido del usuario
@@ -543,6 +558,7 @@ from django.contrib import messages
 from .models import Producto
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.urls import reverse
+from .Carrito import Carrito
 
 def agregar_al_carrito(request, producto_id):
 
@@ -551,23 +567,9 @@ def agregar_al_carrito(request, producto_id):
         
         return redirect('tienda')  # En lugar de redirigir a iniciar sesión, lo redirige a la tienda
     
-    # Si está autenticado, agrega el producto al carrito
-    producto = get_object_or_404(Producto, id=producto_id)
-    carrito = request.session.get('carrito', {})
-
-    if str(producto_id) not in carrito:
-        carrito[str(producto_id)] = {
-            'producto_id': producto_id,  # Incluye el ID del producto aquí
-            'nombre': producto.nombre_producto,  # Ajusta según tu modelo
-            'precio': float(producto.precio),
-            'cantidad': 1,
-            'acumulado': float(producto.precio),
-        }
-    else:
-        carrito[str(producto_id)]['cantidad'] += 1
-        carrito[str(producto_id)]['acumulado'] += float(producto.precio)
-
-    request.session['carrito'] = carrito
+    # Si está autenticado, agrega el producto al carrito (o suma 1 si ya estaba)
+    producto = get_object_or_404(Producto.objects.only('id', 'precio'), id=producto_id)
+    Carrito(request).agregar(producto)
     next_url = request.GET.get("next") or request.META.get("HTTP_REFERER")
     if not next_url or not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
         next_url = reverse("CarritoApp:tienda")
@@ -577,9 +579,10 @@ def agregar_al_carrito(request, producto_id):
 
 #----------------- CARRITO por falta de mercaderia ---------------------------
 from django.shortcuts import render
+from .Carrito import Carrito
 
 def carrito(request):
-    carrito = request.session.get('carrito', {})
+    carrito = Carrito(request).como_dict()
     return render(request, 'CarritoApp/carrito.html', {'carrito': carrito})
 
 
@@ -594,8 +597,12 @@ def pago_pendiente(request):
 
 #-------------------------------------------------------------------------------
 from django.shortcuts import redirect
+from . import reservas
 
 def pago_fallido(request):
+    # El pago no se hizo: lo reservado en mp_checkout vuelve al stock
+    datos = request.session.get('factura_datos') or {}
+    reservas.liberar(datos.get('referencia'))
     # Podés mostrar un mensaje con messages.error si querés
     return redirect('CarritoApp:tienda')
 
@@ -609,12 +616,15 @@ def pago_fallido(request):
 
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
-from .models import Factura, Producto
+from .models import Factura, Producto, generar_numero_factura
+from .stock import descontar_stock
+from .Carrito import Carrito
 
 def confirmar_pago(request):
     if request.method == 'POST':
         metodo_pago = request.POST.get('metodo_pago')
-        carrito = request.session.get('carrito', {})
+        carrito_compra = Carrito(request)
+        carrito = carrito_compra.como_dict()
 
         if not carrito:
             messages.error(request, 'No hay productos en el carrito.')
@@ -622,7 +632,7 @@ def confirmar_pago(request):
 
         # Crear la nueva factura
         nueva_factura = Factura.objects.create(
-            numero_factura=Factura.objects.count() + 1,
+            numero_factura=generar_numero_factura(),
             fecha=datetime.now(),
             nombre_cliente=request.user.first_name,
             apellido_cliente=request.user.last_name,
@@ -640,13 +650,11 @@ def confirmar_pago(request):
                 through_defaults={'cantidad_vendida': item_data['cantidad']}
             )
 
-            # Restar el stock del producto
-            producto.stock -= item_data['cantidad']
-            producto.save()
+        # Restar el stock de todo el carrito (UPDATE condicional)
+        descontar_stock((item['producto_id'], item['cantidad']) for item in carrito.values())
 
         # Limpiar el carrito
-        del request.session['carrito']
-        request.session.modified = True
+        carrito_compra.limpiar()
 
         messages.success(request, 'Factura guardada exitosamente.')
         return redirect('CarritoApp:tienda')
@@ -672,7 +680,109 @@ from django.core.paginator import Paginator
 
 from apps.turnos.models import Turno
 from django.core.exceptions import FieldError
-from django.db.models.functions import Cast
+from django.db.models.functions import Cast, Concat, NullIf
+from django.db.models import IntegerField
+from django.core.files.storage import default_storage
+from datetime import datetime
+from .models import ResumenCajaDiario
+from .resumen_caja import totales_caja
+
+MOVIMIENTOS_POR_PAGINA = 100
+TURNOS_POR_PAGINA = 50
+
+
+def _parse_cursor_caja(valor):
+    """Cursor 'AAAA-MM-DD.orden.id' del último movimiento mostrado (None si no hay o es inválido)."""
+    try:
+        fecha, orden, pk = valor.split('.')
+        return datetime.strptime(fecha, '%Y-%m-%d').date(), int(orden), int(pk)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _movimientos_caja(facturas, pagos, cursor, limite):
+    """
+    Una página de movimientos (facturas + pagos de cta cte) ordenados por
+    (fecha, orden, id) descendente, resueltos con un único UNION ALL en la base.
+    Devuelve (movimientos, siguiente_cursor).
+    """
+    texto = CharField()
+    dinero = DecimalField(max_digits=12, decimal_places=2)
+
+    # orden: 0 = factura, 1 = pago (en el mismo día los pagos van primero, como antes)
+    if cursor:
+        fecha, orden, pk = cursor
+        facturas = facturas.filter(
+            Q(fecha__lt=fecha) | (Q(fecha=fecha) & (Q(pk__lt=pk) if orden == 0 else Q()))
+        )
+        pagos = pagos.filter(
+            Q(fecha_cuota__lt=fecha) | (Q(fecha_cuota=fecha, pk__lt=pk) if orden == 1 else Q(pk__in=[]))
+        )
+
+    # Mismas columnas, mismo orden de annotate/values en las dos ramas del UNION
+    columnas = ('mov_tipo', 'mov_fecha', 'mov_orden', 'mov_id', 'mov_numero', 'mov_dni', 'mov_cliente',
+                'mov_vendedor', 'mov_metodo', 'mov_estado_credito', 'mov_estado_entrega', 'mov_tarjeta_numero',
+                'mov_numero_tiket', 'mov_total', 'mov_imagen', 'mov_factura_id', 'mov_descripcion')
+
+    rama_facturas = facturas.order_by().annotate(
+        mov_tipo=Value('factura', output_field=texto),
+        mov_fecha=F('fecha'),
+        mov_orden=Value(0, output_field=IntegerField()),
+        mov_id=F('pk'),
+        mov_numero=F('numero_factura'),
+        mov_dni=Coalesce('dni_cliente', Value(''), output_field=texto),
+        mov_cliente=Trim(Concat('nombre_cliente', Value(' '), 'apellido_cliente', output_field=texto)),
+        mov_vendedor=F('vendedor'),
+        mov_metodo=Coalesce('metodo_pago__tarjeta_nombre', NullIf('metodo_pago_manual', Value('')),
+                            Value('Sin especificar'), output_field=texto),
+        mov_estado_credito=F('estado_credito'),
+        mov_estado_entrega=F('estado_entrega'),
+        mov_tarjeta_numero=Coalesce('tarjeta_numero', Value(''), output_field=texto),
+        mov_numero_tiket=Coalesce('numero_tiket', Value(''), output_field=texto),
+        mov_total=Cast('total_con_interes', dinero),
+        mov_imagen=Coalesce(Cast('imagen_factura', texto), Value(''), output_field=texto),
+        mov_factura_id=F('pk'),
+        mov_descripcion=Value('', output_field=texto),
+    ).values(*columnas)
+
+    rama_pagos = pagos.order_by().annotate(
+        mov_tipo=Value('pago', output_field=texto),
+        mov_fecha=F('fecha_cuota'),
+        mov_orden=Value(1, output_field=IntegerField()),
+        mov_id=F('pk'),
+        mov_numero=F('numero_factura'),
+        mov_dni=Coalesce('factura__dni_cliente', Value(''), output_field=texto),
+        mov_cliente=Trim(Concat('factura__nombre_cliente', Value(' '), 'factura__apellido_cliente', output_field=texto)),
+        mov_vendedor=F('factura__vendedor'),
+        mov_metodo=Value('Pago Cuenta Corriente', output_field=texto),
+        mov_estado_credito=Value('Pago', output_field=texto),
+        mov_estado_entrega=Value('', output_field=texto),
+        mov_tarjeta_numero=Value('-', output_field=texto),
+        mov_numero_tiket=Value('-', output_field=texto),
+        mov_total=ExpressionWrapper(F('imp_cuota_pagadas') + F('entrega_cta'), output_field=dinero),
+        mov_imagen=Coalesce(Cast('imagen_pago', texto), Value(''), output_field=texto),
+        mov_factura_id=F('factura_id'),
+        mov_descripcion=F('descripcion'),
+    ).values(*columnas)
+
+    filas = list(
+        rama_facturas.union(rama_pagos, all=True)
+        .order_by('-mov_fecha', '-mov_orden', '-mov_id')[:limite + 1]
+    )
+
+    siguiente_cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente_cursor = f"{ultima['mov_fecha']:%Y-%m-%d}.{ultima['mov_orden']}.{ultima['mov_id']}"
+
+    movimientos = []
+    for fila in filas:
+        m = {clave[len('mov_'):]: valor for clave, valor in fila.items()}
+        m['imagen_url'] = default_storage.url(m['imagen']) if m['imagen'] else ''
+        movimientos.append(m)
+    return movimientos, siguiente_cursor
+
 
 def lista_cierre_de_caja(request):
     facturas = Factura.objects.all().order_by('-fecha', '-numero_factura')
@@ -689,45 +799,13 @@ def lista_cierre_de_caja(request):
         facturas = facturas.filter(fecha__gte=fecha_desde)
     if fecha_hasta:
         facturas = facturas.filter(fecha__lte=fecha_hasta)
+    metodo_obj = None
     if metodo_pago:
         metodo_obj = MetodoPago.objects.filter(tarjeta_nombre=metodo_pago).first()
         if metodo_obj:
             facturas = facturas.filter(metodo_pago=metodo_obj)
 
-    # Agrupación por vendedor
-    totales_por_vendedor = (
-        facturas
-        .annotate(vendedor_normalizado=Trim(Lower('vendedor')))
-        .values('vendedor_normalizado')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('vendedor_normalizado')
-    )
-
-    # Agrupación por método de pago (para visualización)
-    totales_por_metodo = (
-        facturas
-        .annotate(
-            metodo_normalizado=Case(
-                When(metodo_pago__tarjeta_nombre__isnull=False, then=Trim(Lower('metodo_pago__tarjeta_nombre'))),
-                When(metodo_pago_manual__isnull=False, then=Trim(Lower('metodo_pago_manual'))),
-                default=Value('sin especificar'),
-                output_field=CharField(),
-            )
-        )
-        .values('metodo_normalizado')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('metodo_normalizado')
-    )
-
-    # Agrupación por método de pago (por nombre)
-    totales_por_metodo_nombre = (
-        facturas
-        .values('metodo_pago__tarjeta_nombre')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('metodo_pago__tarjeta_nombre')
-    )
-
-    # 💰 Pagos de Cuenta Corriente (con los mismos filtros)
+    # 💰 Pagos de Cuenta Corriente (con los mismos filtros) -> solo para el listado de movimientos
     pagos_cta_corriente = CuentaCorriente.objects.filter(
         Q(factura__metodo_pago__tarjeta_nombre__iexact="cuenta corriente") |
         Q(factura__metodo_pago_manual__iexact="cuenta corriente")
@@ -739,53 +817,27 @@ def lista_cierre_de_caja(request):
     if vendedor:
         pagos_cta_corriente = pagos_cta_corriente.filter(factura__vendedor__icontains=vendedor)
 
-    # Optimiza acceso a factura desde pagos
-    pagos_cta_corriente = pagos_cta_corriente.select_related('factura').order_by('-fecha_cuota')
+    # 🧮 Totales: salen del resumen diario (ResumenCajaDiario), no de recorrer facturas y pagos
+    totales = totales_caja(fecha_desde, fecha_hasta, vendedor, metodo_obj.tarjeta_nombre if metodo_obj else '')
+    totales_por_vendedor = totales['totales_por_vendedor']
+    totales_por_metodo = totales['totales_por_metodo']
+    resumen_metodos = totales['resumen_metodos']
+    total_en_caja = totales['total_en_caja']
+    total_cta_corriente_cobrado = totales['cobro_cta_corriente']
+    cobro_cta_corriente = totales['cobro_cta_corriente']
+    pendiente_cta_corriente = totales['pendiente_cta_corriente']
+    total_importe = totales['total_importe']
 
-    total_cuotas = pagos_cta_corriente.aggregate(total=Sum('imp_cuota_pagadas'))['total'] or 0
-    total_entregas = pagos_cta_corriente.aggregate(total=Sum('entrega_cta'))['total'] or 0
-    total_cta_corriente_cobrado = total_cuotas + total_entregas
-
-    # 💵 Total en caja (sin cuenta corriente)
-    total_en_caja = 0
-    for item in totales_por_metodo_nombre:
-        nombre_metodo = item['metodo_pago__tarjeta_nombre']
-        if nombre_metodo and nombre_metodo.lower() == 'cuenta corriente':
-            continue
-        total_en_caja += item['total'] or 0
     total_en_caja_con_credito = total_en_caja + total_cta_corriente_cobrado
 
-    # Pendiente en cta cte (si tu modelo CuentaCorriente tiene total_con_interes)
-    pendiente_qs = CuentaCorriente.objects.filter(
-        factura__metodo_pago__tarjeta_nombre__iexact="cuenta corriente"
-    ).annotate(
-        pendiente=ExpressionWrapper(
-            F('total_con_interes') - F('imp_cuota_pagadas') - F('entrega_cta'),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
-    )
-    pendiente_cta_corriente = pendiente_qs.aggregate(total=Sum('pendiente'))['total'] or 0
-
-    # 🧮 Agrupación real de pagos desde CuentaCorriente (no usado en la tabla unificada, se mantiene por si lo mostrás)
-    pagos_agrupados = (
-        CuentaCorriente.objects
-        .annotate(
-            metodo=Case(
-                When(metodo_pago__tarjeta_nombre__isnull=False, then=Trim(Lower('metodo_pago__tarjeta_nombre'))),
-                default=Value('cuenta corriente'),
-                output_field=CharField()
-            )
-        )
-        .values('metodo')
-        .annotate(total=Sum('imp_cuota_pagadas') + Sum('entrega_cta'))
-        .order_by('metodo')
-    )
-
     facturado_cta_corriente = 0
 
     # Datos adicionales
     metodos_pago = MetodoPago.objects.all()
-    vendedores = Factura.objects.values_list('vendedor', flat=True).distinct().order_by('vendedor')
+    vendedores = (
+        ResumenCajaDiario.objects.filter(tipo='factura')
+        .values_list('vendedor', flat=True).distinct().order_by('vendedor')
+    )
 
     # 🧮 Total Caja SIN contar nada facturado en Cuenta Corriente (aunque no esté cobrado)
     total_facturado_cta_cte = next(
@@ -796,97 +848,25 @@ def lista_cierre_de_caja(request):
     # Nuevo total: caja real + lo cobrado de cuenta corriente
     total_real_con_credito = total_en_caja_sin_cta_corriente_facturada + total_cta_corriente_cobrado
 
-
-    # ==== Resumen por método (FACTURADO) ====
-    resumen_metodos = (
-        facturas
-        .annotate(
-            metodo_nombre=Case(
-                When(metodo_pago__tarjeta_nombre__isnull=False, then=Trim('metodo_pago__tarjeta_nombre')),
-                When(metodo_pago_manual__isnull=False, then=Trim('metodo_pago_manual')),
-                default=Value('Sin especificar'),
-                output_field=CharField(),
-            )
-        )
-        .values('metodo_nombre')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('metodo_nombre')
-    )
-
-    # ==== Cuenta Corriente COBRADO (pagos registrados en CuentaCorriente) ====
-    cobro_cta_corriente = pagos_cta_corriente.aggregate(
-        total=Sum('imp_cuota_pagadas') + Sum('entrega_cta')
-    )['total'] or 0
-
-    # ---------------------------------------------------------------------
-    # 👇 NUEVO: Unificar facturas + pagos en "movimientos" y ordenar por fecha
-    movimientos = []
-
-    # Facturas -> movimientos
-    for f in facturas:
-        movimientos.append({
-            'tipo': 'factura',
-            'fecha': f.fecha,  # DateField
-            'numero': f.numero_factura,
-            'dni': f.dni_cliente,
-            'cliente': f"{f.nombre_cliente} {f.apellido_cliente}".strip(),
-            'vendedor': f.vendedor,
-            'metodo': (
-                f.metodo_pago.tarjeta_nombre if getattr(f, 'metodo_pago', None)
-                else (f.metodo_pago_manual or 'Sin especificar')
-            ),
-            'estado_credito': getattr(f, 'estado_credito', ''),
-
-            # 👇 ESTO FALTABA: pasar el valor crudo que está guardado en la BD
-            'estado_entrega': f.estado_entrega,                   # 'pendiente' | 'aceptado' | 'rechazado'
-            'estado_entrega_label': f.get_estado_entrega_display(),  # opcional
-
-            'tarjeta_numero': getattr(f, 'tarjeta_numero', ''),
-            'numero_tiket': getattr(f, 'numero_tiket', ''),
-            'total': f.total_con_interes,
-            'imagen_url': f.imagen_factura.url if getattr(f, 'imagen_factura', None) else '',
-            'id': f.id,
-            'factura_id': f.id,   # para links desde la tabla
-            'orden': 0,           # para ordenar dentro del mismo día (0=factura, 1=pago). Cambiá si querés pagos primero.
-        })
-
-
-    # Pagos cta cte -> movimientos
-    # Pagos cta cte -> movimientos
-    for p in pagos_cta_corriente:
-        monto_pago = (p.imp_cuota_pagadas or 0) + (p.entrega_cta or 0)
-        movimientos.append({
-            'tipo': 'pago',
-            'fecha': p.fecha_cuota,
-            'numero': p.numero_factura,
-            'dni': getattr(p.factura, 'dni_cliente', '') if p.factura_id else '',
-            'cliente': (
-                f"{getattr(p.factura, 'nombre_cliente', '')} {getattr(p.factura, 'apellido_cliente', '')}".strip()
-                if p.factura_id else ''
-            ),
-            'vendedor': getattr(p.factura, 'vendedor', '-') if p.factura_id else '-',
-            'metodo': 'Pago Cuenta Corriente',
-            'estado_credito': 'Pago',
-            'tarjeta_numero': '-',
-            'numero_tiket': '-',
-            'total': monto_pago,
-            'imagen_url': p.imagen_pago.url if getattr(p, 'imagen_pago', None) else '',
-            'id': p.id,
-            'factura_id': p.factura_id,
-            'descripcion': getattr(p, 'descripcion', ''),
-            'orden': 1,
-        })
-
-
-
-    # Ordenar por fecha desc y, dentro del mismo día, por 'orden'
-    # (reverse=True -> fechas más nuevas primero; y 1 > 0: pagos se muestran antes que facturas si ponés pago=1)
-    movimientos.sort(key=lambda x: (x['fecha'], x['orden']), reverse=True)
     # ---------------------------------------------------------------------
+    # 👇 Movimientos: facturas + pagos en un UNION ordenado por la base, paginado por cursor
+    cursor = _parse_cursor_caja(request.GET.get('cursor', ''))
+    movimientos, siguiente_cursor = _movimientos_caja(facturas, pagos_cta_corriente, cursor, MOVIMIENTOS_POR_PAGINA)
+
+    url_siguiente = ''
+    if siguiente_cursor:
+        params = request.GET.copy()
+        params['cursor'] = siguiente_cursor
+        url_siguiente = f"?{params.urlencode()}"
+    url_primera = ''
+    if cursor:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        url_primera = f"?{params.urlencode()}"
     # ---------------------------------------------------------------------
 
     # ==========================
-    # ✅ TURNOS FILTRADOS POR FECHA
+    # ✅ TURNOS FILTRADOS POR FECHA (paginados)
     # ==========================
     turnos_qs = Turno.objects.all()
 
@@ -899,10 +879,12 @@ def lista_cierre_de_caja(request):
 
     User = get_user_model()
 
-    # Traemos turnos como lista (para poder agregar atributo cliente_nombre)
-    turnos_list = list(turnos_qs.select_related('motivo', 'oficina'))
+    turnos_pagina = Paginator(turnos_qs.select_related('motivo', 'oficina'), TURNOS_POR_PAGINA).get_page(
+        request.GET.get('pagina_turnos')
+    )
+    turnos_list = list(turnos_pagina.object_list)
 
-    # Armamos mapa DNI -> Nombre Apellido desde tu User (dni_usuario)
+    # Armamos mapa DNI -> Nombre Apellido desde tu User (dni_usuario), solo para la página actual
     dnis = {t.dni for t in turnos_list if t.dni}
     usuarios = User.objects.filter(dni_usuario__in=dnis)
 
@@ -926,42 +908,6 @@ def lista_cierre_de_caja(request):
         t.cliente_nombre = mapa.get(t.dni, "-")
 
 
-# ==========================
-# ✅ TOTAL PRECIO DE TURNOS (con filtro)
-# ==========================
-    try:
-        total_importe = turnos_qs.aggregate(
-            total=Coalesce(
-                Sum('precio'),
-                Value(0),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        )['total']
-
-    except FieldError:
-        try:
-            total_importe = turnos_qs.aggregate(
-                total=Coalesce(
-                    Sum(Cast('precio', DecimalField(max_digits=12, decimal_places=2))),
-                    Value(0)
-                )
-            )['total']
-        except FieldError:
-            total_importe = turnos_qs.aggregate(
-                total=Coalesce(
-                    Sum('motivo__precio'),
-                    Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )['total']
-
-    # ==========================
-    # ✅ LISTADO DE TURNOS (para mostrar abajo)
-    # ==========================
-    #turnos_qs = Turno.objects.all().order_by('-fecha', '-hora')
-    # ---------------------------------------------------------------------
-    # ---------------------------------------------------------------------
-
     return render(request, 'CarritoApp/lista_cierre_de_caja.html', {
         'facturas': facturas,
         'vendedor': vendedor,
@@ -980,11 +926,14 @@ def lista_cierre_de_caja(request):
         'facturado_cta_corriente': facturado_cta_corriente,
         'total_en_caja_sin_cta_corriente_facturada': total_en_caja_sin_cta_corriente_facturada,
         'total_real_con_credito': total_real_con_credito,
-        'movimientos': movimientos,  # ✅ CONTEXTO: lo qu
+        'movimientos': movimientos,  # ✅ CONTEXTO: una página del UNION facturas + pagos
+        'url_siguiente': url_siguiente,
+        'url_primera': url_primera,
         'resumen_metodos': resumen_metodos,
         'cobro_cta_corriente': cobro_cta_corriente,
         'total_importe': total_importe,  # ✅ ESTA ES LA CLAVE
         'turnos': turnos_list,
+        'turnos_pagina': turnos_pagina,
         
     })
 
@@ -1140,7 +1089,10 @@ def lista_vendedor(request):
 
     # Datos adicionales
     metodos_pago = MetodoPago.objects.all()
-    vendedores = Factura.objects.values_list('vendedor', flat=True).distinct().order_by('vendedor')
+    vendedores = (
+        ResumenCajaDiario.objects.filter(tipo='factura')
+        .values_list('vendedor', flat=True).distinct().order_by('vendedor')
+    )
 
     # 🧮 Total Caja SIN contar nada facturado en Cuenta Corriente (aunque no esté cobrado)
     total_facturado_cta_cte = next(
@@ -1200,22 +1152,23 @@ import json
 from reportlab.pdfgen import canvas
 from django.conf import settings
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
 from .models import Factura
+from .pdf_cache import respuesta_pdf
 
 def generar_pdf_factura(request, factura_id):
-    factura = Factura.objects.get(id=factura_id)
+    factura = get_object_or_404(Factura.objects.select_related('metodo_pago'), id=factura_id)
+
+    # Se sirve desde el cache; solo se dibuja si la factura cambió
+    return respuesta_pdf(request, factura, 'web', _dibujar_pdf_factura_web, f"factura_{factura.id}.pdf")
+
 
+def _dibujar_pdf_factura_web(factura, ruta_pdf):
     try:
         productos = json.loads(factura.detalle_productos)
     except json.JSONDecodeError:
         productos = []
 
-    # Definir ruta de guardado
-    nombre_archivo = f"factura_{factura.id}.pdf"
-    ruta_carpeta = os.path.join(settings.MEDIA_ROOT, 'facturas')
-    os.makedirs(ruta_carpeta, exist_ok=True)
-    ruta_pdf = os.path.join(ruta_carpeta, nombre_archivo)
-
     # Crear PDF en disco
     pdf = canvas.Canvas(ruta_pdf)
     y_position = 800
@@ -1274,12 +1227,6 @@ def generar_pdf_factura(request, factura_id):
     pdf.showPage()
     pdf.save()
 
-    # También devolverlo por navegador (opcional)
-    with open(ruta_pdf, 'rb') as archivo_pdf:
-        response = HttpResponse(archivo_pdf.read(), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
-        return response
-
 #---------------------------FACTURAS USUARIO------------------------------------#
 
 from django.contrib.auth.decorators import login_required
@@ -1546,22 +1493,16 @@ def actualizar_precios(request):
 #---------------------ver carrito-------------------#
 from datetime import date
 from django.shortcuts import render
-from .models import Factura, TipoPago
+from .models import Factura, TipoPago, ver_proximo_numero_factura
+from .Carrito import Carrito
 
 def ver_carrito(request):
     # ✅ NO exigir login para ver el carrito
-    carrito = request.session.get('carrito', {})
-    total_carrito = 0
+    carrito_compra = Carrito(request)
+    carrito = carrito_compra.como_dict()  # cada ítem ya trae su importe
+    total_carrito = carrito_compra.total(carrito)
 
-    for key, value in carrito.items():
-        value['importe'] = value['precio'] * value['cantidad']
-        total_carrito += value['importe']
-
-    ultima_factura = Factura.objects.last()
-    if ultima_factura and str(ultima_factura.numero_factura).isdigit():
-        numero_factura = str(int(ultima_factura.numero_factura) + 1).zfill(5)
-    else:
-        numero_factura = "00001"
+    numero_factura = ver_proximo_numero_factura()
 
     fecha_actual = date.today()
 
@@ -1598,27 +1539,25 @@ from .models import Producto, Categ_producto  # se llama distinto, cambiá esto
 
 def vista_productos(request):
     categoria_id = request.GET.get("categoria", "")
+    categoria_id = int(categoria_id) if str(categoria_id).isdigit() else None
 
     # queryset base
     productos = Producto.objects.all().order_by("-id")
 
     # filtro por categoría (si viene)
-    if str(categoria_id).isdigit():
-        productos = productos.filter(categoria_id=int(categoria_id))
+    if categoria_id:
+        productos = productos.filter(categoria_id=categoria_id)
 
-    # paginación
-    paginator = Paginator(productos, 6)  # 6 por página como querías
-    page_number = request.GET.get("page", 1)
-    productos_pagina = paginator.get_page(page_number)
+    # paginación: 6 por página como querías (cacheada para anónimos, ver cache_tienda.py)
+    grilla = _grilla_tienda(request, "vista_productos", productos, 6, categoria_id)
 
     # categorías para el select
-    categorias = Categ_producto.objects.all().order_by("nombre")
-    categoria_seleccionada = int(categoria_id) if str(categoria_id).isdigit() else None
+    categorias = cache_tienda.categorias(lambda: list(Categ_producto.objects.all()))
 
     return render(request, "tienda.html", {
-        "productos_pagina": productos_pagina,
-        "categorias": categorias,
-        "categoria_seleccionada": categoria_seleccionada,
+        "grilla": grilla,
+        "categorias": sorted(categorias, key=lambda c: c.nombre),
+        "categoria_seleccionada": categoria_id,
     })
 
 #---------------------- BALANCE TOTAL-------------------------------------------
@@ -1633,51 +1572,61 @@ from .models import Producto, Compra, Factura
 import json  # Para manejar JSON
 
 from django.shortcuts import render
-from django.db.models import Sum, Max
-from .models import Producto, Compra, Factura
-import json  # Para manejar JSON
+from django.db.models import Sum, OuterRef, Subquery
+from .models import Producto, Compra, FacturaProducto, mapa_productos_por_nombre
 
 def balance_total(request):
     # Obtener los parámetros de fecha
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
 
-    # Filtrar productos por rango de fechas si ambos parámetros están presentes
     productos = Producto.objects.all()
-    if fecha_desde and fecha_hasta:
-        productos = productos.filter(fecha_creacion__range=[fecha_desde, fecha_hasta])
 
     # Crear diccionarios para cálculos
     cantidades_por_producto = Compra.objects.values('producto_id').annotate(total_comprado=Sum('cantidad'))
     cantidades_por_producto = {item['producto_id']: item['total_comprado'] for item in cantidades_por_producto}
 
-    cantidades_vendidas_por_producto = {}
-    facturas = Factura.objects.all()
-    for factura in facturas:
-        try:
-            detalle_productos = json.loads(factura.detalle_productos)
-            for detalle in detalle_productos:
-                producto = Producto.objects.filter(nombre_producto=detalle.get('nombre_producto')).first()
-                if producto:
-                    cantidad_vendida = detalle.get('cantidad_vendida', 0)
-                    producto_id = producto.id
-                    cantidades_vendidas_por_producto[producto_id] = (
-                        cantidades_vendidas_por_producto.get(producto_id, 0) + cantidad_vendida
-                    )
-        except json.JSONDecodeError:
-            print(f"Error al decodificar JSON en la factura {factura.numero_factura}")
-
-    # Obtener el precio_compra de la última compra de cada producto
-    costos_por_producto = {}
-    compras = Compra.objects.values('producto_id').annotate(ultima_fecha=Max('fecha_compra'))
-    for compra in compras:
-        ultima_compra = Compra.objects.filter(
-            producto_id=compra['producto_id'], fecha_compra=compra['ultima_fecha']
-        ).first()
-        if ultima_compra:
-            costos_por_producto[compra['producto_id']] = ultima_compra.precio_compra
+    # Vendidos: un GROUP BY sobre las líneas de factura (el rango de fechas aplica a las ventas)
+    lineas = FacturaProducto.objects.all()
+    if fecha_desde and fecha_hasta:
+        lineas = lineas.filter(fecha__range=[fecha_desde, fecha_hasta])
+    cantidades_vendidas_por_producto = {
+        item['producto_id']: item['total_vendido']
+        for item in lineas.filter(producto__isnull=False)
+        .values('producto_id').annotate(total_vendido=Sum('cantidad'))
+    }
+
+    # Líneas viejas sin producto asociado: se resuelven por nombre con un único mapa nombre → id
+    sin_producto = list(
+        lineas.filter(producto__isnull=True)
+        .values('nombre_producto').annotate(total_vendido=Sum('cantidad'))
+    )
+    if sin_producto:
+        ids_por_nombre = mapa_productos_por_nombre(item['nombre_producto'] for item in sin_producto)
+        for item in sin_producto:
+            producto_id = ids_por_nombre.get(item['nombre_producto'])
+            if producto_id:
+                cantidades_vendidas_por_producto[producto_id] = (
+                    cantidades_vendidas_por_producto.get(producto_id, 0) + item['total_vendido']
+                )
 
-    precios_venta_por_producto = {producto.id: producto.precio for producto in productos}
+    # precio_compra de la última compra de cada producto (subconsulta, sin una consulta por producto)
+    ultima_compra = (
+        Compra.objects
+        .filter(producto_id=OuterRef('pk'))
+        .order_by('-fecha_compra', '-id')
+        .values('precio_compra')[:1]
+    )
+    productos = productos.annotate(ultimo_costo=Subquery(ultima_compra))
+
+    costos_por_producto = {}
+    precios_venta_por_producto = {}
+    total_stock = 0
+    for producto in productos:
+        precios_venta_por_producto[producto.id] = producto.precio
+        total_stock += producto.stock
+        if producto.ultimo_costo is not None:
+            costos_por_producto[producto.id] = producto.ultimo_costo
 
     ganancias_por_producto = {
         producto_id: precios_venta_por_producto.get(producto_id, 0) - costos_por_producto.get(producto_id, 0)
@@ -1692,9 +1641,6 @@ def balance_total(request):
     # Calcular el total general de la caja
     total_caja = sum(total_caja_por_producto.values())
 
-    # Calcular el total del stock
-    total_stock = productos.aggregate(total_stock=Sum('stock'))['total_stock'] or 0
-
     return render(request, 'CarritoApp/balance_total.html', {
         'productos': productos,
         'total_stock': total_stock,
@@ -1751,9 +1697,7 @@ def modificar_stock(request, pk):
 from django.shortcuts import render
 from django.db.models import Sum
 from django.db.models.functions import Coalesce
-from .models import Compra, Factura
-import json
-from collections import defaultdict
+from .models import Compra, FacturaProducto
 
 def modificacion_stock(request):
 
@@ -1769,24 +1713,13 @@ def modificacion_stock(request):
         for item in stock_qs
     }
 
-    # 2️⃣ PRODUCTOS VENDIDOS (MISMA LÓGICA QUE YA USÁS)
-    vendidos_dict = defaultdict(int)
-
-    facturas = Factura.objects.all()
-
-    for factura in facturas:
-        try:
-            detalle = factura.detalle_productos
-            if isinstance(detalle, str):
-                detalle = json.loads(detalle)
-
-            for prod in detalle:
-                nombre = prod.get('nombre_producto')
-                cantidad = prod.get('cantidad_vendida', 0)
-                vendidos_dict[nombre] += cantidad
-
-        except Exception:
-            continue
+    # 2️⃣ PRODUCTOS VENDIDOS (GROUP BY sobre las líneas de factura)
+    vendidos_dict = {
+        item['nombre_producto']: item['cantidad_vendida']
+        for item in FacturaProducto.objects
+        .values('nombre_producto')
+        .annotate(cantidad_vendida=Coalesce(Sum('cantidad'), 0))
+    }
 
     # 3️⃣ ARMAMOS LA TABLA FINAL
     productos = []
@@ -1834,23 +1767,19 @@ def movimiento_cliente(request):
 
 # ------------------- productos_vendidos ------------------- #
 from django.shortcuts import render
-from .models import Factura
-import json
-from collections import defaultdict
-from decimal import Decimal, InvalidOperation
-from datetime import datetime, time
+from django.db.models import Sum, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from .models import FacturaProducto
+from decimal import Decimal
+from datetime import datetime
 
 
 def productos_vendidos(request):
-    productos_vendidos = []
-
     # Filtros
     nombre_producto = (request.GET.get('nombre_producto') or '').strip()
     fecha_desde_str = (request.GET.get('fecha_desde') or '').strip()
     fecha_hasta_str = (request.GET.get('fecha_hasta') or '').strip()
 
-    facturas = Factura.objects.all().order_by('-fecha')
-
     # --- Parse fechas (YYYY-MM-DD) ---
     fecha_desde = None
     fecha_hasta = None
@@ -1866,88 +1795,43 @@ def productos_vendidos(request):
     except ValueError:
         fecha_hasta = None
 
-    # ✅ Filtro por fecha robusto (DateField o DateTimeField)
-    campo_fecha = Factura._meta.get_field("fecha")
-    internal = campo_fecha.get_internal_type()  # "DateField" o "DateTimeField"
-
-    if internal == "DateTimeField":
-        if fecha_desde:
-            facturas = facturas.filter(fecha__gte=datetime.combine(fecha_desde, time.min))
-        if fecha_hasta:
-            facturas = facturas.filter(fecha__lte=datetime.combine(fecha_hasta, time.max))
-    else:
-        # DateField (o cualquier otro tipo date)
-        if fecha_desde:
-            facturas = facturas.filter(fecha__gte=fecha_desde)
-        if fecha_hasta:
-            facturas = facturas.filter(fecha__lte=fecha_hasta)
-
-    # Totales generales
-    total_cantidad_vendida = 0
-    total_precio_unitario = Decimal("0")
-    total_general = Decimal("0")  # suma de la tabla principal
-
-    # Inventario acumulado
-    inventario = defaultdict(lambda: {
-        'nombre_producto': '',
-        'cantidad_total': 0,
-        'total_vendido': Decimal("0"),
-    })
-
-    for factura in facturas:
-        try:
-            detalle_productos = json.loads(factura.detalle_productos or "[]")
-        except json.JSONDecodeError:
-            print(f"❌ Error al decodificar JSON en factura {factura.id}")
-            continue
-
-        for detalle in detalle_productos:
-            nombre = (detalle.get('nombre_producto') or '').strip()
-
-            # 🔍 filtro por nombre (si viene vacío, no filtra)
-            if nombre_producto and (nombre_producto.lower() not in nombre.lower()):
-                continue
-
-            # cantidad
-            try:
-                cantidad_vendida = int(detalle.get('cantidad_vendida', 0) or 0)
-            except (ValueError, TypeError):
-                cantidad_vendida = 0
-
-            # precio unitario (Decimal seguro)
-            try:
-                precio_unitario = Decimal(str(detalle.get('precio_unitario', 0) or 0))
-            except (InvalidOperation, ValueError, TypeError):
-                precio_unitario = Decimal("0")
-
-            total = Decimal(cantidad_vendida) * precio_unitario
-
-            productos_vendidos.append({
-                'fecha': factura.fecha,
-                'nombre_producto': nombre,
-                'cantidad_vendida': cantidad_vendida,
-                'precio_unitario': precio_unitario,
-                'total': total,
-            })
+    # ✅ Todo sale de las líneas de factura (una fila por producto vendido)
+    lineas = FacturaProducto.objects.all()
+    if fecha_desde:
+        lineas = lineas.filter(fecha__gte=fecha_desde)
+    if fecha_hasta:
+        lineas = lineas.filter(fecha__lte=fecha_hasta)
+    if nombre_producto:
+        lineas = lineas.filter(nombre_producto__icontains=nombre_producto)
 
-            total_cantidad_vendida += cantidad_vendida
-            total_precio_unitario += precio_unitario
-            total_general += total
+    importe = ExpressionWrapper(
+        F('cantidad') * F('precio_unitario'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
 
-            inventario[nombre]['nombre_producto'] = nombre
-            inventario[nombre]['cantidad_total'] += cantidad_vendida
-            inventario[nombre]['total_vendido'] += total
+    productos_vendidos = (
+        lineas
+        .annotate(cantidad_vendida=F('cantidad'), total=importe)
+        .order_by('-fecha', '-factura_id', 'id')
+        .values('fecha', 'nombre_producto', 'cantidad_vendida', 'precio_unitario', 'total')
+    )
 
-    # Orden por fecha desc
-    productos_vendidos.sort(key=lambda x: x['fecha'], reverse=True)
+    # Totales generales (una sola consulta agregada)
+    totales = lineas.aggregate(
+        total_cantidad_vendida=Coalesce(Sum('cantidad'), 0),
+        total_precio_unitario=Sum('precio_unitario'),
+        total_general=Sum(importe),
+    )
 
-    inventario_resumen = sorted(
-        inventario.values(),
-        key=lambda x: (x['nombre_producto'] or '').lower()
+    # Inventario acumulado por producto (GROUP BY nombre)
+    inventario_resumen = (
+        lineas
+        .values('nombre_producto')
+        .annotate(cantidad_total=Sum('cantidad'), total_vendido=Sum(importe))
+        .order_by('nombre_producto')
     )
 
-    # ✅ suma de la columna item.total_vendido (tu tabla resumen)
-    inventario_total_general = sum(item['total_vendido'] for item in inventario_resumen)
+    total_general = totales['total_general'] or Decimal("0")
 
     return render(request, 'CarritoApp/productos_vendidos.html', {
         'productos_vendidos': productos_vendidos,
@@ -1957,11 +1841,12 @@ def productos_vendidos(request):
         'fecha_desde': fecha_desde_str,
         'fecha_hasta': fecha_hasta_str,
 
-        'total_cantidad_vendida': total_cantidad_vendida,
-        'total_precio_unitario': total_precio_unitario,
+        'total_cantidad_vendida': totales['total_cantidad_vendida'],
+        'total_precio_unitario': totales['total_precio_unitario'] or Decimal("0"),
         'total_general': total_general,
 
-        'inventario_total_general': inventario_total_general,
+        # ✅ suma de la columna item.total_vendido (tabla resumen) = total de la tabla principal
+        'inventario_total_general': total_general,
     })
 
 #-----------------------------------------------------------------------------
@@ -2014,8 +1899,10 @@ from django.http import HttpResponse
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from apps.CarritoApp.models import Factura, CuentaCorriente
-from django.db.models import Sum
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
 from datetime import datetime
+from .resumen_caja import totales_caja
 
 def imprimir_caja(request):
     dni_cliente = request.GET.get('dni_cliente', '').strip()
@@ -2023,50 +1910,57 @@ def imprimir_caja(request):
     fecha_hasta = request.GET.get('fecha_hasta')
     metodo_pago = request.GET.get('metodo_pago', '').strip()
 
-    facturas = Factura.objects.all()
-
-    if dni_cliente:
-        facturas = facturas.filter(dni_cliente=dni_cliente)
-
-    if fecha_desde and fecha_hasta:
-        try:
-            fecha_inicio = datetime.strptime(fecha_desde, "%Y-%m-%d")
-            fecha_fin = datetime.strptime(fecha_hasta, "%Y-%m-%d")
-            facturas = facturas.filter(fecha__range=[fecha_inicio, fecha_fin])
-        except ValueError:
-            pass
-
-    if metodo_pago:
-        facturas = facturas.filter(metodo_pago=metodo_pago)
-
-    facturas = facturas.order_by('-fecha')  # ✅ Acá aplicás el orden solo una vez
-
-    pagos_cta_corriente = CuentaCorriente.objects.filter(factura__in=facturas)
-
-
-    # 🔄 Solo mostrar pagos de las facturas filtradas
-    pagos_cta_corriente = pagos_cta_corriente.filter(factura__in=facturas)
-
-    # Totales
-    total_con_interes = facturas.aggregate(Sum('total_con_interes'))['total_con_interes__sum'] or 0
-
-
-    totales_por_vendedor = (
-        facturas.values('vendedor')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('vendedor')
-    )
-
-    totales_por_metodo = (
-        facturas.values('metodo_pago')
-        .annotate(total=Sum('total_con_interes'))
-        .order_by('metodo_pago')
-    )
-    total_en_caja = sum(item['total'] for item in totales_por_metodo if item['metodo_pago'] != 'Cuenta Corriente')
-
-    total_cta_corriente_cobrado = pagos_cta_corriente.aggregate(
-        total=Sum('imp_cuota_pagadas') + Sum('entrega_cta')
-    )['total'] or 0
+    try:
+        if fecha_desde:
+            datetime.strptime(fecha_desde, "%Y-%m-%d")
+        if fecha_hasta:
+            datetime.strptime(fecha_hasta, "%Y-%m-%d")
+    except ValueError:
+        fecha_desde = fecha_hasta = None
+
+    if not dni_cliente:
+        # ✅ Sin filtro de cliente: todo sale del resumen diario
+        totales = totales_caja(fecha_desde, fecha_hasta, metodo_pago=metodo_pago)
+        totales_por_vendedor = [
+            {'vendedor': item['vendedor_normalizado'], 'total': item['total']}
+            for item in totales['totales_por_vendedor']
+        ]
+        totales_por_metodo = [
+            {'metodo_pago': item['metodo_nombre'], 'total': item['total']}
+            for item in totales['resumen_metodos']
+        ]
+        total_en_caja = totales['total_en_caja']
+        total_cta_corriente_cobrado = totales['cobro_cta_corriente']
+    else:
+        # El resumen no guarda clientes: con DNI se calcula sobre sus facturas
+        facturas = Factura.objects.filter(dni_cliente=dni_cliente)
+        if fecha_desde:
+            facturas = facturas.filter(fecha__gte=fecha_desde)
+        if fecha_hasta:
+            facturas = facturas.filter(fecha__lte=fecha_hasta)
+        if metodo_pago:
+            facturas = facturas.filter(metodo_pago__tarjeta_nombre=metodo_pago)
+
+        metodo_nombre = Coalesce('metodo_pago__tarjeta_nombre', 'metodo_pago_manual', Value('Sin especificar'))
+        totales_por_vendedor = list(
+            facturas.values('vendedor')
+            .annotate(total=Sum('total_con_interes'))
+            .order_by('vendedor')
+        )
+        totales_por_metodo = list(
+            facturas.annotate(metodo_nombre=metodo_nombre)
+            .values('metodo_nombre')
+            .annotate(total=Sum('total_con_interes'))
+            .order_by('metodo_nombre')
+        )
+        totales_por_metodo = [{'metodo_pago': item['metodo_nombre'], 'total': item['total']} for item in totales_por_metodo]
+        total_en_caja = sum(
+            item['total'] or 0 for item in totales_por_metodo
+            if (item['metodo_pago'] or '').strip().lower() != 'cuenta corriente'
+        )
+        total_cta_corriente_cobrado = CuentaCorriente.objects.filter(factura__in=facturas).aggregate(
+            total=Sum('imp_cuota_pagadas') + Sum('entrega_cta')
+        )['total'] or 0
 
     total_general = total_en_caja + total_cta_corriente_cobrado
 
@@ -2099,7 +1993,7 @@ def imprimir_caja(request):
     y -= 20
     p.setFont("Helvetica", 10)
     for item in totales_por_metodo:
-        nota = " (No en caja)" if item['metodo_pago'] == "Cuenta Corriente" else ""
+        nota = " (No en caja)" if (item['metodo_pago'] or '').strip().lower() == "cuenta corriente" else ""
         p.drawString(60, y, f"{item['metodo_pago']}: ${item['total']:.2f}{nota}")
         y -= 15
 
@@ -2131,7 +2025,10 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 
+from django.urls import reverse
 from .models import Factura
+from .pdf_cache import ruta_pdf, url_pdf
+from .trabajos import encolar, url_resultado
 
 
 def _money(v):
@@ -2194,15 +2091,36 @@ def _wrap_text(pdf, text, max_width, font_name="Helvetica", font_size=10):
 
 
 def vista_resumen_factura(request, factura_id):
-    factura = get_object_or_404(Factura, id=factura_id)
+    factura = get_object_or_404(Factura.objects.select_related("metodo_pago"), id=factura_id)
+
+    # PDF desde el cache (la URL lleva la huella). Si la factura cambió o es nueva,
+    # se encola y la página consulta el estado hasta que esté listo.
+    ruta, huella = ruta_pdf(factura, "resumen")
+    pdf_url = None
+    estado_pdf_url = None
+    if os.path.exists(ruta):
+        pdf_url = request.build_absolute_uri(url_pdf(ruta))
+    else:
+        trabajo = encolar("factura_pdf", factura=factura, clave=f"factura_pdf:resumen:{factura.id}:{huella}")
+        if trabajo.estado == "listo":  # sin worker (TRABAJOS_EN_SEGUNDO_PLANO = False)
+            pdf_url = request.build_absolute_uri(url_resultado(trabajo))
+        else:
+            estado_pdf_url = reverse("CarritoApp:estado_trabajo", args=[trabajo.uuid])
 
-    # Carpeta PDF
-    ruta_carpeta = os.path.join(settings.MEDIA_ROOT, "facturas")
-    os.makedirs(ruta_carpeta, exist_ok=True)
+    try:
+        productos = json.loads(factura.detalle_productos or "[]")
+    except json.JSONDecodeError:
+        productos = []
 
-    nombre_pdf = f"factura_{factura.id}.pdf"
-    ruta_pdf = os.path.join(ruta_carpeta, nombre_pdf)
+    return render(request, "detalle_factura.html", {
+        "factura": factura,
+        "detalle_productos": productos,
+        "pdf_url": pdf_url,
+        "estado_pdf_url": estado_pdf_url,
+    })
 
+
+def _dibujar_resumen_factura(factura, ruta_pdf):
     # Productos desde JSON
     try:
         productos = json.loads(factura.detalle_productos or "[]")
@@ -2439,14 +2357,6 @@ def vista_resumen_factura(request, factura_id):
 
     pdf.save()
 
-    pdf_url = request.build_absolute_uri(f"{settings.MEDIA_URL}facturas/{nombre_pdf}")
-
-    return render(request, "detalle_factura.html", {
-        "factura": factura,
-        "detalle_productos": productos,
-        "pdf_url": pdf_url,
-    })
-
 
 
 
@@ -2460,6 +2370,8 @@ import mercadopago
 from django.conf import settings
 from django.shortcuts import render, redirect
 from .models import Producto
+from .Carrito import Carrito
+from prueba1.sesiones import persistir
 
 def guardar_factura(request):
     if request.method == 'POST':
@@ -2468,7 +2380,7 @@ def guardar_factura(request):
         if metodo_pago != "Mercado Pago":
             return redirect("CarritoApp:tienda")
 
-        carrito = request.session.get('carrito', {})
+        carrito = Carrito(request).como_dict()
         total = 0
         detalle_productos = []
 
@@ -2492,7 +2404,8 @@ def guardar_factura(request):
                 "error": "El total de la compra debe ser mayor a 0."
             })
 
-        # Guardar datos temporales en sesión
+        # Guardar datos temporales en sesión (en la base: no se pueden perder si vence el cache)
+        persistir(request.session)
         request.session['factura_datos'] = {
             "metodo_pago": metodo_pago,
             "total": total,
@@ -2554,7 +2467,8 @@ import requests
 from datetime import date
 from django.shortcuts import render, redirect
 from django.conf import settings
-from .models import Producto, Factura
+from .models import Producto, Factura, mapa_productos_por_nombre, generar_numero_factura
+from .stock import descontar_stock
 
 def pago_exitoso(request):
     # 📦 Recuperar datos de sesión y pago
@@ -2570,7 +2484,8 @@ def pago_exitoso(request):
     try:
         response = requests.get(
             f"https://api.mercadopago.com/v1/payments/{payment_id}",
-            headers={"Authorization": f"Bearer {settings.MERCADOPAGO_ACCESS_TOKEN}"}
+            headers={"Authorization": f"Bearer {settings.MERCADOPAGO_ACCESS_TOKEN}"},
+            timeout=getattr(settings, "MP_API_TIMEOUT", 10),
         )
         status = response.json().get("status", "")
 
@@ -2591,6 +2506,7 @@ def pago_exitoso(request):
     # 🧾 Crear factura y descontar stock
     try:
         factura = Factura.objects.create(
+            numero_factura=generar_numero_factura(),
             fecha=date.today(),
             dni_cliente=datos["dni"],
             nombre_cliente=datos["nombre"],
@@ -2601,14 +2517,12 @@ def pago_exitoso(request):
             vendedor="Carrito Web",
             detalle_productos=json.dumps(datos["detalle"])
         )
-        factura.numero_factura = str(factura.id).zfill(5)
-        factura.save()
 
-        for item in datos["detalle"]:
-            producto = Producto.objects.filter(nombre_producto=item["nombre_producto"]).first()
-            if producto:
-                producto.stock -= item["cantidad_vendida"]
-                producto.save()
+        ids_por_nombre = mapa_productos_por_nombre(item["nombre_producto"] for item in datos["detalle"])
+        descontar_stock(
+            [(ids_por_nombre.get(item["nombre_producto"]), item["cantidad_vendida"]) for item in datos["detalle"]],
+            permitir_faltantes=True,
+        )
 
     except Exception as e:
         return render(request, "CarritoApp/error_mercadopago.html", {
@@ -2616,15 +2530,17 @@ def pago_exitoso(request):
         })
 
     # 🧹 Limpiar carrito y redirigir
-    request.session["carrito"] = {}
-    request.session.modified = True
+    Carrito(request).limpiar()
 
     return redirect("CarritoApp:detalle_factura", factura_id=factura.id)
 
 
 #---------------------Guardar factura efectivo  Carrito--------------------------#
 #-------------------------------------------------------------------------------
-from apps.CarritoApp.models import TipoPago  # Asegurate de importarlo si no está
+from django.db import transaction
+from apps.CarritoApp.models import TipoPago, FacturaProducto, generar_numero_factura  # Asegurate de importarlo si no está
+from .stock import descontar_stock, StockInsuficiente
+from .Carrito import Carrito
 
 def guardar_efectivo(request): 
     if request.method == 'POST':
@@ -2658,62 +2574,57 @@ def guardar_efectivo(request):
             nombre_cliente = "Desconocido"
             apellido_cliente = "Usuario"
 
-        carrito = request.session.get('carrito', {})
+        carrito_compra = Carrito(request)
+        carrito = carrito_compra.como_dict()
         total = 0
         detalle_productos = []
-        errores_stock = []
 
+        productos = Producto.objects.in_bulk([value['producto_id'] for value in carrito.values()])
         for key, value in carrito.items():
-            try:
-                producto = Producto.objects.get(id=value['producto_id'])
-                cantidad = value['cantidad']
-                precio_unitario = float(producto.precio)
-                subtotal = precio_unitario * cantidad
-                total += subtotal
-
-                if producto.stock >= cantidad:
-                    detalle_productos.append({
-                        'nombre_producto': producto.nombre_producto,
-                        'cantidad_vendida': cantidad,
-                        'precio_unitario': precio_unitario,
-                        'subtotal': subtotal,
-                    })
-                    producto.stock -= cantidad
-                    producto.save()
-                else:
-                    errores_stock.append({
-                        'nombre_producto': producto.nombre_producto,
-                        'stock_disponible': producto.stock,
-                        'cantidad_solicitada': cantidad
-                    })
-            except Producto.DoesNotExist:
+            producto = productos.get(value['producto_id'])
+            if producto is None:
                 continue
+            cantidad = value['cantidad']
+            precio_unitario = float(producto.precio)
+            subtotal = precio_unitario * cantidad
+            total += subtotal
+            detalle_productos.append({
+                'producto_id': producto.id,
+                'nombre_producto': producto.nombre_producto,
+                'cantidad_vendida': cantidad,
+                'precio_unitario': precio_unitario,
+                'subtotal': subtotal,
+            })
 
-        if errores_stock:
-            return render(request, 'CarritoApp/error_stock.html', {'errores_stock': errores_stock})
-
-        # Crear la factura
-        nueva_factura = Factura.objects.create(
-            fecha=date.today(),
-            dni_cliente=dni_cliente,
-            nombre_cliente=nombre_cliente,
-            apellido_cliente=apellido_cliente,
-            metodo_pago=None,  # FK vacío
-            metodo_pago_manual=metodo_pago_manual,
-            total=total,
-            total_con_interes=total,
-            vendedor="Carrito Web",
-            numero_tiket=numero_tiket,
-            detalle_productos=json.dumps(detalle_productos)
-        )
-        nueva_factura.numero_factura = str(nueva_factura.id).zfill(5)
-        nueva_factura.save()
+        # Descontar stock + crear la factura en la misma transacción. El número de factura va
+        # primero en todos los caminos (mismo orden de bloqueo que pagos_mp.facturar)
+        try:
+            with transaction.atomic():
+                numero_factura = generar_numero_factura()
+                descontar_stock((d['producto_id'], d['cantidad_vendida']) for d in detalle_productos)
+
+                nueva_factura = Factura.objects.create(
+                    numero_factura=numero_factura,
+                    fecha=date.today(),
+                    dni_cliente=dni_cliente,
+                    nombre_cliente=nombre_cliente,
+                    apellido_cliente=apellido_cliente,
+                    metodo_pago=None,  # FK vacío
+                    metodo_pago_manual=metodo_pago_manual,
+                    total=total,
+                    total_con_interes=total,
+                    vendedor="Carrito Web",
+                    numero_tiket=numero_tiket,
+                    detalle_productos=json.dumps(detalle_productos)
+                )
+                FacturaProducto.crear_desde_detalle(nueva_factura, detalle_productos)
+        except StockInsuficiente as e:
+            return render(request, 'CarritoApp/error_stock.html', {'errores_stock': e.faltantes})
 
         print("✅ Factura creada:", nueva_factura.numero_factura)
 
         # Limpiar carrito
-        request.session['carrito'] = {}
-        request.session.modified = True
+        carrito_compra.limpiar()
 
         return redirect('CarritoApp:vista_resumen_factura', factura_id=nueva_factura.id)
 
@@ -2788,7 +2699,7 @@ def actualizar_estado_entrega(request, factura_id):
 #---------------lista_cuenta_corriente-------------------------------------#
 from django.shortcuts import render
 from apps.CarritoApp.models import Factura
-from django.db.models import Q
+from django.db.models import Q, Sum, Count
 from decimal import Decimal
 
 def lista_cuenta_corriente(request):
@@ -2812,27 +2723,18 @@ def lista_cuenta_corriente(request):
     if fecha_hasta:
         facturas = facturas.filter(fecha__lte=fecha_hasta)
 
-    # ✅ TOTALES ABAJO (Pagado / Pendiente)
-    total_pagado = Decimal("0")
-    total_pendiente = Decimal("0")
-    cant_pagadas = 0
-    cant_pendientes = 0
-
-    for f in facturas:
-        monto = f.total_con_interes if f.total_con_interes is not None else 0
-        try:
-            monto = Decimal(str(monto))
-        except:
-            monto = Decimal("0")
-
-        if (f.estado_credito or "").strip().lower() == "pagado":
-            total_pagado += monto
-            cant_pagadas += 1
-        else:
-            total_pendiente += monto
-            cant_pendientes += 1
+    # ✅ TOTALES ABAJO (Pagado / Pendiente) — una sola consulta sobre la columna saldo
+    totales = facturas.aggregate(
+        total_pagado=Sum('total_con_interes', filter=Q(saldo__lte=0)),
+        total_pendiente=Sum('total_con_interes', filter=Q(saldo__gt=0)),
+        cant_pagadas=Count('id', filter=Q(saldo__lte=0)),
+        cant_pendientes=Count('id', filter=Q(saldo__gt=0)),
+    )
+    total_pagado = totales['total_pagado'] or Decimal("0")
+    total_pendiente = totales['total_pendiente'] or Decimal("0")
+    cant_pagadas = totales['cant_pagadas']
+    cant_pendientes = totales['cant_pendientes']
 
-    # ✅ ACÁ VA ESTO (DESPUÉS DEL FOR Y ANTES DEL CONTEXT)
     total_general_cc = total_pagado + total_pendiente
     cant_total = cant_pagadas + cant_pendientes
 
@@ -2886,7 +2788,7 @@ from django.views.decorators.csrf import csrf_exempt
 sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
 
 def _carrito_a_items_mp(carrito):
-    """Convierte el carrito de sesión en items para MP (o en 1 ítem totalizado)."""
+    """Convierte el carrito (Carrito.como_dict) en items para MP (o en 1 ítem totalizado)."""
     items = []
     for it in carrito.values():
         items.append({
@@ -2913,10 +2815,15 @@ def _notification_url(request):
 
 from datetime import date, datetime
 from django.shortcuts import redirect
+from .Carrito import Carrito
+from prueba1.sesiones import persistir
+import uuid
+from . import pagos_mp, reservas
+from .stock import StockInsuficiente
 
 def mp_checkout(request):
     # Debe haber carrito
-    carrito = request.session.get("carrito", {})
+    carrito = Carrito(request).como_dict()
     if not carrito:
         return render(request, "CarritoApp/error_mercadopago.html", {
             "error": "No hay productos en el carrito."
@@ -2939,13 +2846,26 @@ def mp_checkout(request):
 
     total = sum(i["quantity"] * i["unit_price"] for i in items)
 
-    # Guardamos en sesión lo necesario para crear la factura al volver
+    # Referencia externa: identifica la reserva de stock y el pago en el webhook
+    external_reference = f"ORDER-{request.user.id if request.user.is_authenticated else 'anon'}-{uuid.uuid4().hex[:16]}"
+
+    # Reservar el stock mientras paga (si no alcanza, no se crea la preferencia)
+    try:
+        vence = reservas.reservar(external_reference, [(it["id"], it["quantity"]) for it in items])
+    except StockInsuficiente as e:
+        return render(request, 'CarritoApp/error_stock.html', {'errores_stock': e.faltantes})
+
+    # Guardamos lo necesario para crear la factura: en CheckoutMP (la usa el webhook aunque el
+    # comprador no vuelva) y en la sesión (sesión en la base, ver prueba1/sesiones.py)
+    persistir(request.session)
     request.session["factura_datos"] = {
+        "referencia": external_reference,
         "dni": dni,
         "nombre": nombre,
         "apellido": apellido,
         "total": total,
         "detalle": [{
+            "producto_id": it["id"],
             "nombre_producto": it["title"],
             "cantidad_vendida": it["quantity"],
             "precio_unitario": it["unit_price"],
@@ -2953,10 +2873,7 @@ def mp_checkout(request):
         } for it in items]
     }
     request.session.modified = True
-
-
-    # Referencia externa para matchear en webhook (opcional)
-    external_reference = f"ORDER-{request.user.id if request.user.is_authenticated else 'anon'}-{int(time.time())}"
+    pagos_mp.guardar_checkout(external_reference, request.session["factura_datos"])
 
     preference_data = {
         "items": items,
@@ -2971,125 +2888,113 @@ def mp_checkout(request):
         "auto_return": "approved",
         "notification_url": _notification_url(request),  # webhook
         "statement_descriptor": "TU TIENDA",
+        # La preferencia deja de aceptar pagos cuando vence la reserva
+        "expires": True,
+        "expiration_date_to": vence.isoformat(timespec="milliseconds"),
     }
 
     try:
         pref = sdk.preference().create(preference_data)
         init_point = pref["response"].get("init_point")
         if not init_point:
+            reservas.liberar(external_reference)
             return render(request, "CarritoApp/error_mercadopago.html", {
                 "error": "Mercado Pago no devolvió init_point.",
                 "detalle": json.dumps(pref, indent=2, ensure_ascii=False)
             })
         return redirect(init_point)
     except Exception as e:
+        reservas.liberar(external_reference)
         return render(request, "CarritoApp/error_mercadopago.html", {
             "error": f"Error creando la preferencia: {e}"
         })
 
 #---------- Pago exitoso ---------------------------------
-import requests
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont  # pip install Pillow (ya lo usa Django para ImageField)
 from django.core.files.base import ContentFile
+from .models import CheckoutMP
+from . import pagos_mp, reservas
+
+
+def _dibujar_ticket_mp(factura, datos):
+    """Imagen simple de comprobante en imagen_factura (la llama el worker, ver trabajos.py)."""
+    payment_id = datos.get("payment_id")
+    monto = datos.get("monto")
+    w, h = 900, 520
+    img = Image.new("RGB", (w, h), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    # Fuentes
+    try:
+        # si no hay TTF en el server, va a usar la default
+        font_title = ImageFont.truetype("arial.ttf", 28)
+        font_body = ImageFont.truetype("arial.ttf", 22)
+    except:
+        font_title = ImageFont.load_default()
+        font_body  = ImageFont.load_default()
+
+    y = 30
+    draw.text((30, y), "Comprobante de Pago - Mercado Pago", fill=(0, 0, 0), font=font_title); y += 50
+    draw.text((30, y), f"Factura N°: {factura.numero_factura}", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), f"Referencia de pago (MP): {payment_id}", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), f"Referencia del vendedor: {datos.get('external_ref') or '-'}", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), f"Monto: ${monto:.2f}" if monto is not None else "Monto: -", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), f"Fecha aprobación: {datos.get('fecha_aprob') or '-'}", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), f"Payer email: {datos.get('payer_email') or '-'}", fill=(0,0,0), font=font_body); y += 35
+    draw.text((30, y), "Método: Mercado Pago", fill=(0,0,0), font=font_body)
+
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    buf.seek(0)
+    factura.imagen_factura.save(f"mp_ticket_{payment_id}.png", ContentFile(buf.getvalue()), save=False)
+
 
 def pago_exitoso(request):
     datos = request.session.pop("factura_datos", None)
     payment_id = request.GET.get("payment_id")
 
-    if not datos or not payment_id:
+    if not payment_id:
         return render(request, "CarritoApp/error_mercadopago.html", {
             "error": "Faltan datos del pago o de la compra."
         })
 
-    # 1) Confirmar contra MP
+    # 0) Si el webhook ya facturó este pago, no hace falta consultar a MP
+    checkout = CheckoutMP.objects.filter(payment_id=str(payment_id)).exclude(factura=None).first()
+    if checkout is not None:
+        Carrito(request).limpiar()
+        return redirect("CarritoApp:detalle_factura", factura_id=checkout.factura_id)
+
+    # 1) Confirmar contra MP (con timeout; si no responde, el webhook factura igual)
     try:
-        r = requests.get(
-            f"https://api.mercadopago.com/v1/payments/{payment_id}",
-            headers={"Authorization": f"Bearer {settings.MP_ACCESS_TOKEN}"}
-        )
-        pay = r.json()
-        status = pay.get("status", "")
-        if status != "approved":
-            return render(request, "CarritoApp/error_mercadopago.html", {
-                "error": f"El pago no fue aprobado (estado: {status})."
-            })
-    except Exception as e:
+        pay = pagos_mp.cliente().pago(payment_id)
+    except pagos_mp.ErrorMP as e:
         return render(request, "CarritoApp/error_mercadopago.html", {
-            "error": f"No se pudo verificar el pago: {e}"
+            "error": f"No se pudo verificar el pago: {e}. Si se aprobó, la factura se genera sola al recibir el aviso de Mercado Pago."
+        })
+    status = pay.get("status", "")
+    referencia = pay.get("external_reference") or (datos or {}).get("referencia")
+    if status != "approved":
+        # rechazado/cancelado: la reserva vuelve al stock; pendiente: queda hasta que venza
+        reservas.segun_estado_pago(referencia, status)
+        return render(request, "CarritoApp/error_mercadopago.html", {
+            "error": f"El pago no fue aprobado (estado: {status})."
         })
 
-    # ---- Datos útiles para el “ticket” ----
-    monto = pay.get("transaction_amount")              # 100.0
-    fecha_aprob = pay.get("date_approved", "")         # ISO
-    external_ref = pay.get("external_reference", "")   # ORDER-...
-    payer_email = (pay.get("payer") or {}).get("email", "")
-
-    # 2) Crear factura (GUARDAMOS payment_id como numero_tiket)
+    # 2) Crear la factura (una sola vez por compra, aunque el webhook llegue al mismo tiempo)
+    checkout = pagos_mp.checkout_de(referencia, datos)
+    if checkout is None:
+        return render(request, "CarritoApp/error_mercadopago.html", {
+            "error": "Faltan datos del pago o de la compra."
+        })
     try:
-        factura = Factura.objects.create(
-            fecha=date.today(),
-            dni_cliente=datos["dni"],
-            nombre_cliente=datos["nombre"],
-            apellido_cliente=datos["apellido"],
-            metodo_pago_manual="Mercado Pago",
-            total=datos["total"],
-            total_con_interes=datos["total"],
-            vendedor="Carrito Web",
-            detalle_productos=json.dumps(datos["detalle"], ensure_ascii=False),
-            numero_tiket=str(payment_id),   # ← Referencia de pago de MP
-        )
-        factura.numero_factura = str(factura.id).zfill(5)
-
-        # 3) Generar una imagen simple de comprobante y guardarla en imagen_factura
-        try:
-            w, h = 900, 520
-            img = Image.new("RGB", (w, h), (255, 255, 255))
-            draw = ImageDraw.Draw(img)
-            # Fuentes
-            try:
-                # si no hay TTF en el server, va a usar la default
-                font_title = ImageFont.truetype("arial.ttf", 28)
-                font_body = ImageFont.truetype("arial.ttf", 22)
-            except:
-                font_title = ImageFont.load_default()
-                font_body  = ImageFont.load_default()
-
-            y = 30
-            draw.text((30, y), "Comprobante de Pago - Mercado Pago", fill=(0, 0, 0), font=font_title); y += 50
-            draw.text((30, y), f"Factura N°: {factura.numero_factura}", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), f"Referencia de pago (MP): {payment_id}", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), f"Referencia del vendedor: {external_ref or '-'}", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), f"Monto: ${monto:.2f}" if monto is not None else "Monto: -", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), f"Fecha aprobación: {fecha_aprob or '-'}", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), f"Payer email: {payer_email or '-'}", fill=(0,0,0), font=font_body); y += 35
-            draw.text((30, y), "Método: Mercado Pago", fill=(0,0,0), font=font_body)
-
-            buf = BytesIO()
-            img.save(buf, format="PNG")
-            buf.seek(0)
-            factura.imagen_factura.save(f"mp_ticket_{payment_id}.png", ContentFile(buf.getvalue()), save=False)
-        except Exception as e_img:
-            # Si falla la imagen, seguimos igual con la factura
-            print("No se pudo generar imagen de ticket:", e_img)
-
-        factura.save()
-
-        # 4) Descontar stock
-        for item in datos["detalle"]:
-            prod = Producto.objects.filter(nombre_producto=item["nombre_producto"]).first()
-            if prod:
-                prod.stock = max(0, prod.stock - int(item["cantidad_vendida"]))
-                prod.save()
-
+        factura, _ = pagos_mp.facturar(checkout, pay)
     except Exception as e:
         return render(request, "CarritoApp/error_mercadopago.html", {
             "error": f"Error al guardar la factura: {e}"
         })
 
     # Limpiar carrito
-    request.session["carrito"] = {}
-    request.session.modified = True
+    Carrito(request).limpiar()
 
     return redirect("CarritoApp:detalle_factura", factura_id=factura.id)
 
@@ -3101,7 +3006,11 @@ import json
 
 @csrf_exempt
 def mp_webhook(request):
-    """Webhook de Mercado Pago (recibe notificaciones)."""
+    """
+    Webhook de Mercado Pago. Solo guarda el aviso y responde enseguida (MP reintenta si tardamos);
+    `manage.py procesar_pagos_mp` consulta el pago y factura (ver pagos_mp.py). No se confía en el
+    cuerpo: el estado del pago siempre se lee de la API.
+    """
     try:
         event_type = request.GET.get("type") or request.GET.get("topic")
         data_id = request.GET.get("data.id") or request.GET.get("id")
@@ -3116,10 +3025,9 @@ def mp_webhook(request):
             except Exception:
                 body = {}
 
-        # Log simple para verificar que llega
-        print("MP Webhook:", {"event_type": event_type, "data_id": data_id, "body": body})
-
-        # (Opcional) acá podrías consultar el pago y actualizar tu DB
+        if not data_id:  # aviso de prueba o sin recurso: 200 para que MP no lo reintente
+            return JsonResponse({"received": False})
+        pagos_mp.recibir(event_type, data_id, body)
         return JsonResponse({"received": True})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
@@ -3263,6 +3171,7 @@ from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 
 from apps.CarritoApp.models import Factura, CuentaCorriente  # <-- CuentaCorriente: el modelo de pagos
 
@@ -3287,7 +3196,10 @@ def eliminar_pago_caja(request, pago_id):
         return redirect(request.POST.get("next") or "CarritoApp:listar_facturas")
 
     pago = get_object_or_404(CuentaCorriente, id=pago_id)
-    pago.delete()
+    with transaction.atomic():
+        # el borrado recalcula total_pagado/saldo de la factura (señal) en esta transacción
+        Factura.objects.select_for_update().filter(id=pago.factura_id).first()
+        pago.delete()
 
     messages.success(request, "Pago eliminado correctamente.")
     return redirect(request.POST.get("next") or "CarritoApp:listar_facturas")
@@ -3338,7 +3250,8 @@ def imprimir_factura_desde_carrito(request):
     if request.user.username != "invitado_whatsapp":
         return redirect("CarritoApp:tienda")
 
-    carrito = request.session.get("carrito", {})
+    carrito_compra = Carrito(request)
+    carrito = carrito_compra.como_dict()
     if not carrito:
         return redirect("CarritoApp:carrito")
 
@@ -3374,8 +3287,7 @@ def imprimir_factura_desde_carrito(request):
     request.session["factura_invitado_ctx"] = context
     
      # ✅ LIMPIAR CARRITO (cuando apretó Finalizar)
-    request.session["carrito"] = {}
-    request.session.modified = True
+    carrito_compra.limpiar()
 
     return redirect("CarritoApp:presupuesto_whatsapp_pdf")
 
@@ -3398,6 +3310,8 @@ def render_to_pdf(template_src, context):
 
 
 from django.template import TemplateDoesNotExist
+from django.urls import reverse
+from .trabajos import encolar
 @login_required
 def presupuesto_whatsapp_pdf(request):
     if request.user.username != "invitado_whatsapp":
@@ -3408,15 +3322,60 @@ def presupuesto_whatsapp_pdf(request):
         return redirect("CarritoApp:carrito")
 
     try:
-        pdf_bytes = render_to_pdf("CarritoApp/factura_invitado_print.html", data)  # o tu template nuevo
+        get_template("CarritoApp/factura_invitado_print.html")  # o tu template nuevo
     except TemplateDoesNotExist as e:
         return HttpResponse(f"TEMPLATE NO ENCONTRADO: {e}", status=500)
-    except Exception as e:
-        return HttpResponse(f"ERROR PDF: {e}", status=500)
 
-    if not pdf_bytes:
-        return HttpResponse("Error generando PDF (xhtml2pdf)", status=500)
+    # El PDF lo arma el worker; esta página espera y descarga cuando está listo
+    trabajo = encolar("presupuesto_pdf", {
+        "template": "CarritoApp/factura_invitado_print.html",
+        "contexto": data,
+        "nombre_archivo": f'presupuesto_{data.get("numero_factura","INV")}.pdf',
+    }, clave=f'presupuesto_pdf:{request.session.session_key}:{data.get("numero_factura","INV")}')
+
+    # Solo esta sesión puede descargarlo (el usuario invitado es compartido)
+    propios = request.session.get("trabajos_render", [])
+    if str(trabajo.uuid) not in propios:
+        request.session["trabajos_render"] = (propios + [str(trabajo.uuid)])[-20:]
+
+    return render(request, "CarritoApp/trabajo_espera.html", {
+        "titulo": "Generando presupuesto",
+        "estado_url": reverse("CarritoApp:estado_trabajo", args=[trabajo.uuid]),
+        "volver_url": reverse("CarritoApp:tienda"),
+    })
 
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="presupuesto_{data.get("numero_factura","INV")}.pdf"'
-    return response
+
+#---------------- Estado / descarga de trabajos en segundo plano -----------------------
+from django.http import JsonResponse, FileResponse, Http404
+from django.core.files.storage import default_storage
+from django.shortcuts import get_object_or_404
+from .models import TrabajoRender
+from .trabajos import url_resultado
+
+
+def _trabajo_visible(request, trabajo):
+    # presupuestos: solo la sesión que lo pidió; PDFs/tickets de factura: igual que la factura
+    if trabajo.tipo == "presupuesto_pdf":
+        return str(trabajo.uuid) in request.session.get("trabajos_render", [])
+    return True
+
+
+def estado_trabajo(request, trabajo_uuid):
+    trabajo = get_object_or_404(TrabajoRender, uuid=trabajo_uuid)
+    if not _trabajo_visible(request, trabajo):
+        raise Http404
+    return JsonResponse({
+        "estado": trabajo.estado,
+        "listo": trabajo.estado == "listo",
+        "url": url_resultado(trabajo) if trabajo.estado == "listo" else None,
+        "error": trabajo.error if trabajo.estado == "error" else None,
+    })
+
+
+def descargar_trabajo(request, trabajo_uuid):
+    trabajo = get_object_or_404(TrabajoRender, uuid=trabajo_uuid, estado="listo")
+    if not _trabajo_visible(request, trabajo) or not trabajo.archivo:
+        raise Http404
+    nombre = trabajo.parametros.get("nombre_archivo") or trabajo.archivo.rsplit("/", 1)[-1]
+    return FileResponse(default_storage.open(trabajo.archivo, "rb"), as_attachment=True,
+                        filename=nombre, content_type="application/pdf")
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class BackupConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.backup'  # Asegúrate de que el nombre coincida con la estructura del proyecto
\ No newline at end of file
+    name = 'apps.backup'  # Asegúrate de que el nombre coincida con la estructura del proyecto
+
+    def ready(self):
+        from . import respaldos  # noqa: F401  (registra el trabajo respaldo_db en la cola)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.backup import respaldos
+
+
+class Command(BaseCommand):
+    help = ('Aplica la retención de respaldos (RESPALDOS_RETENER_DIARIOS / SEMANALES / MENSUALES) '
+            'y borra los archivos que quedan afuera. Ya corre sola después de cada respaldo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo lista lo que se borraría')
+
+    def handle(self, *args, **options):
+        borrados = respaldos.podar(simular=options['simular'])
+        for respaldo in borrados:
+            self.stdout.write(f"{'Se borraría' if options['simular'] else 'Borrado'}: {respaldo.nombre}")
+        self.stdout.write(self.style.SUCCESS(f'{len(borrados)} respaldos fuera de la retención.'))
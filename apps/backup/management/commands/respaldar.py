@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from apps.backup import respaldos
+from apps.backup.models import Respaldo
+
+
+class Command(BaseCommand):
+    help = ('Respaldo para cron: la base (mysqldump) y/o media (completo o incremental según '
+            'RESPALDOS_MEDIA_COMPLETO_DIAS). Cada archivo queda en el catálogo y al final se '
+            'aplica la retención. Sin --base ni --media hace los dos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', action='store_true', help='Respalda la base de datos')
+        parser.add_argument('--media', action='store_true', help='Respalda MEDIA_ROOT')
+        parser.add_argument('--completo', action='store_true', help='Fuerza un respaldo de media completo')
+        parser.add_argument('--sin-podar', action='store_true', help='No aplica la retención al terminar')
+
+    def handle(self, *args, **options):
+        hacer_base = options['base'] or not options['media']
+        hacer_media = options['media'] or not options['base']
+
+        pendientes = []
+        if hacer_base:
+            fecha = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+            pendientes.append((Respaldo.objects.create(nombre=f'respaldo_{fecha}.sql.gz'),
+                               respaldos.ejecutar_respaldo))
+        if hacer_media:
+            pendientes.append((respaldos.nuevo_respaldo_media(completo=options['completo']),
+                               respaldos.ejecutar_respaldo_media))
+
+        fallidos = 0
+        for respaldo, ejecutar in pendientes:
+            try:
+                ejecutar(respaldo)
+            except Exception as e:
+                fallidos += 1
+                self.stderr.write(f'✘ {respaldo.nombre}: {e}')
+                continue
+            respaldo.refresh_from_db()
+            self.stdout.write(
+                f'✔ {respaldo.nombre} ({respaldo.get_tipo_display()}, {filesizeformat(respaldo.tamano)}'
+                + (f', {respaldo.archivos} archivos' if respaldo.tipo != 'db' else '')
+                + f') sha256 {respaldo.checksum}'
+            )
+
+        if not options['sin_podar']:
+            for respaldo in respaldos.podar():
+                self.stdout.write(f'Podado por retención: {respaldo.nombre}')
+
+        if fallidos:
+            raise CommandError(f'{fallidos} respaldos fallaron.')
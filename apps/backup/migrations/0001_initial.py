@@ -0,0 +1,31 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Respaldo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=10)),
+                ('bytes_leidos', models.BigIntegerField(default=0)),
+                ('bytes_estimados', models.BigIntegerField(default=0)),
+                ('tamano', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
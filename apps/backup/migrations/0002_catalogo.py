@@ -0,0 +1,65 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:15
+
+import os
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def catalogar_existentes(apps, schema_editor):
+    # Los .sql / .sql.gz / media_*.tar.gz que ya estaban en el directorio pasan al catálogo
+    # con la fecha real del archivo (los media viejos son tar completos de scripts/backup.sh)
+    Respaldo = apps.get_model('backup', 'Respaldo')
+    carpeta = getattr(settings, 'RESPALDOS_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'respaldos')
+    if not os.path.isdir(carpeta):
+        return
+    conocidos = set(Respaldo.objects.values_list('nombre', flat=True))
+    for entrada in os.scandir(carpeta):
+        if (not entrada.is_file() or entrada.name in conocidos
+                or not entrada.name.endswith(('.sql', '.sql.gz', '.tar.gz'))):
+            continue
+        info = entrada.stat()
+        fecha = datetime.fromtimestamp(info.st_mtime, tz=timezone.utc)
+        respaldo = Respaldo.objects.create(
+            nombre=entrada.name, estado='listo', tamano=info.st_size, terminado=fecha,
+            tipo='media_completo' if entrada.name.startswith('media_') else 'db',
+        )
+        Respaldo.objects.filter(pk=respaldo.pk).update(creado=fecha)  # creado es auto_now_add
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='respaldo',
+            name='archivos',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='respaldo',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='incrementales', to='backup.respaldo'),
+        ),
+        migrations.AddField(
+            model_name='respaldo',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='respaldo',
+            name='referencia',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='respaldo',
+            name='tipo',
+            field=models.CharField(choices=[('db', 'Base de datos'), ('media_completo', 'Media (completo)'), ('media_incremental', 'Media (incremental)')], default='db', max_length=20),
+        ),
+        migrations.RunPython(catalogar_existentes, migrations.RunPython.noop),
+    ]
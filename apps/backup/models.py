@@ -0,0 +1,53 @@
+from django.db import models
+
+
+#----------------- Catálogo de respaldos (base y media) ---------------------#
+class Respaldo(models.Model):
+    """
+    Un archivo de respaldo en RESPALDO_DIR. Los de la base los encola crear_respaldo y
+    `manage.py procesar_trabajos` corre mysqldump (ver respaldos.py); los de media los
+    genera `manage.py respaldar` desde cron. Un incremental de media solo trae lo que
+    cambió desde `base`, así que para restaurarlo hace falta toda la cadena hasta el completo.
+    """
+    TIPOS = [
+        ('db', 'Base de datos'),
+        ('media_completo', 'Media (completo)'),
+        ('media_incremental', 'Media (incremental)'),
+    ]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    nombre = models.CharField(max_length=255, unique=True)  # archivo dentro de RESPALDO_DIR
+    tipo = models.CharField(max_length=20, choices=TIPOS, default='db')
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    bytes_leidos = models.BigIntegerField(default=0)     # SQL (sin comprimir) ya volcado
+    bytes_estimados = models.BigIntegerField(default=0)  # tamaño de las tablas según information_schema
+    tamano = models.BigIntegerField(default=0)           # tamaño final del .gz
+    checksum = models.CharField(max_length=64, blank=True, default='')  # sha256 del archivo final
+    archivos = models.IntegerField(default=0)            # media: archivos incluidos en el .tar.gz
+    base = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True, related_name='incrementales',
+    )                                                    # media incremental: respaldo anterior de la cadena
+    referencia = models.DateTimeField(null=True, blank=True)  # media: cuándo se recorrió MEDIA_ROOT
+    error = models.TextField(blank=True, default='')
+    creado = models.DateTimeField(auto_now_add=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-creado']
+
+    def __str__(self):
+        return f"{self.nombre} ({self.estado})"
+
+    @property
+    def progreso(self):
+        """Porcentaje aproximado (el volcado SQL no mide lo mismo que data_length, se topea en 99)."""
+        if self.estado == 'listo':
+            return 100
+        if not self.bytes_estimados:
+            return 0
+        return min(99, int(self.bytes_leidos * 100 / self.bytes_estimados))
@@ -0,0 +1,326 @@
+#-------------------- Respaldo de la base en segundo plano ------------------------------------#
+# mysqldump --single-transaction --quick (no bloquea las tablas InnoDB ni arma el volcado en
+# memoria) y la salida se comprime con gzip mientras se lee. Las credenciales salen de
+# settings.DATABASES y se pasan en un archivo temporal de opciones, nunca por línea de comandos.
+#
+# Media se respalda en .tar.gz: uno completo cada RESPALDOS_MEDIA_COMPLETO_DIAS y en el medio
+# incrementales con solo lo modificado desde el respaldo anterior. Cada archivo queda en el
+# catálogo (modelo Respaldo) con tamaño, sha256 y fecha, y después de cada respaldo se aplica
+# la retención diaria / semanal / mensual (podar).
+import gzip
+import hashlib
+import io
+import os
+import subprocess
+import tarfile
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from apps.CarritoApp.trabajos import procesador
+from .models import Respaldo
+
+# Fuera de MEDIA_ROOT conviene definir RESPALDOS_DIR (MEDIA lo sirve Nginx sin login)
+RESPALDO_DIR = getattr(settings, 'RESPALDOS_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'respaldos')
+BLOQUE = 1024 * 1024                    # se lee de mysqldump de a 1 MB
+AVISO_PROGRESO = 16 * 1024 * 1024       # y se guarda el progreso cada 16 MB
+
+RETENER_DIARIOS = getattr(settings, 'RESPALDOS_RETENER_DIARIOS', 7)
+RETENER_SEMANALES = getattr(settings, 'RESPALDOS_RETENER_SEMANALES', 4)
+RETENER_MENSUALES = getattr(settings, 'RESPALDOS_RETENER_MENSUALES', 6)
+MEDIA_COMPLETO_DIAS = getattr(settings, 'RESPALDOS_MEDIA_COMPLETO_DIAS', 7)
+# Carpetas de MEDIA_ROOT que no se respaldan (se regeneran solas); RESPALDO_DIR nunca entra
+MEDIA_EXCLUIR = getattr(settings, 'RESPALDOS_MEDIA_EXCLUIR', ['respaldos', 'facturas/cache', 'trabajos'])
+# Lista de todos los archivos de media al momento del respaldo (para borrar al restaurar lo que ya no está)
+MANIFIESTO = 'MANIFIESTO_MEDIA.txt'
+
+
+class _ConHash:
+    """Envuelve el archivo de salida y va calculando el sha256 de lo que se escribe."""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.sha256 = hashlib.sha256()
+
+    def write(self, datos):
+        self.sha256.update(datos)
+        return self.archivo.write(datos)
+
+    def flush(self):
+        self.archivo.flush()
+
+
+def _bytes_estimados():
+    if connection.vendor != 'mysql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(data_length), 0) FROM information_schema.tables "
+            "WHERE table_schema = DATABASE()"
+        )
+        return int(cursor.fetchone()[0] or 0)
+
+
+def _archivo_opciones(db):
+    """Archivo [client] con permisos 600 para --defaults-extra-file."""
+    opciones = tempfile.NamedTemporaryFile('w', suffix='.cnf', delete=False)
+    os.chmod(opciones.name, 0o600)
+    opciones.write('[client]\n')
+    for clave, valor in (('user', db.get('USER')), ('password', db.get('PASSWORD')),
+                         ('host', db.get('HOST')), ('port', db.get('PORT'))):
+        if valor:
+            valor = str(valor).replace('\\', '\\\\').replace('"', '\\"')
+            opciones.write(f'{clave}="{valor}"\n')
+    opciones.close()
+    return opciones.name
+
+
+def ejecutar_respaldo(respaldo):
+    db = settings.DATABASES['default']
+    if 'mysql' not in db['ENGINE']:
+        mensaje = 'El respaldo con mysqldump requiere MySQL.'
+        Respaldo.objects.filter(pk=respaldo.pk).update(estado='error', error=mensaje, terminado=timezone.now())
+        raise RuntimeError(mensaje)
+
+    os.makedirs(RESPALDO_DIR, exist_ok=True)
+    ruta = os.path.join(RESPALDO_DIR, respaldo.nombre)
+    parcial = f'{ruta}.parcial'
+    Respaldo.objects.filter(pk=respaldo.pk).update(
+        estado='en_curso', bytes_leidos=0, bytes_estimados=_bytes_estimados(), error='',
+    )
+
+    opciones = _archivo_opciones(db)
+    leidos = 0
+    try:
+        comando = [
+            'mysqldump', f'--defaults-extra-file={opciones}',
+            '--single-transaction', '--quick', '--routines', '--triggers',
+            db['NAME'],
+        ]
+        # stderr a un temporal: si fuera un PIPE sin leer, mysqldump se podría trabar
+        with tempfile.TemporaryFile() as errores, open(parcial, 'wb') as destino:
+            comprimido = _ConHash(destino)
+            with gzip.GzipFile(fileobj=comprimido, mode='wb', compresslevel=6) as salida:
+                proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=errores)
+                ultimo_aviso = 0
+                for bloque in iter(lambda: proceso.stdout.read(BLOQUE), b''):
+                    salida.write(bloque)
+                    leidos += len(bloque)
+                    if leidos - ultimo_aviso >= AVISO_PROGRESO:
+                        Respaldo.objects.filter(pk=respaldo.pk).update(bytes_leidos=leidos)
+                        ultimo_aviso = leidos
+                proceso.wait()
+            errores.seek(0)
+            mensajes = errores.read().decode('utf-8', 'replace')
+
+        errores_limpios = "\n".join(
+            linea for linea in mensajes.splitlines()
+            if "Warning" not in linea and "Advertencia" not in linea
+        )
+        if proceso.returncode != 0:
+            raise RuntimeError(errores_limpios or f'mysqldump terminó con código {proceso.returncode}')
+
+        os.replace(parcial, ruta)
+    except Exception as e:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        Respaldo.objects.filter(pk=respaldo.pk).update(
+            estado='error', error=str(e), bytes_leidos=leidos, terminado=timezone.now(),
+        )
+        raise
+    finally:
+        os.remove(opciones)
+
+    Respaldo.objects.filter(pk=respaldo.pk).update(
+        estado='listo', bytes_leidos=leidos, tamano=os.path.getsize(ruta),
+        checksum=comprimido.sha256.hexdigest(), terminado=timezone.now(),
+    )
+    return ruta
+
+
+@procesador('respaldo_db')
+def _respaldo_db(trabajo):
+    respaldo = Respaldo.objects.get(pk=trabajo.parametros['respaldo_id'])
+    ejecutar_respaldo(respaldo)
+    podar()
+    return ''  # no se publica la ruta: se descarga por backup:descargar_respaldo
+
+
+#-------------------- Media: completo + incrementales ------------------------------------#
+def nuevo_respaldo_media(completo=False):
+    """
+    Crea el Respaldo de media que corresponde: incremental sobre el último respaldo de media,
+    o completo si se pide, si no hay ninguno o si el último completo tiene más de
+    MEDIA_COMPLETO_DIAS (así las cadenas no crecen sin fin y la retención puede podarlas).
+    """
+    media = Respaldo.objects.filter(estado='listo', tipo__startswith='media_')
+    ultimo = media.order_by('-terminado').first()
+    ultimo_completo = media.filter(tipo='media_completo').order_by('-terminado').first()
+    if (completo or ultimo is None or ultimo_completo is None
+            or ultimo_completo.terminado < timezone.now() - timedelta(days=MEDIA_COMPLETO_DIAS)):
+        tipo, base = 'media_completo', None
+    else:
+        tipo, base = 'media_incremental', ultimo
+
+    fecha = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+    return Respaldo.objects.create(nombre=f'{tipo}_{fecha}.tar.gz', tipo=tipo, base=base)
+
+
+def _archivos_media(carpeta, excluidas):
+    """(ruta, stat) de cada archivo bajo `carpeta`, salteando las carpetas excluidas."""
+    try:
+        entradas = list(os.scandir(carpeta))
+    except FileNotFoundError:
+        return
+    for entrada in entradas:
+        try:
+            if entrada.is_dir(follow_symlinks=False):
+                if os.path.normpath(entrada.path) not in excluidas:
+                    yield from _archivos_media(entrada.path, excluidas)
+            elif entrada.is_file(follow_symlinks=False):
+                yield entrada.path, entrada.stat(follow_symlinks=False)
+        except FileNotFoundError:  # borrado mientras se recorría
+            continue
+
+
+def ejecutar_respaldo_media(respaldo):
+    """
+    Arma el .tar.gz (con rutas media/...) de MEDIA_ROOT. Si es incremental solo entran los
+    archivos con mtime o ctime posterior al recorrido del respaldo base (ctime cubre los
+    archivos movidos o copiados conservando la fecha). Siempre se agrega MANIFIESTO con la
+    lista completa, para que al restaurar se puedan borrar los archivos eliminados después.
+    """
+    raiz = os.path.normpath(str(settings.MEDIA_ROOT))
+    excluidas = {os.path.normpath(os.path.join(raiz, carpeta)) for carpeta in MEDIA_EXCLUIR}
+    excluidas.add(os.path.normpath(RESPALDO_DIR))
+    desde = respaldo.base.referencia.timestamp() if respaldo.base_id else None
+
+    os.makedirs(RESPALDO_DIR, exist_ok=True)
+    ruta = os.path.join(RESPALDO_DIR, respaldo.nombre)
+    parcial = f'{ruta}.parcial'
+    referencia = timezone.now()
+    Respaldo.objects.filter(pk=respaldo.pk).update(estado='en_curso', bytes_leidos=0, error='')
+
+    leidos = incluidos = 0
+    manifiesto = []
+    try:
+        with open(parcial, 'wb') as destino:
+            comprimido = _ConHash(destino)
+            with gzip.GzipFile(fileobj=comprimido, mode='wb', compresslevel=6) as salida, \
+                    tarfile.open(fileobj=salida, mode='w|') as tar:
+                for ruta_archivo, info in _archivos_media(raiz, excluidas):
+                    relativa = os.path.join('media', os.path.relpath(ruta_archivo, raiz))
+                    manifiesto.append(relativa)
+                    if desde is not None and max(info.st_mtime, info.st_ctime) < desde:
+                        continue
+                    try:
+                        tar.add(ruta_archivo, arcname=relativa, recursive=False)
+                    except FileNotFoundError:
+                        continue
+                    leidos += info.st_size
+                    incluidos += 1
+
+                lista = ('\n'.join(manifiesto) + '\n').encode('utf-8')
+                entrada = tarfile.TarInfo(MANIFIESTO)
+                entrada.size = len(lista)
+                entrada.mtime = int(referencia.timestamp())
+                tar.addfile(entrada, io.BytesIO(lista))
+        os.replace(parcial, ruta)
+    except Exception as e:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        Respaldo.objects.filter(pk=respaldo.pk).update(
+            estado='error', error=str(e), bytes_leidos=leidos, terminado=timezone.now(),
+        )
+        raise
+
+    Respaldo.objects.filter(pk=respaldo.pk).update(
+        estado='listo', bytes_leidos=leidos, archivos=incluidos, referencia=referencia,
+        tamano=os.path.getsize(ruta), checksum=comprimido.sha256.hexdigest(), terminado=timezone.now(),
+    )
+    return ruta
+
+
+#-------------------- Retención ------------------------------------#
+def _periodo(fecha, periodo):
+    fecha = timezone.localtime(fecha)
+    if periodo == 'dia':
+        return fecha.date()
+    if periodo == 'semana':
+        return fecha.isocalendar()[:2]
+    return fecha.year, fecha.month
+
+
+def cadena(respaldo):
+    """El respaldo y todos los que dependen de él (incrementales), del más nuevo al más viejo."""
+    resultado = [respaldo]
+    pendientes = [respaldo.pk]
+    while pendientes:
+        hijos = list(Respaldo.objects.filter(base_id__in=pendientes))
+        resultado.extend(hijos)
+        pendientes = [hijo.pk for hijo in hijos]
+    return sorted(resultado, key=lambda r: (r.creado, r.pk), reverse=True)
+
+
+def _borrar_archivo(nombre):
+    try:
+        os.remove(os.path.join(RESPALDO_DIR, nombre))
+    except FileNotFoundError:
+        pass
+
+
+def podar(simular=False):
+    """
+    Aplica la retención por separado a los respaldos de la base y a los de media: se queda
+    con el último, con el más nuevo de cada uno de los últimos RETENER_DIARIOS días,
+    RETENER_SEMANALES semanas y RETENER_MENSUALES meses, y con toda la cadena (base hasta
+    el completo) de los incrementales que quedan. Borra el resto (archivo y fila) y
+    devuelve la lista de los respaldos borrados (o que se borrarían, con simular=True).
+    """
+    listos = list(Respaldo.objects.filter(estado='listo').exclude(terminado=None).order_by('-terminado', '-pk'))
+    por_id = {r.pk: r for r in listos}
+
+    conservar = set()
+    for es_db in (True, False):
+        grupo = [r for r in listos if (r.tipo == 'db') == es_db]
+        if grupo:
+            conservar.add(grupo[0].pk)
+        for periodo, cantidad in (('dia', RETENER_DIARIOS), ('semana', RETENER_SEMANALES),
+                                  ('mes', RETENER_MENSUALES)):
+            vistos = set()
+            for respaldo in grupo:
+                clave = _periodo(respaldo.terminado, periodo)
+                if clave in vistos:
+                    continue
+                if len(vistos) >= cantidad:
+                    break
+                vistos.add(clave)
+                conservar.add(respaldo.pk)
+
+    # tampoco se toca la base de un incremental que se está generando
+    en_curso = Respaldo.objects.filter(estado__in=('pendiente', 'en_curso')).exclude(base=None)
+    conservar.update(pk for pk in en_curso.values_list('base_id', flat=True) if pk in por_id)
+
+    for pk in list(conservar):
+        respaldo = por_id[pk]
+        while respaldo.base_id and respaldo.base_id in por_id:
+            conservar.add(respaldo.base_id)
+            respaldo = por_id[respaldo.base_id]
+
+    # del más nuevo al más viejo: un incremental se borra antes que su base (FK PROTECT)
+    borrar = [r for r in listos if r.pk not in conservar]
+    if simular:
+        return borrar
+    for respaldo in borrar:
+        _borrar_archivo(respaldo.nombre)
+        Respaldo.objects.filter(base=respaldo, estado='error').delete()
+        respaldo.delete()
+
+    # los fallidos no tienen archivo; se guardan solo lo que dura la retención diaria
+    Respaldo.objects.filter(
+        estado='error', terminado__lt=timezone.now() - timedelta(days=max(RETENER_DIARIOS, 1)),
+    ).delete()
+    return borrar
@@ -11,12 +11,14 @@ from .views import exportar_productos_excel
 from .views import exportar_compras_excel
 from .views import exportar_facturas_excel
 from .views import exportar_cuenta_corriente_excel 
+from .views import exportar_datos
 
 
 app_name = 'backup'  # Define el namespace
 urlpatterns = [
     path('', listar_respaldos, name='listar_respaldos'),  # Ruta principal de respaldos
     path('crear/', crear_respaldo, name='crear_respaldo'),
+    path('estado/<int:respaldo_id>/', views.estado_respaldo, name='estado_respaldo'),
     path('descargar/<str:nombre>/', descargar_respaldo, name='descargar_respaldo'),
     path('eliminar/<str:nombre>/', eliminar_respaldo, name='eliminar_respaldo'),
     path('exportar_provedores/', exportar_provedores_excel, name='exportar_provedores'),  # 👉 
@@ -25,5 +27,7 @@ urlpatterns = [
     path('exportar_compras/', exportar_compras_excel, name='exportar_compras'),
     path('exportar_facturas/', exportar_facturas_excel, name='exportar_facturas'),
     path('exportar_cuenta_corriente/', exportar_cuenta_corriente_excel, name='exportar_cuenta_corriente'),
+    # CSV / columnar para el ETL: facturas, cuenta_corriente, compras, lineas_venta
+    path('exportar/<str:conjunto>/', exportar_datos, name='exportar_datos'),
     
 ]
@@ -1,62 +1,96 @@
-
 import os
-import subprocess
+import re
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect
 from django.utils.timezone import now
-from django.http import FileResponse, HttpResponseNotFound, HttpResponse
+from django.http import FileResponse, HttpResponseNotFound, HttpResponse, JsonResponse, StreamingHttpResponse
+from apps.CarritoApp.trabajos import encolar
+from .models import Respaldo
+from .respaldos import RESPALDO_DIR, cadena
 
-# Directorio donde se guardarán los respaldos
-RESPALDO_DIR = os.path.join(settings.MEDIA_ROOT, 'respaldos')
+# Directorio donde se guardarán los respaldos (ver respaldos.py)
 os.makedirs(RESPALDO_DIR, exist_ok=True)
 
+@staff_member_required
 def crear_respaldo(request):
-    nombre_archivo = f"respaldo_{now().strftime('%Y%m%d_%H%M%S')}.sql"
-    ruta_respaldo = os.path.join(RESPALDO_DIR, nombre_archivo)
-
-    ruta_mysql_dump = "mysqldump"  # Linux: se espera que esté en el PATH
-
-    comando = [ruta_mysql_dump, "-u", "root", "-pRoot", "vete"]
-
-    try:
-        with open(ruta_respaldo, "w") as salida:
-            resultado = subprocess.run(comando, stdout=salida, stderr=subprocess.PIPE, text=True)
-
-        if resultado.returncode == 0:
-            return redirect('backup:listar_respaldos')
-
-        errores_limpios = "\n".join([
-            linea for linea in resultado.stderr.splitlines()
-            if "Advertencia" not in linea
-        ])
+    # mysqldump corre en el worker (manage.py procesar_trabajos); acá solo se encola
+    respaldo = Respaldo.objects.create(nombre=f"respaldo_{now().strftime('%Y%m%d_%H%M%S')}.sql.gz")
+    encolar('respaldo_db', {'respaldo_id': respaldo.id}, clave=f'respaldo_db:{respaldo.id}')
+    return redirect('backup:listar_respaldos')
 
-        if errores_limpios.strip() == "":
-            return redirect('backup:listar_respaldos')
 
-        return HttpResponse(f"<h3>Error al crear el respaldo.</h3><pre>{errores_limpios}</pre>")
-
-    except Exception as e:
-        return HttpResponse(f"<h3>Error inesperado:</h3><pre>{str(e)}</pre>")
+@staff_member_required
+def estado_respaldo(request, respaldo_id):
+    respaldo = Respaldo.objects.filter(id=respaldo_id).first()
+    if not respaldo:
+        return JsonResponse({'error': 'Respaldo no encontrado.'}, status=404)
+    return JsonResponse({
+        'nombre': respaldo.nombre,
+        'estado': respaldo.estado,
+        'progreso': respaldo.progreso,
+        'bytes_leidos': respaldo.bytes_leidos,
+        'error': respaldo.error,
+    })
 
 
 #------------------------------------
-import shutil
-import tempfile
+def _ruta_respaldo(nombre):
+    """Ruta dentro de RESPALDO_DIR (sin permitir ../ en el nombre)."""
+    nombre = os.path.basename(nombre)
+    ruta = os.path.join(RESPALDO_DIR, nombre)
+    return ruta if nombre and os.path.isfile(ruta) else None
 
-def descargar_respaldo(request, nombre):
-    """Permite descargar un respaldo SIN BLOQUEAR el archivo original"""
-    ruta_original = os.path.join(RESPALDO_DIR, nombre)
 
-    if os.path.exists(ruta_original):
-        # Crear una copia temporal
-        temp_dir = tempfile.gettempdir()
-        copia_temporal = os.path.join(temp_dir, f"copia_{nombre}")
-        shutil.copy2(ruta_original, copia_temporal)
+def _leer_rango(ruta, inicio, cantidad, bloque=1024 * 1024):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while cantidad > 0:
+            datos = archivo.read(min(bloque, cantidad))
+            if not datos:
+                break
+            cantidad -= len(datos)
+            yield datos
 
-        archivo = open(copia_temporal, 'rb')
-        return FileResponse(archivo, as_attachment=True, filename=nombre)
 
-    return HttpResponseNotFound("Archivo no encontrado.")
+def descargar_respaldo(request, nombre):
+    """Sirve el respaldo directo del disco (sin copia temporal), con soporte de Range."""
+    ruta = _ruta_respaldo(nombre)
+    if not ruta:
+        return HttpResponseNotFound("Archivo no encontrado.")
+    nombre = os.path.basename(ruta)
+
+    # Con Nginx: RESPALDOS_X_ACCEL_PREFIX = "/interno/respaldos/" y Nginx hace sendfile + Range
+    prefijo = getattr(settings, 'RESPALDOS_X_ACCEL_PREFIX', '')
+    if prefijo:
+        response = HttpResponse(content_type='application/octet-stream')
+        response['X-Accel-Redirect'] = f"{prefijo.rstrip('/')}/{nombre}"
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+    tamano = os.path.getsize(ruta)
+    rango = re.fullmatch(r'bytes=(\d*)-(\d*)', request.headers.get('Range', '').strip())
+    if rango and (rango[1] or rango[2]):
+        if rango[1]:
+            inicio = int(rango[1])
+            fin = min(int(rango[2]), tamano - 1) if rango[2] else tamano - 1
+        else:  # bytes=-N: los últimos N
+            inicio = max(0, tamano - int(rango[2]))
+            fin = tamano - 1
+        if inicio > fin:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamano}'
+            return response
+        response = StreamingHttpResponse(_leer_rango(ruta, inicio, fin - inicio + 1),
+                                         status=206, content_type='application/octet-stream')
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = str(fin - inicio + 1)
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    else:
+        # FileResponse usa wsgi.file_wrapper (sendfile en gunicorn)
+        response = FileResponse(open(ruta, 'rb'), as_attachment=True, filename=nombre)
+    response['Accept-Ranges'] = 'bytes'
+    return response
 
 
 #--------------------------------------# Eliminar respaldo
@@ -64,13 +98,12 @@ def descargar_respaldo(request, nombre):
 import threading
 import time
 
-import threading
-import time
-import os
-
 def eliminar_respaldo(request, nombre):
-    """Elimina el respaldo con más intentos para asegurar eliminación en Windows"""
-    ruta = os.path.join(RESPALDO_DIR, nombre)
+    """
+    Elimina el respaldo con más intentos para asegurar eliminación en Windows.
+    Si es de media, se van también los incrementales que dependen de él (sin la base no sirven).
+    """
+    nombre = os.path.basename(nombre)
 
     def intentar_eliminar(path):
         max_intentos = 15
@@ -88,33 +121,33 @@ def eliminar_respaldo(request, nombre):
         else:
             print(f"❌ No se pudo eliminar el archivo tras {max_intentos} intentos: {path}")
 
-    if os.path.exists(ruta):
-        threading.Thread(target=intentar_eliminar, args=(ruta,)).start()
+    respaldo = Respaldo.objects.filter(nombre=nombre).exclude(estado__in=('pendiente', 'en_curso')).first()
+    respaldos = cadena(respaldo) if respaldo else []  # del más nuevo al más viejo (base es PROTECT)
+    for archivo in [r.nombre for r in respaldos] or [nombre]:
+        ruta = os.path.join(RESPALDO_DIR, archivo)
+        if os.path.exists(ruta):
+            threading.Thread(target=intentar_eliminar, args=(ruta,)).start()
+    for dependiente in respaldos:
+        dependiente.delete()
 
     return redirect('backup:listar_respaldos')
 
 
 #--------------------------------------# Listar respaldos    
-from django.http import HttpResponse
 import traceback
 
 def listar_respaldos(request):
     try:
-        archivos = []
-        if os.path.exists(RESPALDO_DIR):
-            for archivo in os.listdir(RESPALDO_DIR):
-                ruta = os.path.join(RESPALDO_DIR, archivo)
-                archivos.append({
-                    'nombre': archivo,
-                    'tamano': f"{os.path.getsize(ruta) / 1024:.2f} KB",
-                    'fecha': now().strftime('%d/%m/%Y %H:%M'),
-                })
-
-        ultima_fecha = archivos[-1]['fecha'] if archivos else 'No disponible'
+        # Todo sale del catálogo (tamaño, fecha real, checksum); no se recorre el directorio
+        respaldos = list(Respaldo.objects.filter(estado='listo').order_by('terminado', 'id'))
+        ultima_fecha = respaldos[-1].terminado if respaldos else 'No disponible'
 
         return render(request, 'backup/respaldo_db.html', {
-            'respaldos': archivos,
-            'ultima_fecha': ultima_fecha
+            'respaldos': respaldos,
+            'ultima_fecha': ultima_fecha,
+            # los que está generando el worker (con progreso)
+            'en_curso': Respaldo.objects.filter(estado__in=('pendiente', 'en_curso')),
+            'fallidos': Respaldo.objects.filter(estado='error')[:5],
         })
     except Exception as e:
         return HttpResponse(f"""
@@ -122,99 +155,100 @@ def listar_respaldos(request):
             <pre>{traceback.format_exc()}</pre>
         """, status=500)
 
+#-------------Exportación a Excel (modo write-only, sin cargar todo en memoria)------------
+import tempfile
+from openpyxl import Workbook
+from django.http import FileResponse
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CHUNK_EXPORTACION = 2000
+
+
+def _por_lotes(queryset, tam=CHUNK_EXPORTACION):
+    """
+    Recorre el queryset en lotes por id (WHERE id > último ORDER BY id LIMIT n).
+    Igual que .iterator(chunk_size=n) pero con memoria acotada también en MySQL, donde
+    mysqlclient trae el resultado completo al cliente aunque se use iterator().
+    """
+    ultimo = 0
+    while True:
+        lote = list(queryset.filter(pk__gt=ultimo).order_by('pk')[:tam].iterator(chunk_size=tam))
+        if not lote:
+            return
+        yield from lote
+        ultimo = lote[-1].pk
+
+
+def _respuesta_excel(nombre_archivo, titulo, encabezados, filas):
+    """
+    Arma el .xlsx en modo write-only (openpyxl escribe cada fila al disco y no la guarda
+    en memoria) sobre un archivo temporal, y lo devuelve en streaming con FileResponse.
+    `filas` es un generador; el temporal se borra solo cuando se cierra la respuesta.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo)
+    ws.append(encabezados)
+    for fila in filas:
+        ws.append(fila)
+
+    temporal = tempfile.TemporaryFile(suffix='.xlsx')
+    wb.save(temporal)
+    temporal.seek(0)
+    return FileResponse(temporal, as_attachment=True, filename=nombre_archivo, content_type=EXCEL_CONTENT_TYPE)
+
+
 #-------------Provedores a Excel----------------------------
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import Provedor
 def exportar_provedores_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Proveedores"
-    # Encabezados
-    ws.append(["ID", "Nombre", "Dirección", "Teléfono", "Email"])
     # Filas de datos desde la base
-    for p in Provedor.objects.all():
-        ws.append([p.id, p.nombre, p.direccion or '', p.telefono or '', p.email or ''])
-    # Preparar respuesta para descargar
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    filas = (
+        [p.id, p.nombre, p.direccion or '', p.telefono or '', p.email or '']
+        for p in _por_lotes(Provedor.objects.all())
     )
-    response['Content-Disposition'] = 'attachment; filename=proveedores.xlsx'
-    wb.save(response)
-    return response
+    return _respuesta_excel('proveedores.xlsx', "Proveedores",
+                            ["ID", "Nombre", "Dirección", "Teléfono", "Email"], filas)
 
 #-------------Categorias a Excel----------------------------
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import Categ_producto  # Asegurate de que esté bien la importación
 
 def exportar_categorias_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Categorías"
-
-    # Encabezados
-    ws.append(["ID", "Nombre"])
-
     # Datos desde la base
-    for categoria in Categ_producto.objects.all():
-        ws.append([categoria.id, categoria.nombre])
-
-    # Preparar respuesta
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=categorias.xlsx'
-    wb.save(response)
-    return response
+    filas = (
+        [categoria.id, categoria.nombre]
+        for categoria in _por_lotes(Categ_producto.objects.all())
+    )
+    return _respuesta_excel('categorias.xlsx', "Categorías", ["ID", "Nombre"], filas)
 
 #-------------Producto a Excel----------------------------
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import Producto
 
 def exportar_productos_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Productos"
-
-    # Encabezado
-    ws.append(["ID", "Nombre", "Descripción", "Categoría", "Stock", "Precio"])
-
     # Filas
-    for producto in Producto.objects.select_related('categoria').all():
-        ws.append([
+    filas = (
+        [
             producto.id,
             producto.nombre_producto,
             producto.descripcion,
             producto.categoria.nombre if producto.categoria else '',
             producto.stock,
             float(producto.precio)
-        ])
-
-    # Generar respuesta
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        ]
+        for producto in _por_lotes(Producto.objects.select_related('categoria'))
     )
-    response['Content-Disposition'] = 'attachment; filename=productos.xlsx'
-    wb.save(response)
-    return response
+    return _respuesta_excel('productos.xlsx', "Productos",
+                            ["ID", "Nombre", "Descripción", "Categoría", "Stock", "Precio"], filas)
 
 
 #-------------Compra a Excel----------------------------
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import Compra
 
 def exportar_compras_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Compras"
-
-    # Encabezado
-    ws.append(["ID", "Producto", "Cantidad", "Precio Compra", "Factura", "Fecha", "Proveedor"])
+    if request.GET.get('formato') in ('csv', 'columnar'):
+        return exportar_datos(request, 'compras')
 
     # Filas
-    for compra in Compra.objects.select_related('producto', 'provedor'):
-        ws.append([
+    filas = (
+        [
             compra.id,
             compra.producto.nombre_producto if compra.producto else '',
             compra.cantidad,
@@ -222,109 +256,212 @@ def exportar_compras_excel(request):
             compra.factura_compra,
             compra.fecha_compra.strftime('%d/%m/%Y'),
             compra.provedor.nombre if compra.provedor else '',
-        ])
-
-    # Generar respuesta
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        ]
+        for compra in _por_lotes(Compra.objects.select_related('producto', 'provedor'))
     )
-    response['Content-Disposition'] = 'attachment; filename=compras.xlsx'
-    wb.save(response)
-    return response
+    return _respuesta_excel('compras.xlsx', "Compras",
+                            ["ID", "Producto", "Cantidad", "Precio Compra", "Factura", "Fecha", "Proveedor"], filas)
 
 #-------------Factura a Excel----------------------------
 
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import Factura
 
 def exportar_facturas_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Facturas"
-
-    # Encabezados
-    ws.append([
+    if request.GET.get('formato') in ('csv', 'columnar'):
+        return exportar_datos(request, 'facturas')
+
+    def filas():
+        # metodo_pago en el mismo SELECT (antes era una consulta por factura)
+        for f in _por_lotes(Factura.objects.select_related('metodo_pago')):
+            metodo_pago_nombre = f.metodo_pago.tarjeta_nombre if f.metodo_pago else f.metodo_pago_manual or ""
+
+            yield [
+                f.numero_factura,
+                f.fecha.strftime('%d/%m/%Y'),
+                f"{f.nombre_cliente} {f.apellido_cliente}",
+                f.dni_cliente or "",
+                f.cuil or "",
+                f.iva or "",
+                f.domicilio or "",
+                metodo_pago_nombre,
+                float(f.total),
+                float(f.total_con_interes),
+                f.cuotas,
+                float(f.cuota_mensual),
+                f.tarjeta_nombre or "",
+                f.numero_tiket or "",
+                f.estado_credito,
+                f.estado_entrega,
+                f.vendedor
+            ]
+
+    return _respuesta_excel('facturas.xlsx', "Facturas", [
         "Número", "Fecha", "Cliente", "DNI", "CUIL", "IVA", "Domicilio",
         "Método de Pago", "Total", "Total con Interés", "Cuotas", "Cuota Mensual",
         "Tarjeta", "Ticket", "Estado Crédito", "Estado Entrega", "Vendedor"
-    ])
-
-    # Datos
-    for f in Factura.objects.all():
-        metodo_pago_nombre = f.metodo_pago.tarjeta_nombre if f.metodo_pago else f.metodo_pago_manual or ""
-
-        ws.append([
-            f.numero_factura,
-            f.fecha.strftime('%d/%m/%Y'),
-            f"{f.nombre_cliente} {f.apellido_cliente}",
-            f.dni_cliente or "",
-            f.cuil or "",
-            f.iva or "",
-            f.domicilio or "",
-            metodo_pago_nombre,
-            float(f.total),
-            float(f.total_con_interes),
-            f.cuotas,
-            float(f.cuota_mensual),
-            f.tarjeta_nombre or "",
-            f.numero_tiket or "",
-            f.estado_credito,
-            f.estado_entrega,
-            f.vendedor
-        ])
-
-    # Generar respuesta
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=facturas.xlsx'
-    wb.save(response)
-    return response
+    ], filas())
 
 #-------------Cuenta corriente a Excel----------------------------
-import openpyxl
-from django.http import HttpResponse
 from apps.CarritoApp.models import CuentaCorriente  # Ajustá según nombre real de tu app
 
 def exportar_cuenta_corriente_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Cuenta Corriente"
-
-    # Encabezados
-    ws.append([
+    if request.GET.get('formato') in ('csv', 'columnar'):
+        return exportar_datos(request, 'cuenta_corriente')
+
+    def filas():
+        for cc in _por_lotes(CuentaCorriente.objects.select_related('metodo_pago')):
+            metodo_pago = cc.metodo_pago.tarjeta_nombre if cc.metodo_pago else "Efectivo"
+            estado_credito = cc.estado_credito
+            tarjeta_numero = f"****{cc.tarjeta_numero[-4:]}" if cc.tarjeta_numero else ""
+
+            yield [
+                cc.numero_factura,
+                cc.descripcion,
+                cc.fecha_cuota.strftime('%d/%m/%Y'),
+                float(cc.total_con_interes),
+                cc.cuota_total,
+                cc.cuota_paga,
+                cc.cuota_debe,
+                cc.cuota_suma,
+                float(cc.imp_mensual),
+                float(cc.imp_cuota_pagadas),
+                float(cc.entrega_cta),
+                float(cc.interes_aplicado),
+                metodo_pago,
+                cc.tarjeta_nombre or "",
+                tarjeta_numero,
+                estado_credito,
+            ]
+
+    return _respuesta_excel('cuenta_corriente.xlsx', "Cuenta Corriente", [
         "Número de Factura", "Descripción", "Fecha Cuota", "Total con Interés",
         "Cuotas Totales", "Cuotas Pagadas", "Cuotas Restantes", "Suma de Cuotas",
         "Importe Mensual", "Importe Pagado", "Entrega a Cuenta", "Interés Aplicado",
         "Método de Pago", "Tarjeta", "Número Tarjeta", "Estado del Crédito"
-    ])
-
-    # Datos
-    for cc in CuentaCorriente.objects.all():
-        metodo_pago = cc.metodo_pago.tarjeta_nombre if cc.metodo_pago else "Efectivo"
-        estado_credito = cc.estado_credito
-        tarjeta_numero = f"****{cc.tarjeta_numero[-4:]}" if cc.tarjeta_numero else ""
-
-        ws.append([
-            cc.numero_factura,
-            cc.descripcion,
-            cc.fecha_cuota.strftime('%d/%m/%Y'),
-            float(cc.total_con_interes),
-            cc.cuota_total,
-            cc.cuota_paga,
-            cc.cuota_debe,
-            cc.cuota_suma,
-            float(cc.imp_mensual),
-            float(cc.imp_cuota_pagadas),
-            float(cc.entrega_cta),
-            float(cc.interes_aplicado),
-            metodo_pago,
-            cc.tarjeta_nombre or "",
-            tarjeta_numero,
-            estado_credito,
-        ])
-
-    # Generar respuesta
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=cuenta_corriente.xlsx'
-    wb.save(response)
+    ], filas())
+
+#-------------Exportación CSV / columnar (para el ETL contable)----------------------------
+# /respaldos/exportar/<conjunto>/?formato=csv|columnar&desde=AAAA-MM-DD&hasta=AAAA-MM-DD&desde_id=N&gzip=1
+#   csv:      una fila por registro, streaming.
+#   columnar: JSON por líneas; la primera trae las columnas y cada línea siguiente un
+#             bloque de hasta CHUNK_EXPORTACION filas guardado por columna
+#             ({"filas": n, "datos": {"col": [...], ...}}), como los row groups de Parquet.
+#   desde_id: solo registros con id mayor (incremental: pasar el último id ya cargado).
+import csv
+import json
+import zlib
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse, HttpResponseBadRequest, Http404
+from apps.CarritoApp.models import FacturaProducto
+
+# conjunto -> (queryset, campo de fecha, columnas para values_list; la primera siempre es el id)
+CONJUNTOS_EXPORTACION = {
+    'facturas': (
+        lambda: Factura.objects.all(), 'fecha',
+        ['id', 'numero_factura', 'fecha', 'dni_cliente', 'nombre_cliente', 'apellido_cliente',
+         'cuil', 'iva', 'metodo_pago_id', 'metodo_pago__tarjeta_nombre', 'metodo_pago_manual',
+         'total', 'descuento', 'total_descuento', 'interes', 'total_con_interes', 'cuotas',
+         'cuota_mensual', 'total_pagado', 'saldo', 'tarjeta_nombre', 'numero_tiket',
+         'estado_credito', 'estado_entrega', 'vendedor'],
+    ),
+    'cuenta_corriente': (
+        lambda: CuentaCorriente.objects.all(), 'fecha_cuota',
+        ['id', 'factura_id', 'numero_factura', 'fecha_cuota', 'descripcion', 'total_con_interes',
+         'cuota_total', 'cuota_paga', 'cuota_debe', 'cuota_suma', 'imp_mensual', 'imp_cuota_pagadas',
+         'entrega_cta', 'interes_aplicado', 'metodo_pago_id', 'metodo_pago__tarjeta_nombre', 'tarjeta_nombre'],
+    ),
+    'compras': (
+        lambda: Compra.objects.all(), 'fecha_compra',
+        ['id', 'producto_id', 'producto__nombre_producto', 'cantidad', 'precio_compra',
+         'factura_compra', 'fecha_compra', 'provedor_id', 'provedor__nombre'],
+    ),
+    'lineas_venta': (
+        lambda: FacturaProducto.objects.all(), 'fecha',
+        ['id', 'factura_id', 'factura__numero_factura', 'fecha', 'producto_id', 'nombre_producto',
+         'cantidad', 'precio_unitario', 'subtotal'],
+    ),
+}
+
+
+def _valores_por_lotes(queryset, columnas, tam=CHUNK_EXPORTACION):
+    """Como _por_lotes pero con values_list: devuelve listas de tuplas (un lote por vez)."""
+    ultimo = 0
+    while True:
+        lote = list(queryset.filter(pk__gt=ultimo).order_by('pk').values_list(*columnas)[:tam])
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1][0]
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+class _Eco:
+    """Archivo falso para csv.writer: devuelve lo que se escribe en vez de guardarlo."""
+    def write(self, valor):
+        return valor
+
+
+def _csv_por_lotes(columnas, lotes):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for lote in lotes:
+        yield ''.join(escritor.writerow([_texto(v) for v in fila]) for fila in lote)
+
+
+def _columnar_por_lotes(conjunto, columnas, lotes):
+    yield json.dumps({'conjunto': conjunto, 'columnas': columnas}) + '\n'
+    for lote in lotes:
+        datos = {col: [fila[i] for fila in lote] for i, col in enumerate(columnas)}
+        yield json.dumps({'filas': len(lote), 'datos': datos}, cls=DjangoJSONEncoder) + '\n'
+
+
+def _gzip(partes):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = formato gzip
+    for parte in partes:
+        comprimido = compresor.compress(parte.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+@staff_member_required
+def exportar_datos(request, conjunto, formato=None):
+    if conjunto not in CONJUNTOS_EXPORTACION:
+        raise Http404("Conjunto de datos inexistente.")
+    queryset_base, campo_fecha, columnas = CONJUNTOS_EXPORTACION[conjunto]
+    formato = formato or request.GET.get('formato', 'csv')
+    if formato not in ('csv', 'columnar'):
+        return HttpResponseBadRequest("formato debe ser csv o columnar.")
+
+    queryset = queryset_base()
+    try:
+        for parametro, lookup in (('desde', 'gte'), ('hasta', 'lte')):
+            if request.GET.get(parametro):
+                fecha = datetime.strptime(request.GET[parametro], '%Y-%m-%d').date()
+                queryset = queryset.filter(**{f'{campo_fecha}__{lookup}': fecha})
+        if request.GET.get('desde_id'):
+            queryset = queryset.filter(pk__gt=int(request.GET['desde_id']))
+    except ValueError:
+        return HttpResponseBadRequest("Fechas en formato AAAA-MM-DD y desde_id numérico.")
+
+    lotes = _valores_por_lotes(queryset, columnas)
+    if formato == 'csv':
+        partes, extension, content_type = _csv_por_lotes(columnas, lotes), 'csv', 'text/csv; charset=utf-8'
+    else:
+        partes, extension, content_type = _columnar_por_lotes(conjunto, columnas, lotes), 'jsonl', 'application/x-ndjson'
+
+    nombre = f"{conjunto}_{now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if request.GET.get('gzip') in ('1', 'true'):
+        partes, nombre, content_type = _gzip(partes), f'{nombre}.gz', 'application/gzip'
+
+    response = StreamingHttpResponse(partes, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
     return response
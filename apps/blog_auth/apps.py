@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class BlogAuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.blog_auth'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (índice de clientes)
@@ -1,18 +1,19 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from .clientes import usuario_por_dni
+
 User = get_user_model()
 
 class DNIBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         if not username or not password:
             return None
-        try:
-            user = User.objects.get(dni_usuario=username)
-        except User.DoesNotExist:
-            return None
-        except User.MultipleObjectsReturned:
-            # Evita traceback si aún quedan DNIs duplicados: no autentica
+        # Por el índice único de DNI (IndiceCliente): acepta el DNI con o sin puntos
+        user = usuario_por_dni(username)
+        if user is None:
+            # Igual que ModelBackend: corre el hasher para no delatar por tiempo que el DNI no existe
+            User().set_password(password)
             return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
@@ -0,0 +1,80 @@
+#-------------------- Búsqueda de clientes por DNI y nombre ------------------------------------#
+# Login por DNI (backends.DNIBackend), buscador de clientes de la caja (modulo1) y alta de turnos
+# buscan en IndiceCliente: el DNI normalizado tiene índice único y apellido/nombre normalizados
+# se buscan por prefijo (LIKE 'xx%' sobre el índice), nunca con '%xx%' sobre auth_user.
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from apps.CarritoApp.busqueda import normalizar
+
+from .models import IndiceCliente
+
+logger = logging.getLogger(__name__)
+
+LIMITE = 10
+
+
+def normalizar_dni(valor):
+    """'20.123.456' -> '20123456'; None si no tiene dígitos."""
+    digitos = ''.join(ch for ch in str(valor or '') if ch.isdecimal())
+    return digitos or None
+
+
+def indexar(usuario):
+    """Crea o actualiza la fila del usuario. Si el DNI ya es de otro usuario queda sin DNI (y se avisa en el log)."""
+    dni = normalizar_dni(getattr(usuario, 'dni_usuario', None))
+    if dni and IndiceCliente.objects.filter(dni=dni).exclude(usuario_id=usuario.pk).exists():
+        logger.warning('DNI %s repetido: el usuario %s queda fuera del índice de DNI', dni, usuario.pk)
+        dni = None
+    datos = {
+        'dni': dni,
+        'apellido': normalizar(usuario.last_name)[:150],
+        'nombre': normalizar(usuario.first_name)[:150],
+    }
+    actual = IndiceCliente.objects.filter(usuario_id=usuario.pk).values('dni', 'apellido', 'nombre').first()
+    if actual == datos:
+        return
+    try:
+        with transaction.atomic():
+            IndiceCliente.objects.update_or_create(usuario_id=usuario.pk, defaults=datos)
+    except IntegrityError:
+        # otro usuario se registró con el mismo DNI al mismo tiempo
+        logger.warning('DNI %s repetido: el usuario %s queda fuera del índice de DNI', dni, usuario.pk)
+        IndiceCliente.objects.update_or_create(usuario_id=usuario.pk, defaults={**datos, 'dni': None})
+
+
+def dni_en_uso(dni, excluir=None):
+    qs = IndiceCliente.objects.filter(dni=normalizar_dni(dni))
+    if excluir is not None:
+        qs = qs.exclude(usuario_id=excluir)
+    return normalizar_dni(dni) is not None and qs.exists()
+
+
+def usuario_por_dni(dni):
+    """Usuario con ese DNI (con o sin puntos) o None."""
+    dni = normalizar_dni(dni)
+    if dni is None:
+        return None
+    return get_user_model().objects.filter(indice_cliente__dni=dni).first()
+
+
+def buscar(texto, limite=LIMITE):
+    """
+    Usuarios cuyo DNI empieza con los dígitos buscados, o en los que cada palabra es el
+    comienzo del apellido o del nombre. Ordenados por apellido y nombre, como mucho `limite`.
+    """
+    User = get_user_model()
+    texto = (texto or '').strip()
+    if not texto:
+        return User.objects.none()
+
+    if texto.replace('.', '').isdecimal():
+        filtro = Q(indice_cliente__dni__startswith=normalizar_dni(texto))
+    else:
+        filtro = Q()
+        for palabra in normalizar(texto).split():
+            filtro &= Q(indice_cliente__apellido__startswith=palabra) | Q(indice_cliente__nombre__startswith=palabra)
+    return User.objects.filter(filtro).order_by('indice_cliente__apellido', 'indice_cliente__nombre')[:limite]
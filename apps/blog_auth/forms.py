@@ -3,11 +3,10 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.files.images import get_image_dimensions
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.conf import settings
-from io import BytesIO
-from pathlib import Path
-from PIL import Image, ImageFile
+from PIL import ImageFile
+from apps.mascota.imagenes import optimizar
+from .clientes import dni_en_uso
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True  # evita errores con JPG "raros"
 User = get_user_model()
@@ -24,26 +23,13 @@ ALLOWED_CTYPES = ("image/jpeg", "image/png", "image/webp")
 
 def _optimize_image(uploaded, max_w=AVATAR_MAX_W, max_h=AVATAR_MAX_H, quality=AVATAR_QUALITY):
     """
-    Redimensiona y comprime a JPEG optimizado en memoria.
+    Redimensiona y comprime a JPEG optimizado en memoria (mismo procesador que las fotos de
+    mascotas: aplica la orientación EXIF y descarta los metadatos).
     """
-    # Abrimos con PIL
-    img = Image.open(uploaded)
-    # Normalizamos a RGB (PNG/WebP con transparencia)
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-    # Reducción proporcional (thumbnail mantiene aspect ratio)
-    img.thumbnail((max_w, max_h))
-    # Guardamos en buffer
-    buf = BytesIO()
-    img.save(buf, format="JPEG", optimize=True, quality=quality)
-    buf.seek(0)
-
-    filename = Path(getattr(uploaded, "name", "avatar")).stem + ".jpg"
-    optimized = InMemoryUploadedFile(
-        buf, field_name="ImageField", name=filename,
-        content_type="image/jpeg", size=buf.getbuffer().nbytes, charset=None
-    )
-    return optimized
+    try:
+        return optimizar(uploaded, max_lado=max(max_w, max_h), calidad=quality)
+    except ValidationError:
+        raise ValidationError("No se pudo leer la imagen. Usá JPG, PNG o WebP.")
 
 def _validar_basica(uploaded):
     """
@@ -118,7 +104,7 @@ class RegistrarseForm(UserCreationForm):
         dni = (self.cleaned_data.get("dni_usuario") or "").strip()
         if not dni.isdigit():
             raise ValidationError("El DNI debe contener solo números.")
-        if User.objects.filter(dni_usuario=dni).exists():
+        if dni_en_uso(dni):
             raise ValidationError("⚠️ Ya esta registrado este DNI.")
         return dni
 
@@ -153,6 +139,12 @@ class EditarUsuarioForm(forms.ModelForm):
             imagen = limpiar_y_optimizar(imagen)
         return imagen
 
+    def clean_dni_usuario(self):
+        dni = (self.cleaned_data.get("dni_usuario") or "").strip()
+        if dni and dni_en_uso(dni, excluir=self.instance.pk):
+            raise ValidationError("⚠️ Ya esta registrado este DNI.")
+        return dni
+
     def save(self, commit=True):
         user = super().save(commit=False)
         # Si cambian el DNI, sincronizamos username = nuevo DNI
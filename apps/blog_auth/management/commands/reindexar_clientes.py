@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.blog_auth import clientes
+
+
+class Command(BaseCommand):
+    help = ('Rehace el índice de clientes (DNI normalizado, apellido y nombre). Hace falta después de '
+            'cambiar usuarios con UPDATE directos o de importar datos. Los DNI repetidos se informan.')
+
+    def handle(self, *args, **options):
+        usuarios = get_user_model().objects.only('id', 'dni_usuario', 'first_name', 'last_name')
+        total = 0
+        for usuario in usuarios.order_by('id').iterator(chunk_size=1000):
+            clientes.indexar(usuario)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'{total} usuarios indexados.'))
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:29
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _normalizar(texto):
+    # copia de CarritoApp.busqueda.normalizar: la migración no depende del código actual
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]+', ' ', sin_acentos.lower()).strip()
+
+
+def indexar_clientes(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    IndiceCliente = apps.get_model('blog_auth', 'IndiceCliente')
+    usados = set()
+    filas = []
+    # Con DNIs repetidos se queda con el usuario más viejo; los demás quedan sin DNI en el índice
+    for usuario in User.objects.order_by('id').values('id', 'dni_usuario', 'first_name', 'last_name').iterator(chunk_size=1000):
+        # igual que clientes.normalizar_dni: isdecimal() y no isdigit(), que también acepta '²' o '①'
+        dni = ''.join(ch for ch in str(usuario['dni_usuario'] or '') if ch.isdecimal()) or None
+        if dni in usados:
+            dni = None
+        usados.add(dni)
+        filas.append(IndiceCliente(
+            usuario_id=usuario['id'], dni=dni,
+            apellido=_normalizar(usuario['last_name'])[:150],
+            nombre=_normalizar(usuario['first_name'])[:150],
+        ))
+    IndiceCliente.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0013_user_cuil_user_dni_usuario_user_domicilio_usuario_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceCliente',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_cliente', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('dni', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('apellido', models.CharField(blank=True, default='', max_length=150)),
+                ('nombre', models.CharField(blank=True, db_index=True, default='', max_length=150)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['apellido', 'nombre'], name='blog_auth_i_apellid_5b5af7_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_clientes, migrations.RunPython.noop),
+    ]
@@ -19,4 +19,22 @@ TIPO_IVA_CHOICES = [
     ('EX', 'Exento'),
 ]
 
-User.add_to_class('iva', models.CharField(max_length=2, choices=TIPO_IVA_CHOICES, blank=True, null=True, verbose_name="IVA"))
\ No newline at end of file
+User.add_to_class('iva', models.CharField(max_length=2, choices=TIPO_IVA_CHOICES, blank=True, null=True, verbose_name="IVA"))
+
+#-------------------- Índice de clientes (DNI / apellido) ------------------------------------#
+class IndiceCliente(models.Model):
+    """
+    Columnas indexadas para buscar clientes: auth_user no tiene índices en los campos de arriba.
+    DNI solo con dígitos y único; apellido y nombre normalizados (sin acentos, minúsculas) para
+    buscar por prefijo. Lo mantiene la señal de User en signals.py (ver clientes.py).
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='indice_cliente')
+    dni = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    apellido = models.CharField(max_length=150, blank=True, default='')
+    nombre = models.CharField(max_length=150, blank=True, default='', db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['apellido', 'nombre'])]
+
+    def __str__(self):
+        return f'{self.dni or "-"} {self.apellido}, {self.nombre}'
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import clientes
+
+
+# ----------------- Índice de clientes -----------------
+# DNI normalizado y apellido/nombre para las búsquedas (ver clientes.py)
+
+@receiver(post_save, sender=get_user_model())
+def indexar_cliente(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'dni_usuario', 'first_name', 'last_name'} & set(update_fields):
+        return  # last_login, password, etc.
+    clientes.indexar(instance)
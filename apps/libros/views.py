@@ -1,10 +1,13 @@
 from datetime import datetime
 from decimal import Decimal
-from django.db.models import Q, Sum, Value, DecimalField
+from django.db.models import Q, Sum, Value, DecimalField, F
 from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from apps.CarritoApp.models import Factura, CuentaCorriente, MetodoPago
 
+FACTURAS_POR_PAGINA = 50
+
 def listar_ctacorriente(request):
     dni_cliente = (request.GET.get('dni_cliente') or '').strip()
     apellido_cliente = (request.GET.get('apellido_cliente') or '').strip()
@@ -40,34 +43,33 @@ def listar_ctacorriente(request):
         except ValueError:
             pass
 
-    facturas = facturas.order_by('-numero_factura')
-
     ZERO = Value(Decimal('0.00'),
                  output_field=DecimalField(max_digits=12, decimal_places=2))
 
-    pagos_por_factura = {}
-    for f in facturas:
-        agg = CuentaCorriente.objects.filter(factura=f).aggregate(
-            cuotas=Coalesce(Sum('imp_cuota_pagadas'), ZERO),
-            entregas=Coalesce(Sum('entrega_cta'), ZERO),
-        )
-        total_pagado = (agg['cuotas'] or Decimal('0')) + (agg['entregas'] or Decimal('0'))
-        pagos_por_factura[f.id] = total_pagado
+    # ✅ Pagado y deuda son columnas de la factura (las mantiene cada pago)
+    facturas = (
+        facturas
+        .annotate(pagado=F('total_pagado'), deuda=F('saldo'))
+        .filter(saldo__gt=0)  # solo deudores, filtrado en SQL
+        .order_by('-numero_factura')
+    )
 
-    deuda_por_factura = {}
-    for f in facturas:
-        total = Decimal(getattr(f, 'total_con_interes', 0) or 0)
-        pagado = pagos_por_factura.get(f.id, Decimal('0'))
-        deuda = total - pagado
-        if deuda < 0:
-            deuda = Decimal('0')
-        deuda_por_factura[f.id] = deuda
+    totales = facturas.aggregate(
+        total_general=Coalesce(Sum('total_con_interes'), ZERO),
+        total_pagos=Coalesce(Sum('pagado'), ZERO),
+        total_deuda=Coalesce(Sum('deuda'), ZERO),
+    )
+    total_general = totales['total_general']
+    total_pagos = totales['total_pagos']
+    total_deuda = totales['total_deuda']
 
-    facturas = [f for f in facturas if deuda_por_factura.get(f.id, Decimal('0')) > 0]
+    facturas = Paginator(facturas, FACTURAS_POR_PAGINA).get_page(request.GET.get('page'))
+    pagos_por_factura = {f.id: f.pagado for f in facturas}
+    deuda_por_factura = {f.id: f.deuda for f in facturas}
 
-    total_general = sum(Decimal(getattr(f, 'total_con_interes', 0) or 0) for f in facturas)
-    total_pagos   = sum(pagos_por_factura.get(f.id, Decimal('0')) for f in facturas)
-    total_deuda   = sum(deuda_por_factura.get(f.id, Decimal('0')) for f in facturas)
+    params = request.GET.copy()
+    params.pop('page', None)
+    querystring = params.urlencode()
 
     metodos_pago = MetodoPago.objects.exclude(
         tarjeta_nombre__iexact="Cuenta Corriente"
@@ -81,6 +83,7 @@ def listar_ctacorriente(request):
         'pagos_por_factura': pagos_por_factura,
         'deuda_por_factura': deuda_por_factura,
         'metodos_pago': metodos_pago,
+        'querystring': querystring,
     })
 
 
@@ -146,6 +149,7 @@ def mostrar_factura_cta(request, factura_id):
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Sum
 from django.utils.timezone import now
+from django.db import transaction
 from decimal import Decimal
 from django.http import JsonResponse
 from apps.CarritoApp.models import Factura, CuentaCorriente, MetodoPago
@@ -154,13 +158,9 @@ def pago_credito(request, factura_id):
     factura = get_object_or_404(Factura, id=factura_id)
     cuenta_corriente = CuentaCorriente.objects.filter(factura=factura)
 
-    # Totales previos
-    total_pagos_data = cuenta_corriente.aggregate(
-        total_cuotas=Sum('imp_cuota_pagadas', default=Decimal(0)),
-        total_entregas=Sum('entrega_cta', default=Decimal(0))
-    )
-    total_pagos = (total_pagos_data['total_cuotas'] or Decimal(0)) + (total_pagos_data['total_entregas'] or Decimal(0))
-    total_deuda = max(Decimal("0.00"), (factura.total_con_interes or Decimal(0)) - total_pagos)
+    # Totales previos (columnas de la factura, las mantiene cada pago)
+    total_pagos = factura.total_pagado
+    total_deuda = max(Decimal("0.00"), factura.saldo)
 
     # ----- Suma de cuotas pagadas (tracking de cuotas) -----
     cantidad_cuotas = Decimal(request.POST.get("cantidad_cuotas", "1") or "1")
@@ -174,105 +174,16 @@ def pago_credito(request, factura_id):
 
     if request.method == "POST":
         print("📌 Datos recibidos en Django:", request.POST)
-
-        tipo_pago = request.POST.get("tipo_pago")  # "cuota" | "entrega"
-        metodo_pago_id = request.POST.get("metodo_pago")  # ID o "Efectivo"
-
-        # Datos comunes
-        tarjeta_nombre = (request.POST.get("tarjeta_nombre") or "").strip()
-        tarjeta_numero = (request.POST.get("tarjeta_numero") or "").strip()
-        interes_aplicado = Decimal(request.POST.get("interes_aplicado", "0") or "0")
-
-        # Resolver método de pago (FK) si no es efectivo
-        if metodo_pago_id == "Efectivo":
-            metodo_pago = None
-        else:
-            try:
-                metodo_pago = MetodoPago.objects.get(id=int(metodo_pago_id))
-            except (ValueError, MetodoPago.DoesNotExist):
-                return JsonResponse({"success": False, "error": "Método de pago no válido."})
-
-        # Normalización según tipo de pago (LIMPIA, sin duplicados)
-        if tipo_pago == "cuota":
-            # cuántas cuotas paga y cuánto representa en dinero
-            cantidad_cuotas = Decimal(request.POST.get("cantidad_cuotas", "1") or "1")
-            monto_por_cuota = factura.cuota_mensual or (
-                (factura.total_con_interes or Decimal(0)) / Decimal(factura.cuotas or 1)
-            )
-            imp_cuota_pagadas = (monto_por_cuota * cantidad_cuotas)
-            entrega_cta = Decimal(0)
-            cuota_paga = cantidad_cuotas
-            monto_pagado = imp_cuota_pagadas  # lo que efectivamente paga ahora
-        else:
-            # entrega a cuenta (no suma cuota)
-            monto_pagado = Decimal(request.POST.get("monto_pagado", "0") or "0")
-            imp_cuota_pagadas = Decimal(0)
-            entrega_cta = monto_pagado
-            cuota_paga = Decimal(0)
-
-        # Validación de sobrepago
-        if total_pagos + (monto_pagado or Decimal(0)) > (factura.total_con_interes or Decimal(0)):
-            return JsonResponse({"success": False, "error": "El pago ingresado excede la deuda."})
-
-        print(f"🛠️ imp_cuota_pagadas antes de guardar: {imp_cuota_pagadas}")
-
-        # Guardar movimiento
-        CuentaCorriente.objects.create(
-            factura=factura,
-            numero_factura=factura.numero_factura,
-            descripcion=f"Pago de {tipo_pago} con {metodo_pago.tarjeta_nombre if metodo_pago else 'Efectivo'}",
-            total_con_interes=factura.total_con_interes,
-            fecha_cuota=now().date(),
-            imp_cuota_pagadas=imp_cuota_pagadas,
-            entrega_cta=entrega_cta,
-            metodo_pago=metodo_pago,           # auditoría
-            tarjeta_nombre="Cuenta Corriente", # mantener etiqueta del método original
-            tarjeta_numero=tarjeta_numero if metodo_pago else None,
-            cuota_total=factura.cuotas,
-            cuota_paga=cuota_paga,
-            cuota_suma=suma_actualizada,
-            cuota_debe=cuota_debe,
-            interes_aplicado=interes_aplicado,
-        )
-
-        # Recalcular totales luego del alta
-        nuevo_total = CuentaCorriente.objects.filter(factura=factura).aggregate(
-            total_cuotas=Sum('imp_cuota_pagadas', default=Decimal(0)),
-            total_entregas=Sum('entrega_cta', default=Decimal(0))
-        )
-        total_pagado_final = (nuevo_total['total_cuotas'] or Decimal(0)) + (nuevo_total['total_entregas'] or Decimal(0))
-
-        # Cerrar crédito si corresponde (SIN doble seteo)
-        if total_pagado_final >= (factura.total_con_interes or Decimal(0)):
-            factura.estado_credito = "Pagado"
-
-            # Mantener "Cuenta Corriente" si originalmente lo era
-            if not (
-                factura.metodo_pago_manual == "Cuenta Corriente" or
-                (factura.metodo_pago and factura.metodo_pago.tarjeta_nombre == "Cuenta Corriente")
-            ):
-                # Si se saldó con entrega en efectivo exacta y no era CC
-                if tipo_pago == "entrega" and metodo_pago_id == "Efectivo" and monto_pagado == factura.total_con_interes:
-                    factura.metodo_pago = None
-                    factura.metodo_pago_manual = "Efectivo"
-                else:
-                    factura.metodo_pago = metodo_pago
-                    factura.metodo_pago_manual = metodo_pago.tarjeta_nombre if metodo_pago else "Sin especificar"
-
-            factura.save()
-
-        return JsonResponse({"success": True, "message": "Pago registrado con éxito."})
+        with transaction.atomic():
+            # Bloquea la factura: dos pagos simultáneos no pueden pasar juntos la validación de sobrepago
+            factura = Factura.objects.select_for_update().get(id=factura_id)
+            return _registrar_pago_credito(request, factura, cantidad_cuotas, suma_actualizada, cuota_debe)
 
     # GET: datos para renderizar
     total_cuotas_pagadas = cuenta_corriente.aggregate(suma=Sum('cuota_paga'))['suma'] or 0
     cuotas_restantes = max(0, (factura.cuotas or 0) - total_cuotas_pagadas)
 
-    nuevo_total_pagado = CuentaCorriente.objects.filter(factura=factura).aggregate(
-        total_cuotas=Sum('imp_cuota_pagadas', default=Decimal(0)),
-        total_entregas=Sum('entrega_cta', default=Decimal(0))
-    )
-    total_pagado_final = (nuevo_total_pagado['total_cuotas'] or Decimal(0)) + (nuevo_total_pagado['total_entregas'] or Decimal(0))
-    estado_credito = "Pagado" if total_pagado_final >= (factura.total_con_interes or Decimal(0)) else "Pendiente"
+    estado_credito = factura.estado_credito_real
 
     metodos_pago = MetodoPago.objects.all()
     return render(request, "libros/pago_credito.html", {
@@ -286,6 +197,94 @@ def pago_credito(request, factura_id):
     })
 
 
+def _registrar_pago_credito(request, factura, cantidad_cuotas, suma_actualizada, cuota_debe):
+    """Alta del pago (POST de pago_credito). Corre con la factura bloqueada."""
+    tipo_pago = request.POST.get("tipo_pago")  # "cuota" | "entrega"
+    metodo_pago_id = request.POST.get("metodo_pago")  # ID o "Efectivo"
+
+    # Datos comunes
+    tarjeta_nombre = (request.POST.get("tarjeta_nombre") or "").strip()
+    tarjeta_numero = (request.POST.get("tarjeta_numero") or "").strip()
+    interes_aplicado = Decimal(request.POST.get("interes_aplicado", "0") or "0")
+
+    # Resolver método de pago (FK) si no es efectivo
+    if metodo_pago_id == "Efectivo":
+        metodo_pago = None
+    else:
+        try:
+            metodo_pago = MetodoPago.objects.get(id=int(metodo_pago_id))
+        except (ValueError, MetodoPago.DoesNotExist):
+            return JsonResponse({"success": False, "error": "Método de pago no válido."})
+
+    # Normalización según tipo de pago (LIMPIA, sin duplicados)
+    if tipo_pago == "cuota":
+        # cuántas cuotas paga y cuánto representa en dinero
+        cantidad_cuotas = Decimal(request.POST.get("cantidad_cuotas", "1") or "1")
+        monto_por_cuota = factura.cuota_mensual or (
+            (factura.total_con_interes or Decimal(0)) / Decimal(factura.cuotas or 1)
+        )
+        imp_cuota_pagadas = (monto_por_cuota * cantidad_cuotas)
+        entrega_cta = Decimal(0)
+        cuota_paga = cantidad_cuotas
+        monto_pagado = imp_cuota_pagadas  # lo que efectivamente paga ahora
+    else:
+        # entrega a cuenta (no suma cuota)
+        monto_pagado = Decimal(request.POST.get("monto_pagado", "0") or "0")
+        imp_cuota_pagadas = Decimal(0)
+        entrega_cta = monto_pagado
+        cuota_paga = Decimal(0)
+
+    # Validación de sobrepago
+    if factura.total_pagado + (monto_pagado or Decimal(0)) > (factura.total_con_interes or Decimal(0)):
+        return JsonResponse({"success": False, "error": "El pago ingresado excede la deuda."})
+
+    print(f"🛠️ imp_cuota_pagadas antes de guardar: {imp_cuota_pagadas}")
+
+    # Guardar movimiento
+    CuentaCorriente.objects.create(
+        factura=factura,
+        numero_factura=factura.numero_factura,
+        descripcion=f"Pago de {tipo_pago} con {metodo_pago.tarjeta_nombre if metodo_pago else 'Efectivo'}",
+        total_con_interes=factura.total_con_interes,
+        fecha_cuota=now().date(),
+        imp_cuota_pagadas=imp_cuota_pagadas,
+        entrega_cta=entrega_cta,
+        metodo_pago=metodo_pago,           # auditoría
+        tarjeta_nombre="Cuenta Corriente", # mantener etiqueta del método original
+        tarjeta_numero=tarjeta_numero if metodo_pago else None,
+        cuota_total=factura.cuotas,
+        cuota_paga=cuota_paga,
+        cuota_suma=suma_actualizada,
+        cuota_debe=cuota_debe,
+        interes_aplicado=interes_aplicado,
+    )
+
+    # La señal de CuentaCorriente ya actualizó total_pagado/saldo
+    factura.refresh_from_db(fields=['total_pagado', 'saldo'])
+    total_pagado_final = factura.total_pagado
+
+    # Cerrar crédito si corresponde (SIN doble seteo)
+    if total_pagado_final >= (factura.total_con_interes or Decimal(0)):
+        factura.estado_credito = "Pagado"
+
+        # Mantener "Cuenta Corriente" si originalmente lo era
+        if not (
+            factura.metodo_pago_manual == "Cuenta Corriente" or
+            (factura.metodo_pago and factura.metodo_pago.tarjeta_nombre == "Cuenta Corriente")
+        ):
+            # Si se saldó con entrega en efectivo exacta y no era CC
+            if tipo_pago == "entrega" and metodo_pago_id == "Efectivo" and monto_pagado == factura.total_con_interes:
+                factura.metodo_pago = None
+                factura.metodo_pago_manual = "Efectivo"
+            else:
+                factura.metodo_pago = metodo_pago
+                factura.metodo_pago_manual = metodo_pago.tarjeta_nombre if metodo_pago else "Sin especificar"
+
+        factura.save()
+
+    return JsonResponse({"success": True, "message": "Pago registrado con éxito."})
+
+
 
 
 
@@ -355,8 +354,8 @@ def generar_factura_pdf(request, factura_id):
 
 #------------------------------------------------------------------------------------
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Sum
-from apps.CarritoApp.models import CuentaCorriente
+from django.db import transaction
+from apps.CarritoApp.models import CuentaCorriente, Factura
 
 def eliminar_pago_credito(request, pago_id):
     # Intentar obtener el registro, si no existe, redirigir con un mensaje de error
@@ -366,14 +365,12 @@ def eliminar_pago_credito(request, pago_id):
         print(f"⚠️ ERROR: No se encontró el pago con ID {pago_id}")
         return redirect("libros:listar_ctacorriente")  # Redirigir a la lista si no existe
     
-    factura_id = pago.factura.id  # Guardamos el ID de la factura antes de eliminar
-    
-    pago.delete()  # Eliminar el pago
-    
-    # Recalcular la suma de pagos después de eliminar (corregido el nombre del campo)
-    total_pagos = CuentaCorriente.objects.filter(factura_id=factura_id).aggregate(
-        total_pagado=Sum('imp_cuota_pagadas') + Sum('entrega_cta')
-    )['total_pagado'] or 0  # Si no hay registros, poner 0
+    factura_id = pago.factura_id  # Guardamos el ID de la factura antes de eliminar
+
+    with transaction.atomic():
+        # el borrado dispara Factura.actualizar_saldo (señal) dentro de esta transacción
+        Factura.objects.select_for_update().filter(id=factura_id).first()
+        pago.delete()  # Eliminar el pago
 
     return redirect("libros:pago_credito", factura_id)
 
@@ -461,28 +458,20 @@ def generar_pdf_credito(request, factura_id):
     p.drawString(50, y_position, "Historial de Pagos:")
     y_position -= 20  # Espaciado antes de la lista de pagos
 
-    # Variables para almacenar los totales
-    total_cuotas_pagadas = 0
-    total_entregas_cta = 0
-
-    ultimo_pago = factura.cuenta_corriente.order_by('-fecha_cuota').first()
-
     for pago in factura.cuenta_corriente.all():
         if pago.imp_cuota_pagadas > 0:  # Solo mostrar si es mayor a 0
             p.drawString(50, y_position, f"{pago.fecha_cuota} - {pago.descripcion} - Cuota Pagada:${pago.imp_cuota_pagadas}")
-            total_cuotas_pagadas += pago.imp_cuota_pagadas  # Acumulando la suma
             y_position -= 20
 
         if pago.entrega_cta > 0:  # Solo mostrar si es mayor a 0
             p.drawString(50, y_position, f"{pago.fecha_cuota} - Entrega a Cuenta: ${pago.entrega_cta}")
-            total_entregas_cta += pago.entrega_cta  # Acumulando la suma
             y_position -= 20
 
     # Espaciado antes de mostrar el total final
     y_position -= 20
 
-    # Calcular la suma total de Cuotas Pagadas + Entregas a Cuenta
-    total_pago_realizado = total_cuotas_pagadas + total_entregas_cta
+    # Total de Cuotas Pagadas + Entregas a Cuenta (columna de la factura)
+    total_pago_realizado = factura.total_pagado
 
     # ------------------Dibujar una línea horizontal antes del total ----------------------
     p.line(50, y_position, 400, y_position)
@@ -493,8 +482,8 @@ def generar_pdf_credito(request, factura_id):
     p.drawString(50, y_position, f"Total Pago Realizado: ${total_pago_realizado}")
     y_position -= 20  # Espaciado antes de mostrar el total restante
 
-    # Calcular el total restante a pagar
-    total_restante = factura.total_con_interes - total_pago_realizado
+    # Total restante a pagar
+    total_restante = factura.saldo
 
     # Dibujar una línea antes del total restante
     p.line(50, y_position, 400, y_position)
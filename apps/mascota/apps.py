@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class MascotaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.mascota'  # Asegúrate de que el path sea correcto
+
+    def ready(self):
+        from . import signals  # noqa: F401  (miniaturas de las fotos)
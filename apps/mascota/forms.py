@@ -1,5 +1,8 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from .models import Mascota
+from .imagenes import CAMPOS_MASCOTA, optimizar, verificar_cupo
 
 class MascotaForm(forms.ModelForm):
     dni_usuario = forms.CharField(max_length=15, required=True, label="DNI del Titular")
@@ -7,6 +10,31 @@ class MascotaForm(forms.ModelForm):
         model = Mascota
         fields = ['dni_usuario', 'nombre', 'edad', 'especie', 'descripcion', 'imagen', 'imagen1', 'imagen2', 'imagen3', 'imagen4', 'imagen5']
 
+    def clean(self):
+        # Las fotos nuevas se reducen/recomprimen acá, y con su tamaño final se controla el tope por mascota
+        cleaned_data = super().clean()
+        nuevas, reemplazadas = [], []
+        for campo in CAMPOS_MASCOTA:
+            valor = cleaned_data.get(campo)
+            anterior = getattr(self.instance, campo) if self.instance.pk else None
+            if isinstance(valor, UploadedFile):
+                try:
+                    cleaned_data[campo] = optimizar(valor)
+                except ValidationError as e:
+                    self.add_error(campo, e)
+                    continue
+                nuevas.append(cleaned_data[campo])
+            elif valor is not False:
+                continue  # sin cambios
+            if anterior:
+                reemplazadas.append(anterior)
+        if nuevas:
+            try:
+                verificar_cupo(self.instance, nuevas, reemplazadas)
+            except ValidationError as e:
+                self.add_error(None, e)
+        return cleaned_data
+
 
 #----------------------------------------------------------------------------------------
 
@@ -20,3 +48,16 @@ class InformeForm(forms.ModelForm):
         widgets = {
             'informe': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),  # Cambia la altura
         }
+
+    def __init__(self, *args, mascota=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # para el tope de bytes: la mascota del informe (en uno nuevo la vista la asigna después)
+        self.mascota = mascota or getattr(self.instance, 'mascota', None)
+
+    def clean_foto_imagen(self):
+        foto = self.cleaned_data.get('foto_imagen')
+        if isinstance(foto, UploadedFile):
+            foto = optimizar(foto)
+            anterior = self.instance.foto_imagen if self.instance.pk else None
+            verificar_cupo(self.mascota, [foto], [anterior] if anterior else [])
+        return foto
@@ -0,0 +1,162 @@
+#-------------------- Imágenes subidas: mascotas, informes y usuarios ------------------------------------#
+# Todo lo que se sube (las 6 fotos de Mascota, la foto del informe que manda la cámara y la
+# imagen de perfil del usuario) pasa por optimizar(): se reduce a un lado máximo, se aplica la
+# orientación EXIF y se recomprime a JPEG sin metadatos. Las fotos de la mascota además tienen
+# miniaturas para las tarjetas (prueba1/miniaturas.py, en la cola de trabajos como las de producto)
+# y hay un tope de bytes guardados por mascota (fotos + fotos de sus informes).
+import base64
+import binascii
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from apps.CarritoApp.trabajos import encolar, procesador
+from prueba1 import miniaturas
+
+MAX_LADO = getattr(settings, 'MASCOTAS_IMG_MAX_LADO', 1600)
+CALIDAD = getattr(settings, 'MASCOTAS_IMG_CALIDAD', 82)
+MAX_BYTES_MASCOTA = getattr(settings, 'MASCOTAS_MAX_MB_POR_MASCOTA', 20) * 1024 * 1024  # 0 = sin tope
+CAMPOS_MASCOTA = ('imagen', 'imagen1', 'imagen2', 'imagen3', 'imagen4', 'imagen5')
+ANCHOS_MINIATURA = (240, 480)  # tarjetas de lista_mascotas / detalle_mascota
+BLOQUE_BASE64 = 256 * 1024     # caracteres por bloque al decodificar (múltiplo de 4)
+
+
+def optimizar(archivo, max_lado=MAX_LADO, calidad=CALIDAD):
+    """
+    ContentFile .jpg con la imagen reducida (nunca agrandada) a max_lado, la rotación EXIF ya
+    aplicada y sin metadatos (GPS, cámara). Lo transparente queda sobre fondo blanco.
+    Un JPEG que ya entra en max_lado y no trae EXIF se guarda tal cual (no se recomprime).
+    """
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    try:
+        with Image.open(archivo) as original:
+            formato = original.format
+            original.draft('RGB', (max_lado, max_lado))  # los JPEG grandes se decodifican ya reducidos
+            imagen = ImageOps.exif_transpose(original)
+            imagen.load()
+            sin_metadatos = 'exif' not in original.info
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValidationError('El archivo no es una imagen válida.') from e
+
+    nombre = os.path.splitext(os.path.basename(getattr(archivo, 'name', None) or 'imagen'))[0] + '.jpg'
+    if formato == 'JPEG' and sin_metadatos and max(imagen.size) <= max_lado:
+        archivo.seek(0)
+        return ContentFile(archivo.read(), name=nombre)
+
+    icc = imagen.info.get('icc_profile')
+    if imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info):
+        con_alfa = imagen.convert('RGBA')
+        imagen = Image.new('RGB', con_alfa.size, 'white')
+        imagen.paste(con_alfa, mask=con_alfa.getchannel('A'))
+    elif imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    imagen.thumbnail((max_lado, max_lado), Image.LANCZOS)
+
+    salida = io.BytesIO()
+    imagen.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True, icc_profile=icc)
+    return ContentFile(salida.getvalue(), name=nombre)
+
+
+def decodificar_base64(texto, max_bytes=None):
+    """
+    Data URL de la cámara (data:image/...;base64,...) a un archivo temporal, decodificando de a
+    bloques: no se arma otra copia del texto ni de la imagen entera en memoria (pasa a disco
+    después de 1 MB). ValidationError si no es una data URL de imagen o pasa max_bytes.
+    """
+    separador = ';base64,'
+    inicio = texto.find(separador) if texto else -1
+    if inicio < 0 or not texto.startswith('data:image/'):
+        raise ValidationError('La foto recibida no es válida.')
+    inicio += len(separador)
+    if max_bytes and (len(texto) - inicio) * 3 // 4 > max_bytes:
+        raise ValidationError('La foto es demasiado grande.')
+
+    destino = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    try:
+        for posicion in range(inicio, len(texto), BLOQUE_BASE64):
+            destino.write(base64.b64decode(texto[posicion:posicion + BLOQUE_BASE64], validate=True))
+    except (binascii.Error, ValueError) as e:
+        destino.close()
+        raise ValidationError('La foto recibida no es válida.') from e
+    destino.seek(0)
+    return File(destino, name='foto')
+
+
+#-------------------- Tope de bytes por mascota ------------------------------------#
+def _tamano(archivo):
+    # solo archivos ya guardados; uno recién asignado todavía no ocupa lugar
+    if not archivo or not getattr(archivo, '_committed', True):
+        return 0
+    try:
+        return archivo.size
+    except OSError:
+        return 0
+
+
+def bytes_guardados(mascota):
+    """Bytes de las fotos de la mascota y de las de sus informes (un stat por archivo, solo al subir)."""
+    archivos = [getattr(mascota, campo) for campo in CAMPOS_MASCOTA]
+    if mascota.pk:
+        archivos += [informe.foto_imagen for informe in mascota.informe_set.exclude(foto_imagen='').only('foto_imagen')]
+    return sum(_tamano(archivo) for archivo in archivos)
+
+
+def verificar_cupo(mascota, nuevos, reemplazados=()):
+    """ValidationError si guardar `nuevos` en lugar de `reemplazados` pasa MAX_BYTES_MASCOTA."""
+    if not MAX_BYTES_MASCOTA or mascota is None:
+        return
+    total = (bytes_guardados(mascota)
+             - sum(_tamano(archivo) for archivo in reemplazados)
+             + sum(archivo.size for archivo in nuevos))
+    if total > MAX_BYTES_MASCOTA:
+        raise ValidationError(
+            f'Las fotos de {mascota.nombre or "la mascota"} superarían el máximo de '
+            f'{MAX_BYTES_MASCOTA // (1024 * 1024)} MB. Borrá alguna antes de subir otra.'
+        )
+
+
+#-------------------- Miniaturas de las tarjetas ------------------------------------#
+# Mascota.save no las genera: la señal de signals.py encola un trabajo al confirmar la
+# transacción y lo procesa `manage.py procesar_trabajos`; mientras tanto se ve el original.
+def miniaturas_desactualizadas(mascota):
+    """True si hay fotos sin miniaturas o miniaturas de fotos reemplazadas o quitadas."""
+    return bool(miniaturas.pendientes(mascota, CAMPOS_MASCOTA)) or miniaturas.vencidas(mascota)
+
+
+def actualizar_miniaturas(mascota):
+    """Genera las miniaturas de las fotos nuevas y borra las de fotos reemplazadas o quitadas."""
+    resultados = {}
+    for campo, nombre in miniaturas.pendientes(mascota, CAMPOS_MASCOTA):
+        try:
+            resultados[campo] = miniaturas.generar(nombre, ANCHOS_MINIATURA)
+        except (FileNotFoundError, UnidentifiedImageError, OSError):
+            continue  # sin miniatura la tarjeta muestra el original
+    mascota.miniaturas, _ = miniaturas.guardar_resultados(type(mascota), mascota.pk, resultados, CAMPOS_MASCOTA)
+    return mascota.miniaturas
+
+
+def encolar_miniaturas(mascota):
+    if not miniaturas_desactualizadas(mascota):
+        return None
+    # la clave incluye los nombres: si se cambia otra foto mientras corre, se encola de nuevo
+    nombres = '|'.join(getattr(mascota, campo).name or '' for campo in CAMPOS_MASCOTA)
+    huella = hashlib.sha1(nombres.encode('utf-8')).hexdigest()[:16]
+    return encolar('miniaturas_mascota', {'mascota_id': mascota.pk}, clave=f'miniaturas_mascota:{mascota.pk}:{huella}')
+
+
+@procesador('miniaturas_mascota')
+def _miniaturas_mascota(trabajo):
+    from .models import Mascota
+
+    mascota = Mascota.objects.filter(pk=trabajo.parametros['mascota_id']).first()
+    if mascota is not None:
+        actualizar_miniaturas(mascota)
+    return ''
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.11 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mascota', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mascota',
+            name='miniaturas',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
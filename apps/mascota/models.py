@@ -14,6 +14,8 @@ class Mascota(models.Model):
     imagen3 = models.ImageField(upload_to='mascotas/', blank=True, null=True)
     imagen4 = models.ImageField(upload_to='mascotas/', blank=True, null=True)
     imagen5 = models.ImageField(upload_to='mascotas/', blank=True, null=True)  
+    # Miniaturas de las fotos para las tarjetas (ver imagenes.py): {campo: {"nombre", "anchos", "webp"}}
+    miniaturas = models.JSONField(default=dict, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
         # Asegurar que el dni_usuario siempre sea igual al del usuario relacionado
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from prueba1.miniaturas import borrar_miniaturas
+from . import imagenes
+from .models import Mascota
+
+# ----------------- Miniaturas de las fotos -----------------
+# Si cambió alguna foto se encolan sus miniaturas (ver imagenes.py); al borrar la mascota se van con ella
+
+@receiver(post_save, sender=Mascota)
+def miniaturas_mascota(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if imagenes.miniaturas_desactualizadas(instance):
+        transaction.on_commit(lambda: imagenes.encolar_miniaturas(instance))
+
+
+@receiver(post_delete, sender=Mascota)
+def borrar_miniaturas_mascota(sender, instance, **kwargs):
+    for datos in (instance.miniaturas or {}).values():
+        borrar_miniaturas(datos)
@@ -1,3 +1,75 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from apps.CarritoApp import trabajos
+from apps.CarritoApp.models import TrabajoRender
+from prueba1.miniaturas import ruta_miniatura
+
+from .models import Mascota
+
+
+def foto_jpeg(ancho=800, alto=600):
+    salida = io.BytesIO()
+    Image.new('RGB', (ancho, alto), 'orange').save(salida, 'JPEG')
+    return ContentFile(salida.getvalue(), name='firulais.jpg')
+
+
+#-------------------- Miniaturas de las fotos ------------------------------------#
+class MiniaturasMascotaTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        medios = override_settings(MEDIA_ROOT=carpeta)
+        medios.enable()
+        self.addCleanup(medios.disable)
+
+    def crear_mascota(self):
+        mascota = Mascota(nombre='Firulais', edad=3, especie='Perro', descripcion='Manchado')
+        mascota.imagen.save('firulais.jpg', foto_jpeg(), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            mascota.save()
+        return mascota
+
+    def procesar_pendientes(self):
+        while (trabajo := trabajos.tomar_siguiente()) is not None:
+            trabajos.procesar(trabajo)
+
+    def test_guardar_encola_las_miniaturas_sin_generarlas(self):
+        mascota = self.crear_mascota()
+
+        trabajo = TrabajoRender.objects.get(tipo='miniaturas_mascota')
+        self.assertEqual(trabajo.parametros, {'mascota_id': mascota.pk})
+        mascota.refresh_from_db()
+        self.assertEqual(mascota.miniaturas, {})
+
+    def test_el_trabajo_genera_las_miniaturas_en_el_storage(self):
+        mascota = self.crear_mascota()
+        self.procesar_pendientes()
+
+        mascota.refresh_from_db()
+        datos = mascota.miniaturas['imagen']
+        self.assertEqual(datos['nombre'], mascota.imagen.name)
+        self.assertEqual(datos['anchos'], [240, 480])
+        for ancho in datos['anchos']:
+            self.assertTrue(default_storage.exists(ruta_miniatura(mascota.imagen.name, ancho, 'jpg')))
+
+    def test_quitar_la_foto_borra_sus_miniaturas(self):
+        mascota = self.crear_mascota()
+        self.procesar_pendientes()
+        mascota.refresh_from_db()
+        nombre = mascota.imagen.name
+
+        mascota.imagen = None
+        with self.captureOnCommitCallbacks(execute=True):
+            mascota.save()
+        self.procesar_pendientes()
+
+        mascota.refresh_from_db()
+        self.assertEqual(mascota.miniaturas, {})
+        self.assertFalse(default_storage.exists(ruta_miniatura(nombre, 240, 'jpg')))
@@ -172,7 +172,7 @@ from django.contrib.auth.decorators import login_required
 def agregar_informe(request, pk):
     mascota = get_object_or_404(Mascota, pk=pk)
     if request.method == 'POST':
-        form = InformeForm(request.POST, request.FILES)
+        form = InformeForm(request.POST, request.FILES, mascota=mascota)
         if form.is_valid():
             informe = form.save(commit=False)
             informe.usuario = request.user  # Asignamos el usuario actual
@@ -217,7 +217,7 @@ def gestionar_informe(request, mascota_id, informe_id=None):
         informe = None
 
     if request.method == 'POST':
-        form = InformeForm(request.POST, request.FILES, instance=informe)
+        form = InformeForm(request.POST, request.FILES, instance=informe, mascota=mascota)
         if form.is_valid():
             informe = form.save(commit=False)
             informe.usuario = request.user
@@ -262,26 +262,37 @@ def tomar_foto(request, informe_id):
     return render(request, 'mascota/tomar_foto.html', {'informe': informe})  # ✅ Pasa informe al template
 
 #------------------------------------------------------------------------
-import base64
-from django.core.files.base import ContentFile
+from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from .models import Informe
+from .imagenes import decodificar_base64, optimizar, verificar_cupo
+
+MAX_BYTES_FOTO = 20 * 1024 * 1024  # foto cruda de la cámara, antes de optimizar
 
 @login_required  # Asegura que el usuario esté autenticado
 def guardar_foto(request, informe_id):
     if request.method == 'POST':
+        # tomar_foto.html manda la captura como archivo (llega en streaming al disco); la
+        # data URL en base64 queda para navegadores viejos
+        archivo = request.FILES.get('foto_archivo')
         foto_data = request.POST.get('foto')  # Obtener la imagen en base64
-        if foto_data:
-            format, imgstr = foto_data.split(';base64,')
-            ext = format.split('/')[-1]  # Extrae la extensión del archivo
-            data = ContentFile(base64.b64decode(imgstr), name=f"foto.{ext}")
-
+        if archivo or foto_data:
             # Obtener el informe correspondiente
             informe = get_object_or_404(Informe, id=informe_id)
+            try:
+                if archivo is None:
+                    archivo = decodificar_base64(foto_data, max_bytes=MAX_BYTES_FOTO)
+                foto = optimizar(archivo)
+                anterior = [informe.foto_imagen] if informe.foto_imagen else []
+                verificar_cupo(informe.mascota, [foto], anterior)
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+                return redirect('mascota:detalle_mascota', pk=informe.mascota.id)
 
             # Asignar la imagen al informe existente
-            informe.foto_imagen = data
+            informe.foto_imagen = foto
             informe.save()
 
             return redirect('mascota:detalle_mascota', pk=informe.mascota.id)  # Redirige después de guardar
@@ -18,6 +18,7 @@ urlpatterns = [
     #path('prueba/', views.prueba, name='prueba'),
     # Rutas relacionadas con mercadería
     path('buscar-mercaderia/', views.buscar_mercaderia, name='buscar_mercaderia'), 
+    path('api/catalogo/', views.catalogo_caja, name='catalogo_caja'),
     path('guardar-prueba/', views.guardar_prueba, name='guardar_prueba'),
     path('factura/<int:factura_id>/mostrar/', views.mostrar_factura_con_botones, name='mostrar_factura_con_botones'),
     path('factura/<int:factura_id>/pdf/', views.mostrar_factura_con_botones, name='generar_factura_pdf'),
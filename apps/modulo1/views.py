@@ -3,10 +3,11 @@ from django.shortcuts import render
 #from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
 from datetime import date, datetime
-from apps.CarritoApp.models import Factura, MetodoPago
+from apps.CarritoApp.models import Factura, MetodoPago, FacturaProducto, generar_numero_factura, ver_proximo_numero_factura
 from django.contrib import messages
 from django.contrib.messages import get_messages
 from django.contrib.auth.decorators import login_required, permission_required
+from apps.blog_auth import clientes
 
 User = get_user_model()   # ✅ PONER ACÁ (arriba de la vista)
 @login_required
@@ -24,18 +25,8 @@ def prueba(request):
     domicilio_usuario = ""
     cuil = ""
     iva = ""
-    numero_factura = None
-
-    try:
-        # Obtener la última factura y calcular el nuevo número
-        ultima_factura = Factura.objects.order_by('-numero_factura').first()
-        if ultima_factura and ultima_factura.numero_factura.isdigit():
-            numero_factura = str(int(ultima_factura.numero_factura) + 1).zfill(5)
-        else:
-            numero_factura = "00001"
-    except Exception as e:
-        print(f"Error al obtener el número de factura: {e}")
-        numero_factura = "00001"
+    # Próximo número de factura (solo para mostrar; se reserva al guardar)
+    numero_factura = ver_proximo_numero_factura()
 
     # Limpiar mensajes previos antes de agregar uno nuevo
     storage = get_messages(request)
@@ -47,7 +38,9 @@ def prueba(request):
 
         try:
             # Buscar el usuario por DNI
-            user = User.objects.get(dni_usuario=dni_usuario)
+            user = clientes.usuario_por_dni(dni_usuario)
+            if user is None:
+                raise User.DoesNotExist
             first_name = user.first_name
             last_name = user.last_name
             tel1_usuario = getattr(user, 'tel1_usuario', "No registrado")
@@ -97,17 +90,16 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+from apps.blog_auth import clientes
+
 @require_GET
 def buscar_clientes(request):
     q = request.GET.get('q', '').strip()
     if not q:
         return JsonResponse([], safe=False)
 
-    usuarios = User.objects.filter(
-        Q(first_name__icontains=q) |
-        Q(last_name__icontains=q) |
-        Q(dni_usuario__icontains=q)
-    )[:10]
+    # DNI por prefijo o cada palabra como comienzo de apellido / nombre (índice de blog_auth/clientes.py)
+    usuarios = clientes.buscar(q, 10)
 
     resultados = [{
         'first_name': u.first_name,
@@ -128,6 +120,7 @@ from django.shortcuts import render
 from datetime import date
 from django.http import HttpResponse, JsonResponse
 from apps.CarritoApp.models import Producto
+from apps.CarritoApp.busqueda import buscar
 
 def buscar_mercaderia(request):
     numero_producto = request.GET.get('numero_producto')
@@ -142,13 +135,10 @@ def buscar_mercaderia(request):
                 'precio': str(producto.precio),
             })
         elif nombre_producto:
-            productos = Producto.objects.filter(nombre_producto__icontains=nombre_producto)[:10]
+            # Índice de búsqueda (CarritoApp/busqueda.py): sin acentos, ordenado por relevancia
+            productos = buscar(nombre_producto, 10, campos=('numero_producto', 'nombre_producto', 'precio'))
             productos_list = [
-                {
-                    'numero_producto': producto.numero_producto,
-                    'nombre_producto': producto.nombre_producto,
-                    'precio': str(producto.precio),  # Agregado precio para consistencia
-                }
+                {**producto, 'precio': str(producto['precio'])}  # Agregado precio para consistencia
                 for producto in productos
             ]
             # Devolver una lista sin la clave 'productos'
@@ -160,6 +150,31 @@ def buscar_mercaderia(request):
 #--------------fin de Buscar Mercaderia------------------------------------------------------
 
 
+#--------------Catálogo de la caja (versionado)------------------------------------------------------
+# GET sin parámetros: catálogo completo. GET ?desde=<version>: solo lo que cambió desde esa versión.
+# {"version": n, "completo": bool, "campos": [...], "productos": [[id, numero, nombre, precio, stock]], "borrados": [ids]}
+from django.contrib.auth.decorators import login_required, permission_required
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from apps.CarritoApp import catalogo
+
+@require_GET
+@login_required
+@permission_required('CarritoApp.add_factura', raise_exception=True)
+def catalogo_caja(request):
+    try:
+        desde = int(request.GET.get('desde', ''))
+    except ValueError:
+        desde = None
+    datos = catalogo.cambios(desde) if desde is not None and desde >= 0 else None
+    if datos is None:  # primera carga, o una versión que no es de esta base
+        response = HttpResponse(catalogo.completo(), content_type='application/json')
+    else:
+        response = JsonResponse(datos)
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 
 
 #--------------Crear Factura Modulo1---------------------
@@ -171,27 +186,8 @@ def crear_factura(request):
     # Obtener la fecha actual
     fecha_actual = date.today().strftime('%d/%m/%Y')
 
-    # Inicializar el número de factura
-    numero_factura = None
-
-    try:
-        # Obtener la última factura
-        ultima_factura = Factura.objects.order_by('-numero_factura').first()
-        
-        if ultima_factura:
-            # Validar que el número de factura sea un número válido
-            if ultima_factura.numero_factura and ultima_factura.numero_factura.isdigit():
-                numero_factura = str(int(ultima_factura.numero_factura) + 1).zfill(5)
-            else:
-                # Si el número no es válido, comenzar desde "00001"
-                print(f"Número de factura inválido: {ultima_factura.numero_factura}")
-                numero_factura = "00001"
-        else:
-            # Si no hay facturas en la base de datos, comenzar desde "00001"
-            numero_factura = "00001"
-    except Exception as e:
-        print(f"Error al obtener el número de factura: {e}")
-        numero_factura = "00001"
+    # Próximo número de factura (solo para mostrar; se reserva al guardar)
+    numero_factura = ver_proximo_numero_factura()
 
     # Imprimir para verificar valores
     print("Fecha actual:", fecha_actual)
@@ -213,17 +209,21 @@ from django.db import transaction, IntegrityError
 #from apps.CarritoApp.models import Factura, Producto, MetodoPago
 from django.core.exceptions import FieldDoesNotExist
 from django.contrib.auth.decorators import login_required
+from apps.CarritoApp.stock import descontar_stock, StockInsuficiente
 
 
 def _get_user_by_dni(User, dni: str):
     """
-    Busca usuario por dni_usuario si existe, sino por dni.
+    Busca usuario por dni_usuario (índice de clientes) si existe, sino por dni.
     """
     try:
         User._meta.get_field('dni_usuario')
-        return User.objects.get(dni_usuario=dni)
     except FieldDoesNotExist:
         return User.objects.get(dni=dni)
+    user = clientes.usuario_por_dni(dni)
+    if user is None:
+        raise User.DoesNotExist
+    return user
 
 #@csrf_exempt
 @login_required
@@ -277,6 +277,13 @@ def guardar_prueba(request):
                 status=400
             )
 
+        # Un solo SELECT para todos los productos; el stock se valida al descontarlo (paso 5)
+        numeros = [d.get('numero_producto') for d in detalle_productos]
+        productos = {
+            str(p.numero_producto): p
+            for p in Producto.objects.filter(numero_producto__in=[n for n in numeros if str(n or '').isdigit()])
+        }
+        lineas_stock = []
         for detalle in detalle_productos:
             numero_producto = detalle.get('numero_producto')
             try:
@@ -284,13 +291,12 @@ def guardar_prueba(request):
             except (TypeError, ValueError):
                 return JsonResponse({'error': 'Cantidad vendida inválida.'}, status=400)
 
-            try:
-                producto = Producto.objects.get(numero_producto=numero_producto)
-            except Producto.DoesNotExist:
+            producto = productos.get(str(numero_producto))
+            if producto is None:
                 return JsonResponse({'error': f'Producto con número {numero_producto} no encontrado.'}, status=400)
 
-            if producto.stock < cantidad_vendida:
-                return JsonResponse({'error': f'Stock insuficiente para el producto {producto.nombre_producto}.'}, status=400)
+            detalle['producto_id'] = producto.id
+            lineas_stock.append((producto.id, cantidad_vendida))
 
         # -------------------------------
         # 3) TOTAL CON INTERÉS
@@ -321,7 +327,16 @@ def guardar_prueba(request):
         # 5) CREAR FACTURA + DESCONTAR STOCK
         # -------------------------------
         with transaction.atomic():
+            # El número de factura primero (mismo orden de bloqueo que pagos_mp.facturar)
+            numero_factura = generar_numero_factura()
+            try:
+                descontar_stock(lineas_stock)
+            except StockInsuficiente as e:
+                transaction.set_rollback(True)  # el número vuelve a quedar libre
+                return JsonResponse({'error': str(e), 'faltantes': e.faltantes}, status=400)
+
             nueva_factura = Factura.objects.create(
+                numero_factura=numero_factura,
                 fecha=data.get('fecha'),
                 dni_cliente=dni_resuelto,
 
@@ -350,15 +365,8 @@ def guardar_prueba(request):
                 numero_tiket=data.get('numero_tiket', None),
             )
 
-            nueva_factura.numero_factura = str(nueva_factura.id).zfill(5)
-            nueva_factura.save(update_fields=['numero_factura'])
-
-            for detalle in detalle_productos:
-                numero_producto = detalle.get('numero_producto')
-                cantidad_vendida = float(detalle.get('cantidad_vendida') or 0)
-                producto = Producto.objects.get(numero_producto=numero_producto)
-                producto.stock -= cantidad_vendida
-                producto.save(update_fields=['stock'])
+            # Líneas normalizadas para los reportes (balance, stock, vendidos)
+            FacturaProducto.crear_desde_detalle(nueva_factura, detalle_productos)
 
         url_resumen = reverse('CarritoApp:resumen_factura', args=[nueva_factura.id])
         return JsonResponse({'redirect': url_resumen})
@@ -533,51 +541,56 @@ from django.http import FileResponse
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from apps.CarritoApp.models import Factura
+from apps.CarritoApp.pdf_cache import respuesta_pdf
 import os, json
 from reportlab.pdfgen import canvas
 
 def vista_prueba_pdf(request, factura_id):
-    factura = get_object_or_404(Factura, id=factura_id)
-    ruta_carpeta = os.path.join(settings.MEDIA_ROOT, 'facturas')
-    os.makedirs(ruta_carpeta, exist_ok=True)
+    factura = get_object_or_404(Factura.objects.select_related('metodo_pago'), id=factura_id)
 
     print("🔴 Vista PRUEBA PDF ACTIVADA")
-    nombre_pdf = f"factura_{factura.id}.pdf"
-    ruta_pdf = os.path.join(ruta_carpeta, nombre_pdf)
+    # Mismo cache que las vistas de CarritoApp: se regenera cuando cambia la factura
+    return respuesta_pdf(request, factura, 'prueba', _dibujar_prueba_pdf, f"factura_{factura.id}.pdf")
 
-    if not os.path.exists(ruta_pdf):
-        
-        pdf.drawString(100, y, f"Factura N°:vista_prueba_pdf {factura.numero_factura}")
-        y -= 20
-        pdf.setFont("Helvetica", 12)
-        pdf.drawString(100, y, f"Fecha: {factura.fecha}")
-        y -= 20
-        pdf.drawString(100, y, f"Cliente: {factura.nombre_cliente} {factura.apellido_cliente}")
-        y -= 20
-        pdf.drawString(100, y, f"DNI: {factura.dni_cliente}")
-        y -= 20
-        pdf.drawString(100, y, f"Vendedor: {factura.vendedor}")
-        y -= 20
-        pdf.drawString(100, y, f"Método de Pago: {factura.metodo_pago}")
-        y -= 20
-        pdf.drawString(100, y, f"Número de Ticket: {factura.numero_tiket or '-'}")
-
-        y -= 130
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(100, y, "Productos:")
-        y -= 20
-        pdf.setFont("Helvetica", 10)
 
-        for producto in productos:
-            pdf.drawString(110, y, f"{producto['nombre_producto']} x {producto['cantidad_vendida']} - ${producto['subtotal']}")
-            y -= 20
+def _dibujar_prueba_pdf(factura, ruta_pdf):
+    try:
+        productos = json.loads(factura.detalle_productos or "[]")
+    except json.JSONDecodeError:
+        productos = []
 
-        y -= 10
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(100, y, f"Total: ${factura.total}")
-        pdf.save()
+    pdf = canvas.Canvas(ruta_pdf)
+    y = 800
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(100, y, f"Factura N°:vista_prueba_pdf {factura.numero_factura}")
+    y -= 20
+    pdf.setFont("Helvetica", 12)
+    pdf.drawString(100, y, f"Fecha: {factura.fecha}")
+    y -= 20
+    pdf.drawString(100, y, f"Cliente: {factura.nombre_cliente} {factura.apellido_cliente}")
+    y -= 20
+    pdf.drawString(100, y, f"DNI: {factura.dni_cliente}")
+    y -= 20
+    pdf.drawString(100, y, f"Vendedor: {factura.vendedor}")
+    y -= 20
+    pdf.drawString(100, y, f"Método de Pago: {factura.metodo_pago}")
+    y -= 20
+    pdf.drawString(100, y, f"Número de Ticket: {factura.numero_tiket or '-'}")
+
+    y -= 130
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(100, y, "Productos:")
+    y -= 20
+    pdf.setFont("Helvetica", 10)
+
+    for producto in productos:
+        pdf.drawString(110, y, f"{producto['nombre_producto']} x {producto['cantidad_vendida']} - ${producto['subtotal']}")
+        y -= 20
 
-    return FileResponse(open(ruta_pdf, 'rb'), content_type='application/pdf')
+    y -= 10
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(100, y, f"Total: ${factura.total}")
+    pdf.save()
 #----------------------------------------------------------------------------------
 from django.template.loader import get_template
 from django.http import HttpResponse
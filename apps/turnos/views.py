@@ -47,6 +47,7 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from urllib.parse import urlencode
 from django.db.models import Q
+from apps.blog_auth.clientes import usuario_por_dni
 
 User = get_user_model()
 
@@ -65,9 +66,8 @@ def paso1_dni(request):
 
             if accion == "aceptar":
                 # ✅ ACÁ "encontrás el cliente"
-                cliente = User.objects.filter(
-                    Q(dni_usuario=str(dni)) | Q(username=str(dni))
-                ).first()
+                # DNI por el índice de clientes; si no, el username (registro por DNI)
+                cliente = usuario_por_dni(dni) or User.objects.filter(username=str(dni)).first()
 
                 if not cliente:
                     params = urlencode({"dni": dni, "next": reverse("turnos:paso1_dni")})
@@ -4,6 +4,7 @@ cd /root/Vete1
 source .venv/bin/activate
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
 deactivate
 sudo systemctl restart gunicorn
 sudo systemctl reload nginx
@@ -0,0 +1,71 @@
+#-------------------- Cache compartido con espacios de nombres ------------------------------------#
+# settings.CACHES apunta a un backend que ven todos los workers (archivos, base, Redis o memcached),
+# así lo que invalida un proceso lo ven los demás. Las claves se arman como
+# "<espacio>:v<version>:<partes>"; invalidar un espacio entero es subir su versión (la clave
+# "<espacio>:version", sin vencimiento): las entradas viejas ya no se leen y vencen solas.
+# Uso:
+#     from prueba1 import cache as cache_compartido
+#     datos = cache_compartido.obtener('tienda', ('pagina', 1), lambda: armar(...), 600, grupo=('categoria', 3))
+#     cache_compartido.invalidar('tienda', 'categoria', 3)   # solo las páginas de esa categoría
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_AUSENTE = object()
+
+
+def _texto(partes):
+    crudo = ':'.join(str(parte) for parte in partes)
+    # memcached no acepta espacios ni claves de más de 250 caracteres
+    if len(crudo) > 150 or any(c.isspace() for c in crudo):
+        return hashlib.sha1(crudo.encode('utf-8')).hexdigest()
+    return crudo
+
+
+def _clave_version(espacio, grupo):
+    return f'{espacio}:version' + (f':{_texto(grupo)}' if grupo else '')
+
+
+def version(espacio, *grupo):
+    """
+    Versión actual del espacio (o de un grupo dentro del espacio, ej. una categoría).
+    Arranca en la hora actual y no en 1: si el backend perdió el contador (reinicio, limpieza),
+    el nuevo valor nunca coincide con uno viejo y no revive entradas que ya se habían invalidado.
+    """
+    clave = _clave_version(espacio, grupo)
+    valor = cache.get(clave)
+    if valor is None:
+        cache.add(clave, int(time.time() * 1000), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def invalidar(espacio, *grupo):
+    """Invalida todas las claves del espacio (o del grupo) en todos los procesos."""
+    clave = _clave_version(espacio, grupo)
+    try:
+        cache.incr(clave)
+    except ValueError:  # no existía: cualquier valor nuevo ya invalida
+        cache.set(clave, int(time.time() * 1000), None)
+
+
+def clave(espacio, partes=(), grupo=()):
+    """Clave completa, con la versión del espacio y, si se pasa, la del grupo."""
+    versiones = f'v{version(espacio)}' + (f'.{version(espacio, *grupo)}' if grupo else '')
+    return f'{espacio}:{versiones}:{_texto(partes)}'
+
+
+def obtener(espacio, partes, calcular, timeout=DEFAULT_TIMEOUT, grupo=()):
+    """Valor cacheado o `calcular()`, que se guarda por `timeout` segundos (por defecto el de settings)."""
+    nombre = clave(espacio, partes, grupo)
+    valor = cache.get(nombre, _AUSENTE)
+    if valor is _AUSENTE:
+        valor = calcular()
+        cache.set(nombre, valor, timeout)
+    return valor
+
+
+def borrar(espacio, partes=(), grupo=()):
+    cache.delete(clave(espacio, partes, grupo))
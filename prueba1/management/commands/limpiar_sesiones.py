@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.CarritoApp.models import CarritoCompra
+
+
+class Command(BaseCommand):
+    help = ('Borra de a lotes las sesiones vencidas de django_session (clearsessions hace un solo DELETE '
+            'que bloquea la tabla en MySQL), los archivos vencidos del cache de sesiones (CACHE_BACKEND=archivos) '
+            'y los carritos de visitantes cuya sesión ya venció. Pensado para cron, ej. una vez por noche.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por DELETE (default 1000)')
+        parser.add_argument('--pausa', type=float, default=0.1,
+                            help='Segundos entre lotes, para no acaparar la base (default 0.1)')
+        parser.add_argument('--sin-carritos', action='store_true', help='No borrar carritos de visitantes')
+
+    def _borrar_de_a_lotes(self, qs, campo, lote, pausa):
+        total = 0
+        while True:
+            claves = list(qs.values_list(campo, flat=True)[:lote])
+            if not claves:
+                return total
+            total += qs.model.objects.filter(**{f'{campo}__in': claves}).delete()[0]
+            if len(claves) < lote:
+                return total
+            time.sleep(pausa)
+
+    def _borrar_archivos_vencidos(self, cache_sesiones):
+        # El backend de archivos borra una entrada vencida solo cuando alguien la lee; las de
+        # visitantes que no vuelven quedan y cuentan para MAX_ENTRIES
+        total = 0
+        for ruta in cache_sesiones._list_cache_files():
+            try:
+                with open(ruta, 'rb') as archivo:
+                    total += cache_sesiones._is_expired(archivo)
+            except FileNotFoundError:  # lo borró otro proceso
+                continue
+        return total
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        ahora = timezone.now()
+
+        vencidas = Session.objects.filter(expire_date__lt=ahora).order_by('expire_date')
+        sesiones = self._borrar_de_a_lotes(vencidas, 'session_key', lote, options['pausa'])
+        self.stdout.write(f'Sesiones vencidas borradas: {sesiones}')
+
+        cache_sesiones = caches[settings.SESSION_CACHE_ALIAS]
+        if isinstance(cache_sesiones, FileBasedCache):
+            archivos = self._borrar_archivos_vencidos(cache_sesiones)
+            self.stdout.write(f'Archivos de sesión vencidos borrados: {archivos}')
+
+        if not options['sin_carritos']:
+            # La sesión del visitante (que tiene el id del carrito) vence SESSION_COOKIE_AGE después
+            # de su último cambio; un carrito sin tocar desde antes ya no lo puede abrir nadie
+            limite = ahora - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+            abandonados = CarritoCompra.objects.filter(usuario__isnull=True, actualizado__lt=limite).order_by('id')
+            carritos = self._borrar_de_a_lotes(abandonados, 'id', lote, options['pausa'])
+            self.stdout.write(f'Filas de carritos abandonados borradas (con sus ítems): {carritos}')
+
+        self.stdout.write(self.style.SUCCESS('Listo.'))
@@ -0,0 +1,130 @@
+#-------------------- Miniaturas de imágenes subidas ------------------------------------#
+# Lo común a las miniaturas de Producto (CarritoApp/miniaturas.py) y de Mascota (mascota/imagenes.py):
+# cada imagen se reduce a una lista de anchos, en WebP y en JPEG (para navegadores sin WebP), sin
+# los metadatos EXIF (GPS, cámara) y con la orientación ya aplicada. Se lee y se escribe solo por
+# default_storage, así funciona igual con el disco local que con un storage remoto.
+# Lo generado queda en el JSONField `miniaturas` del modelo: {campo: {"nombre", "anchos", "webp"}}
+# y el tag {% imagen_miniaturas %} (CarritoApp/templatetags/imagenes.py) arma el <picture>.
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+WEBP = features.check('webp')
+CALIDAD_WEBP = 80
+CALIDAD_JPEG = 82
+
+
+def ruta_miniatura(nombre, ancho, extension):
+    """
+    Ruta (relativa al storage) de la miniatura de `nombre`, en la subcarpeta miniaturas/ del
+    original (productos/miniaturas/, mascotas/miniaturas/); el hash evita choques entre foto.png y foto.jpg.
+    """
+    carpeta, archivo = os.path.split(nombre)
+    base = os.path.splitext(archivo)[0]
+    huella = hashlib.sha1(nombre.encode('utf-8')).hexdigest()[:8]
+    return f'{carpeta}/miniaturas/{base}-{huella}_{ancho}.{extension}'
+
+
+def _guardar(imagen, ruta, formato, forzar, **opciones):
+    if default_storage.exists(ruta):
+        if not forzar:
+            return
+        default_storage.delete(ruta)
+    # se codifica entera en memoria y se guarda de una vez
+    salida = io.BytesIO()
+    imagen.save(salida, formato, **opciones)
+    guardada = default_storage.save(ruta, ContentFile(salida.getvalue()))
+    if guardada != ruta:  # otro proceso la guardó mientras tanto: queda esa y no una copia renombrada
+        default_storage.delete(guardada)
+
+
+def generar(nombre, anchos, forzar=False):
+    """
+    Genera las miniaturas de un archivo del storage y devuelve lo que va en `miniaturas[campo]`.
+    No toca la base, así el backfill la puede correr en otros procesos.
+    """
+    anchos = tuple(sorted(anchos))
+    with default_storage.open(nombre, 'rb') as archivo:
+        with Image.open(io.BytesIO(archivo.read())) as original:
+            # los JPEG grandes se decodifican directo a una escala menor (mucho más rápido)
+            original.draft('RGB', (anchos[-1] * 2, anchos[-1] * 2))
+            imagen = ImageOps.exif_transpose(original)  # aplica la rotación antes de descartar el EXIF
+            imagen.load()
+
+    con_alfa = imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+    color = imagen.convert('RGBA' if con_alfa else 'RGB')
+    icc = imagen.info.get('icc_profile')  # el perfil de color sí se conserva
+
+    # Nunca se agranda: si la imagen es más chica que el menor ancho queda una sola, a su tamaño
+    anchos = [ancho for ancho in anchos if ancho < imagen.width] or [imagen.width]
+    for ancho in anchos:
+        alto = max(1, round(imagen.height * ancho / imagen.width))
+        chica = color if ancho == imagen.width else color.resize((ancho, alto), Image.LANCZOS)
+        if WEBP:
+            _guardar(chica, ruta_miniatura(nombre, ancho, 'webp'), 'WEBP', forzar,
+                     quality=CALIDAD_WEBP, method=4, icc_profile=icc)
+        if con_alfa:  # JPEG no tiene transparencia: fondo blanco como en la tienda
+            fondo = Image.new('RGB', chica.size, 'white')
+            fondo.paste(chica, mask=chica.getchannel('A'))
+            chica = fondo
+        _guardar(chica, ruta_miniatura(nombre, ancho, 'jpg'), 'JPEG', forzar,
+                 quality=CALIDAD_JPEG, optimize=True, progressive=True, icc_profile=icc)
+
+    return {'nombre': nombre, 'anchos': anchos, 'webp': WEBP}
+
+
+def borrar_miniaturas(datos):
+    for ancho in datos.get('anchos', []):
+        for extension in ('webp', 'jpg'):
+            default_storage.delete(ruta_miniatura(datos['nombre'], ancho, extension))
+
+
+def pendientes(objeto, campos, forzar=False):
+    """[(campo, nombre)] de las imágenes de `objeto` (en sus `campos`) sin miniaturas al día."""
+    faltan = []
+    for campo in campos:
+        nombre = getattr(objeto, campo).name
+        if nombre and (forzar or (objeto.miniaturas or {}).get(campo, {}).get('nombre') != nombre):
+            faltan.append((campo, nombre))
+    return faltan
+
+
+def vencidas(objeto):
+    """True si `miniaturas` tiene datos de una imagen que se reemplazó o se quitó."""
+    return any(getattr(objeto, campo).name != datos['nombre'] for campo, datos in (objeto.miniaturas or {}).items())
+
+
+def guardar_resultados(modelo, objeto_id, resultados, campos):
+    """
+    Registra en `miniaturas` lo generado ({campo: datos}) y borra las miniaturas de imágenes que
+    ya no están. Relee el registro: si una imagen cambió mientras se generaba, ese resultado se
+    descarta (el trabajo que encoló ese cambio lo va a rehacer).
+    Devuelve (miniaturas actuales, si cambiaron).
+    """
+    objeto = modelo.objects.filter(pk=objeto_id).first()
+    if objeto is None:
+        return {}, False
+    anteriores = dict(objeto.miniaturas or {})
+    actuales = {}
+    for campo in campos:
+        nombre = getattr(objeto, campo).name
+        if not nombre:
+            continue
+        for datos in (resultados.get(campo), anteriores.get(campo)):
+            if datos and datos['nombre'] == nombre:
+                actuales[campo] = datos
+                break
+
+    vigentes = {datos['nombre'] for datos in actuales.values()}
+    for datos in anteriores.values():
+        if datos['nombre'] not in vigentes:
+            borrar_miniaturas(datos)
+    if actuales == anteriores:
+        return actuales, False
+    # UPDATE directo: no vuelve a disparar la señal de post_save
+    modelo.objects.filter(pk=objeto_id).update(miniaturas=actuales)
+    return actuales, True
@@ -0,0 +1,89 @@
+#-------------------- Sesiones híbridas: cache para visitantes, base para usuarios ------------------------------------#
+# Con el motor de base cada visitante anónimo de la tienda (carrito, turno_wizard) escribe una fila en
+# django_session. Acá la sesión de un visitante vive en el cache compartido (SESSION_CACHE_ALIAS, ver
+# settings) y pasa a la base recién cuando hace falta que dure:
+#   - el usuario inició sesión (la sesión tiene _auth_user_id)
+#   - se marcó con persistir() (checkout de Mercado Pago: factura_datos no se puede perder)
+#   - los datos pasan de MAX_BYTES
+# Una vez en la base se queda ahí hasta que se borra (logout, flush). Las sesiones que ya estaban en la
+# base se siguen leyendo igual. Las filas vencidas se borran con `manage.py limpiar_sesiones`;
+# las del cache vencen solas.
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends import db
+from django.contrib.sessions.backends.base import CreateError
+from django.core.cache import caches
+
+PERSISTENTE = '_sesion_persistente'
+MAX_BYTES = getattr(settings, 'SESIONES_CACHE_MAX_BYTES', 4096)
+
+
+def persistir(session):
+    """Pasa la sesión a la base en el próximo guardado (y la deja ahí)."""
+    if not session.get(PERSISTENTE):
+        session[PERSISTENTE] = True
+
+
+class SessionStore(db.SessionStore):
+    cache_key_prefix = 'sesiones.visitantes.'
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._en_base = False
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _va_a_la_base(self, datos):
+        if self._en_base or SESSION_KEY in datos or datos.get(PERSISTENTE):
+            return True
+        return len(self.encode(datos)) > MAX_BYTES
+
+    def load(self):
+        try:
+            datos = self._cache.get(self.cache_key)
+        except Exception:  # memcached rechaza claves inválidas (como el backend cache de Django)
+            datos = None
+        if datos is not None:
+            self._en_base = False
+            return datos
+        datos = super().load()  # si tampoco está en la base deja session_key en None
+        self._en_base = self.session_key is not None
+        return datos
+
+    def exists(self, session_key):
+        if session_key and (self.cache_key_prefix + session_key) in self._cache:
+            return True
+        return super().exists(session_key)
+
+    def create(self):
+        self._en_base = False
+        super().create()
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        datos = self._get_session(no_load=must_create)
+        if self._va_a_la_base(datos):
+            # la primera vez es un INSERT aunque la sesión ya existiera en el cache
+            super().save(must_create=must_create or not self._en_base)
+            if not self._en_base:
+                self._en_base = True
+                self._cache.delete(self.cache_key)
+            return
+        if must_create:
+            if not self._cache.add(self.cache_key, datos, self.get_expiry_age()):
+                raise CreateError
+            return
+        self._cache.set(self.cache_key, datos, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        # si estaba en el cache no está en la base (al pasar a la base se borra del cache)
+        if not self._cache.delete(self.cache_key_prefix + session_key):
+            super().delete(session_key)
@@ -188,6 +188,47 @@ STATICFILES_DIRS = [_static_dir] if _static_dir.exists() else []
 STATIC_ROOT = Path("/var/www/sitioscom/static")
 MEDIA_ROOT = Path("/var/www/sitioscom/media")
 
+# Cache de PDFs de factura (MEDIA_ROOT/facturas/cache)
+FACTURAS_PDF_CACHE_MAX_MB = env_int("FACTURAS_PDF_CACHE_MAX_MB", 500)
+FACTURAS_PDF_CACHE_MAX_DIAS = env_int("FACTURAS_PDF_CACHE_MAX_DIAS", 90)
+
+# Anchos (px) de las miniaturas WebP/JPEG de las imágenes de producto (apps/CarritoApp/miniaturas.py)
+PRODUCTOS_MINIATURAS_ANCHOS = [int(x) for x in csv_env("PRODUCTOS_MINIATURAS_ANCHOS", "160,320,640")]
+
+# Fotos de mascotas / informes (apps/mascota/imagenes.py): lado máximo al guardar, calidad JPEG
+# y tope de MB guardados por mascota (sus fotos + las de sus informes; 0 = sin tope)
+MASCOTAS_IMG_MAX_LADO = env_int("MASCOTAS_IMG_MAX_LADO", 1600)
+MASCOTAS_IMG_CALIDAD = env_int("MASCOTAS_IMG_CALIDAD", 82)
+MASCOTAS_MAX_MB_POR_MASCOTA = env_int("MASCOTAS_MAX_MB_POR_MASCOTA", 20)
+
+# Búsqueda de productos (apps/CarritoApp/busqueda.py): resultados por defecto y máximo que puede pedir el cliente
+PRODUCTOS_BUSQUEDA_LIMITE = env_int("PRODUCTOS_BUSQUEDA_LIMITE", 20)
+PRODUCTOS_BUSQUEDA_MAX_LIMITE = env_int("PRODUCTOS_BUSQUEDA_MAX_LIMITE", 50)
+
+# Segundos que se guarda la grilla de la tienda para anónimos (apps/CarritoApp/cache_tienda.py);
+# igual se invalida sola cuando cambia un producto o una categoría
+TIENDA_CACHE_SEGUNDOS = env_int("TIENDA_CACHE_SEGUNDOS", 600)
+
+# Minutos que el checkout de Mercado Pago aparta el stock (apps/CarritoApp/reservas.py); la
+# preferencia de pago vence al mismo tiempo. Las vencidas se liberan con manage.py liberar_reservas
+RESERVA_STOCK_MINUTOS = env_int("RESERVA_STOCK_MINUTOS", 30)
+
+# PDFs / imágenes en segundo plano (manage.py procesar_trabajos). En False se generan en el request.
+TRABAJOS_EN_SEGUNDO_PLANO = env_bool("TRABAJOS_EN_SEGUNDO_PLANO", True)
+
+# Respaldos de la base (apps.backup). Conviene un directorio fuera de MEDIA_ROOT, definido en .env
+# (scripts/backup.sh lo lee de ahí y no corre sin él); vacío es MEDIA_ROOT/respaldos. Con Nginx,
+# RESPALDOS_X_ACCEL_PREFIX apunta a un location "internal" sobre ese directorio.
+RESPALDOS_DIR = os.getenv("RESPALDOS_DIR", "")
+RESPALDOS_X_ACCEL_PREFIX = os.getenv("RESPALDOS_X_ACCEL_PREFIX", "")
+# Retención (se aplica sola después de cada respaldo): el último de cada uno de los últimos
+# N días, N semanas y N meses. Media: un completo cada N días y en el medio incrementales.
+RESPALDOS_RETENER_DIARIOS = env_int("RESPALDOS_RETENER_DIARIOS", 7)
+RESPALDOS_RETENER_SEMANALES = env_int("RESPALDOS_RETENER_SEMANALES", 4)
+RESPALDOS_RETENER_MENSUALES = env_int("RESPALDOS_RETENER_MENSUALES", 6)
+RESPALDOS_MEDIA_COMPLETO_DIAS = env_int("RESPALDOS_MEDIA_COMPLETO_DIAS", 7)
+RESPALDOS_MEDIA_EXCLUIR = csv_env("RESPALDOS_MEDIA_EXCLUIR", "respaldos,facturas/cache,trabajos")
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # =========================================================
@@ -219,16 +260,66 @@ if not DEBUG:
     X_FRAME_OPTIONS = "DENY"
 
 # =========================================================
-# Cache (locmem por defecto)
+# Cache compartido entre los workers de gunicorn (ver prueba1/cache.py)
+# CACHE_BACKEND: "archivos" (por defecto, CACHE_DIR), "base" (tabla CACHE_TABLA: manage.py
+# createcachetable), "redis" (CACHE_REDIS_URL, ej. unix:///run/redis/redis.sock?db=1) o
+# "memcached" (CACHE_MEMCACHED, ej. unix:/run/memcached/memcached.sock). Si falta el paquete
+# de Redis/memcached se usa el de archivos. "locmem" es el cache en memoria de cada proceso:
+# solo para los tests (manage.py test --settings=prueba1.settings_test lo elige).
 # =========================================================
+import importlib.util
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "archivos").strip().lower()
+if CACHE_BACKEND == "redis" and not importlib.util.find_spec("redis"):
+    CACHE_BACKEND = "archivos"
+if CACHE_BACKEND == "memcached" and not importlib.util.find_spec("pymemcache"):
+    CACHE_BACKEND = "archivos"
+
+_cache_backends = {
+    "archivos": ("django.core.cache.backends.filebased.FileBasedCache", os.getenv("CACHE_DIR", "/var/tmp/vete-cache")),
+    "base": ("django.core.cache.backends.db.DatabaseCache", os.getenv("CACHE_TABLA", "cache_compartido")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", os.getenv("CACHE_REDIS_URL", "unix:///run/redis/redis.sock")),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", os.getenv("CACHE_MEMCACHED", "unix:/run/memcached/memcached.sock")),
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "prueba1-locmem"),
+}
+_cache_backend, _cache_location = _cache_backends.get(CACHE_BACKEND, _cache_backends["archivos"])
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "prueba1-locmem",
-        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", "300")),
-    }
+        "BACKEND": _cache_backend,
+        "LOCATION": _cache_location,
+        "TIMEOUT": env_int("CACHE_TIMEOUT", 300),
+        # Dos sitios en el mismo Redis/directorio no se pisan las claves
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "vete"),
+        "OPTIONS": {"MAX_ENTRIES": env_int("CACHE_MAX_ENTRIES", 5000)} if CACHE_BACKEND in {"archivos", "base", "locmem"} else {},
+    },
+    # Sesiones de visitantes (ver prueba1/sesiones.py): aparte, para que el recorte por MAX_ENTRIES
+    # del cache general no borre carritos. En Redis/memcached es el mismo servidor con otro prefijo
+    # y es lo recomendado para la tienda. Con "archivos" (directorio propio) o "base" (tabla
+    # CACHE_TABLA + "_sesiones", la crea createcachetable en deploy.sh) cada set() cuenta las
+    # entradas (lista el directorio / COUNT(*)), por eso el tope es bajo; limpiar_sesiones borra
+    # los archivos vencidos y, si aun así se llena, se descarta un tercio al azar.
+    "sesiones": {
+        "BACKEND": _cache_backend,
+        "LOCATION": {
+            "archivos": os.path.join(_cache_location, "sesiones"),
+            "base": _cache_location + "_sesiones",
+            "locmem": _cache_location + "-sesiones",
+        }.get(CACHE_BACKEND, _cache_location),
+        "TIMEOUT": None,  # cada sesión se guarda con su propio vencimiento
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "vete") + "-sesion",
+        "OPTIONS": {"MAX_ENTRIES": env_int("SESIONES_CACHE_MAX_ENTRIES", 20000)} if CACHE_BACKEND in {"archivos", "base", "locmem"} else {},
+    },
 }
 
+# =========================================================
+# Sesiones: las de visitantes en el cache "sesiones", las de usuarios logueados (y las que
+# pasan por el checkout) en la base. SESSION_ENGINE permite volver al motor de Django
+# (ej. django.contrib.sessions.backends.db o .signed_cookies). Vencidas: manage.py limpiar_sesiones
+# =========================================================
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "prueba1.sesiones")
+SESSION_CACHE_ALIAS = "sesiones"
+SESIONES_CACHE_MAX_BYTES = env_int("SESIONES_CACHE_MAX_BYTES", 4096)
+
 # =========================================================
 # Email
 # =========================================================
@@ -259,4 +350,8 @@ LOGGING = {
 # Mercado Pago
 # =========================================================
 MP_ACCESS_TOKEN = os.getenv("MP_ACCESS_TOKEN", "")
+# Segundos de espera a la API de pagos, y clase que la consulta (apps/CarritoApp/pagos_mp.py);
+# "apps.CarritoApp.pagos_mp.ClienteMPMemoria" responde sin red, para pruebas
+MP_API_TIMEOUT = env_int("MP_API_TIMEOUT", 10)
+MP_CLIENTE = os.getenv("MP_CLIENTE", "apps.CarritoApp.pagos_mp.ClienteMP")
 # ✅ NO volver a redefinir ALLOWED_HOSTS ni CSRF_TRUSTED_ORIGINS acá
\ No newline at end of file
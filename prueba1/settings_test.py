@@ -0,0 +1,9 @@
+# Settings de los tests:  python manage.py test --settings=prueba1.settings_test
+# Son los mismos de settings.py con el cache en memoria del proceso (CACHE_BACKEND=locmem), así
+# los tests no leen ni invalidan el cache de archivos/Redis del sitio. Se puede pedir otro
+# backend exportando CACHE_BACKEND antes de correrlos; el del .env no se usa.
+import os
+
+os.environ.setdefault("CACHE_BACKEND", "locmem")
+
+from .settings import *  # noqa: E402,F401,F403
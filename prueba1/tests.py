@@ -0,0 +1,124 @@
+import io
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .sesiones import MAX_BYTES, SessionStore, persistir
+
+
+#-------------------- Sesiones híbridas (sesiones.py) ------------------------------------#
+class SesionesTests(TestCase):
+    def setUp(self):
+        self.cache = caches[settings.SESSION_CACHE_ALIAS]
+        self.cache.clear()
+
+    def en_cache(self, session_key):
+        return (SessionStore.cache_key_prefix + session_key) in self.cache
+
+    def en_base(self, session_key):
+        return Session.objects.filter(pk=session_key).exists()
+
+    def visitante(self, **datos):
+        sesion = SessionStore()
+        sesion.update(datos or {'turno_paso': 2})
+        sesion.save()
+        return sesion
+
+    def test_visitante_queda_en_el_cache(self):
+        sesion = self.visitante(turno_paso=2)
+
+        self.assertTrue(self.en_cache(sesion.session_key))
+        self.assertFalse(self.en_base(sesion.session_key))
+        self.assertEqual(SessionStore(sesion.session_key)['turno_paso'], 2)
+
+    def test_al_iniciar_sesion_pasa_a_la_base(self):
+        usuario = get_user_model().objects.create_user('ana', password='clave-de-prueba')
+        request = RequestFactory().get('/')
+        request.session = self.visitante(turno_paso=2)
+        anterior = request.session.session_key
+
+        login(request, usuario, backend='django.contrib.auth.backends.ModelBackend')  # cycle_key()
+        request.session.save()
+
+        nueva = request.session.session_key
+        self.assertNotEqual(nueva, anterior)
+        self.assertFalse(self.en_cache(anterior))
+        self.assertFalse(self.en_cache(nueva))
+        self.assertTrue(self.en_base(nueva))
+        self.assertEqual(SessionStore(nueva)['turno_paso'], 2)
+
+    def test_persistir_la_pasa_a_la_base(self):
+        sesion = self.visitante()
+        persistir(sesion)
+        sesion['factura_datos'] = {'total': '1500'}
+        sesion.save()
+
+        self.assertFalse(self.en_cache(sesion.session_key))
+        self.assertTrue(self.en_base(sesion.session_key))
+        self.assertEqual(SessionStore(sesion.session_key)['factura_datos'], {'total': '1500'})
+
+    def test_datos_grandes_van_a_la_base(self):
+        # encode() comprime: hacen falta datos al azar para pasar MAX_BYTES
+        sesion = self.visitante(nota=secrets.token_hex(MAX_BYTES))
+
+        self.assertFalse(self.en_cache(sesion.session_key))
+        self.assertTrue(self.en_base(sesion.session_key))
+
+    def test_una_vez_en_la_base_se_queda_ahi(self):
+        sesion = self.visitante(nota=secrets.token_hex(MAX_BYTES))
+        sesion['nota'] = 'corta'
+        sesion.save()
+
+        self.assertFalse(self.en_cache(sesion.session_key))
+        self.assertEqual(SessionStore(sesion.session_key)['nota'], 'corta')
+
+    def test_delete_borra_del_cache(self):
+        sesion = self.visitante()
+        session_key = sesion.session_key
+
+        SessionStore().delete(session_key)
+
+        self.assertFalse(self.en_cache(session_key))
+        self.assertEqual(SessionStore(session_key).load(), {})
+
+    def test_delete_sin_entrada_en_el_cache_borra_de_la_base(self):
+        sesion = self.visitante()
+        persistir(sesion)
+        sesion.save()
+        session_key = sesion.session_key
+
+        SessionStore().delete(session_key)
+
+        self.assertFalse(self.en_base(session_key))
+
+
+#-------------------- limpiar_sesiones ------------------------------------#
+class LimpiarSesionesTests(TestCase):
+    def crear_sesiones(self, cantidad, vencimiento, prefijo):
+        Session.objects.bulk_create([
+            Session(session_key=f'{prefijo}{numero:04d}', session_data='', expire_date=vencimiento)
+            for numero in range(cantidad)
+        ])
+
+    def test_borra_las_vencidas_de_a_lotes(self):
+        ahora = timezone.now()
+        self.crear_sesiones(5, ahora - timedelta(days=1), 'vencida')
+        self.crear_sesiones(2, ahora + timedelta(days=1), 'vigente')
+        salida = io.StringIO()
+
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('limpiar_sesiones', lote=2, pausa=0, sin_carritos=True, stdout=salida)
+
+        borrados = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('DELETE')]
+        self.assertEqual(len(borrados), 3)  # 2 + 2 + 1
+        self.assertIn('Sesiones vencidas borradas: 5', salida.getvalue())
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), ['vigente0000', 'vigente0001'])
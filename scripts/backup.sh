@@ -5,9 +5,8 @@ set -euo pipefail
 PROJECT_DIR="${PROJECT_DIR:-/opt/vete}"   # usa var de entorno si existe, sino /opt/vete
 BACKUP_DIR="${BACKUP_DIR:-/opt/backups}"
 DATE="$(date +%F_%H%M%S)"
-DB_DUMP_NAME="db_${DATE}.sql"
-MEDIA_TAR_NAME="media_${DATE}.tar.gz"
 ENV_BACKUP_NAME=".env_${DATE}"
+PYTHON="${PYTHON:-${PROJECT_DIR}/env/bin/python}"
 # ==============
 
 mkdir -p "$BACKUP_DIR"
@@ -27,27 +26,20 @@ else
   echo "⚠️  No encontré .env en ${PROJECT_DIR}"
 fi
 
-# 2) media/
-if [ -d "media" ]; then
-  tar -czf "${BACKUP_DIR}/${MEDIA_TAR_NAME}" -C "$PROJECT_DIR" media
-  echo "✅ media/ respaldado en ${BACKUP_DIR}/${MEDIA_TAR_NAME}"
-else
-  echo "ℹ️  No existe carpeta media/ (nada que respaldar)"
-fi
-
-# 3) DB (usa variables clásicas si existen)
-DB_HOST="$(grep -E '^DB_HOST=' .env | cut -d= -f2- || true)"
-DB_NAME="$(grep -E '^DB_NAME=' .env | cut -d= -f2- || true)"
-DB_USER="$(grep -E '^DB_USER=' .env | cut -d= -f2- || true)"
-DB_PASSWORD="$(grep -E '^DB_PASSWORD=' .env | cut -d= -f2- || true)"
-
-if [[ -n "$DB_HOST" && -n "$DB_NAME" && -n "$DB_USER" ]]; then
-  echo "⏳ Respaldando DB MySQL ${DB_NAME} en ${BACKUP_DIR}/${DB_DUMP_NAME}"
-  mysqldump -h "$DB_HOST" -u "$DB_USER" -p"${DB_PASSWORD:-}" --databases "$DB_NAME" > "${BACKUP_DIR}/${DB_DUMP_NAME}"
-  echo "✅ DB respaldada en ${BACKUP_DIR}/${DB_DUMP_NAME}"
-else
-  echo "ℹ️  No encontré credenciales de DB en .env (salteo backup de DB)"
+# 2) DB + media/ (manage.py respaldar)
+# La base va con mysqldump comprimido; media es un tar completo cada RESPALDOS_MEDIA_COMPLETO_DIAS
+# y en el medio incrementales (solo lo modificado). Todo queda en el catálogo (tamaño, sha256,
+# fecha) y al final se borran los que quedan fuera de la retención (RESPALDOS_RETENER_*).
+# RESPALDOS_DIR se define solo en .env (es el mismo que usan settings.py y la vista de respaldos);
+# sin él Django los dejaría en MEDIA_ROOT/respaldos, que se sirve sin login.
+RESPALDOS_DIR="$(sed -n 's/^[[:space:]]*\(export[[:space:]]\+\)\?RESPALDOS_DIR[[:space:]]*=[[:space:]]*//p' .env 2>/dev/null \
+  | tail -n 1 | sed -e 's/[[:space:]]*$//' -e 's/^["'\'']//' -e 's/["'\'']$//' || true)"
+if [ -z "$RESPALDOS_DIR" ]; then
+  echo "❌ Falta RESPALDOS_DIR en ${PROJECT_DIR}/.env"; exit 1
 fi
+export RESPALDOS_DIR
+"$PYTHON" manage.py respaldar
+echo "✅ DB y media/ respaldados en ${RESPALDOS_DIR}"
 
 ls -lh "${BACKUP_DIR}" | tail -n +1
 echo "🎉 Backup terminado en ${BACKUP_DIR} (fecha: ${DATE})"
@@ -21,12 +21,27 @@ pip install --upgrade pip
 pip install -r requirements.txt
 
 ENV_BKP="$(ls -1t ${BACKUP_DIR}/.env_* 2>/dev/null | head -n1 || true)"
-MEDIA_TAR="$(ls -1t ${BACKUP_DIR}/media_*.tar.gz 2>/dev/null | head -n1 || true)"
+# Media: el último completo y después, en orden, los incrementales posteriores
+MEDIA_TAR="$(ls -1 ${BACKUP_DIR}/media_completo_*.tar.gz 2>/dev/null | tail -n1 || true)"
+[ -z "${MEDIA_TAR}" ] && MEDIA_TAR="$(ls -1t ${BACKUP_DIR}/media_*.tar.gz 2>/dev/null | head -n1 || true)"
 [ -n "${ENV_BKP}" ] && cp "${ENV_BKP}" .env && chmod 600 .env || echo "⚠️ Pegá tus variables en .env"
 
 python manage.py migrate
 python manage.py collectstatic --noinput || true
-[ -n "${MEDIA_TAR}" ] && tar -xzf "${MEDIA_TAR}" -C "${PROJECT_DIR}" || echo "ℹ️  Sin backup de media"
+if [ -n "${MEDIA_TAR}" ]; then
+  tar -xzf "${MEDIA_TAR}" -C "${PROJECT_DIR}"
+  for INCREMENTAL in $(ls -1 ${BACKUP_DIR}/media_incremental_*.tar.gz 2>/dev/null); do
+    [[ "$(basename "$INCREMENTAL")" > "media_incremental_${MEDIA_TAR##*media_completo_}" ]] || continue
+    tar -xzf "${INCREMENTAL}" -C "${PROJECT_DIR}"
+  done
+  # MANIFIESTO_MEDIA.txt (del último tar) lista lo que existía: se borra lo eliminado después
+  if [ -f MANIFIESTO_MEDIA.txt ]; then
+    find media -type f | { grep -vxFf MANIFIESTO_MEDIA.txt || true; } | xargs -r -d '\n' rm -f
+    rm -f MANIFIESTO_MEDIA.txt
+  fi
+else
+  echo "ℹ️  Sin backup de media"
+fi
 
 sudo tee /etc/systemd/system/gunicorn.service >/dev/null <<EOT
 [Unit]